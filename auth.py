@@ -1,8 +1,9 @@
 from flask import Flask, redirect, url_for, session, request, jsonify, flash, render_template
 from flask_login import LoginManager, current_user, login_user, logout_user, login_required, UserMixin
 from models.models import db, Student
+from facets import facet_index
 import os
-from authlib.integrations.flask_client import OAuth
+import threading
 from werkzeug.exceptions import HTTPException
 
 # Initialize login manager
@@ -34,52 +35,33 @@ def init_auth(app):
     if not app.secret_key:
         app.secret_key = os.environ.get('SECRET_KEY', 'development-key')
     
-    # Get application name from config
-    app_name = app.config.get('APP_NAME', 'BranchOut')
-    
-    # Google OAuth credentials
-    client_id = os.environ.get('GOOGLE_CLIENT_ID', '')
-    client_secret = os.environ.get('GOOGLE_CLIENT_SECRET', '')
-    app.logger.info(f"Client ID aaaaaaaaa: {client_id}")
-    app.logger.info(f"Client secret aaaaaaaaa: {client_secret}")
-    
-
+    # The Google client is registered on the first sign-in, so workers boot without importing authlib
+    oauth_lock = threading.Lock()
 
-    # Print detailed debug information
-    if client_id:
-        app.logger.info(f"Client ID length: {len(client_id)} characters")
-        app.logger.info(f"Client ID first 8 chars: {client_id[:8]}")
-        app.logger.info(f"Client ID last 4 chars: {client_id[-4:]}")
-    else:
-        app.logger.error("GOOGLE_CLIENT_ID environment variable is not set")
-        
-    if client_secret:
-        app.logger.info(f"Client secret length: {len(client_secret)} characters")
-        app.logger.info(f"Client secret first 8 chars: {client_secret[:8]}")
-    else:
-        app.logger.error("GOOGLE_CLIENT_SECRET environment variable is not set")
-    
-    # Increase session cookie security and lifetime
-    app.config['SESSION_COOKIE_SECURE'] = os.environ.get('FLASK_ENV') == 'production'
-    app.config['SESSION_COOKIE_HTTPONLY'] = True
-    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-    app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour in seconds
-    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+    def google():
+        with oauth_lock:
+            oauth = app.extensions.get('authlib.integrations.flask_client')
+            if oauth is None:
+                from authlib.integrations.flask_client import OAuth
 
-    # OAuth setup
-    oauth = OAuth(app)
-    oauth.register(
-        name='google',
-        client_id=os.environ.get('GOOGLE_CLIENT_ID'),
-        client_secret=os.environ.get('GOOGLE_CLIENT_SECRET'),
-        access_token_url='https://oauth2.googleapis.com/token',
-        access_token_params=None,
-        authorize_url='https://accounts.google.com/o/oauth2/auth',
-        authorize_params=None,
-        api_base_url='https://www.googleapis.com/oauth2/v2/',
-        userinfo_endpoint='https://openidconnect.googleapis.com/v1/userinfo',
-        client_kwargs={'scope': 'openid email profile'},
-    )
+                client_id = os.environ.get('GOOGLE_CLIENT_ID')
+                client_secret = os.environ.get('GOOGLE_CLIENT_SECRET')
+                if not client_id or not client_secret:
+                    app.logger.error("GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET must be set for Google sign-in")
+                oauth = OAuth(app)
+                oauth.register(
+                    name='google',
+                    client_id=client_id,
+                    client_secret=client_secret,
+                    access_token_url='https://oauth2.googleapis.com/token',
+                    access_token_params=None,
+                    authorize_url='https://accounts.google.com/o/oauth2/auth',
+                    authorize_params=None,
+                    api_base_url='https://www.googleapis.com/oauth2/v2/',
+                    userinfo_endpoint='https://openidconnect.googleapis.com/v1/userinfo',
+                    client_kwargs={'scope': 'openid email profile'},
+                )
+        return oauth.google
 
     # Login route
     @app.route('/login', methods=['GET', 'POST'])
@@ -92,14 +74,15 @@ def init_auth(app):
     @app.route('/login/google')
     def google_login():
         redirect_uri = url_for('google_authorize', _external=True)
-        return oauth.google.authorize_redirect(redirect_uri)
+        return google().authorize_redirect(redirect_uri)
 
     # Google OAuth callback
     @app.route('/authorize')
     def google_authorize():
         try:
-            token = oauth.google.authorize_access_token()
-            user_info = oauth.google.parse_id_token(token)
+            client = google()
+            token = client.authorize_access_token()
+            user_info = client.parse_id_token(token)
         except HTTPException as e:
             flash('Google authentication failed.', 'danger')
             return redirect(url_for('login'))
@@ -120,9 +103,9 @@ def init_auth(app):
             if student.first_login:
                 student.first_login = False
                 db.session.commit()
-                return redirect(url_for('submit', student_id=student.id))
+                return redirect(url_for('main.submit', student_id=student.id))
             else:
-                return redirect(url_for('directory', student_id=student.id))
+                return redirect(url_for('main.directory', student_id=student.id))
         else:
             new_student = Student(
                 name=name,
@@ -134,15 +117,13 @@ def init_auth(app):
             )
             db.session.add(new_student)
             db.session.commit()
+            facet_index.update_student(new_student.id)
             login_user(User(new_student))
-            return redirect(url_for('submit', student_id=new_student.id))
+            return redirect(url_for('main.submit', student_id=new_student.id))
 
     @app.route('/logout')
     def logout():
         session.clear()
         logout_user()
         flash('You have been logged out', 'info')
-        return redirect(url_for('index'))
-
-    # Print authentication initialization message
-    print(f"\nInitialized Google OAuth authentication for {app_name}\n")
+        return redirect(url_for('main.index'))
@@ -0,0 +1,211 @@
+"""Hold --clients idle chat tabs against the app under gunicorn with the shipped gunicorn.conf.py, first polling
+/api/messages every 5 seconds and /api/unread_messages every 30 like the pages used to, then following
+/api/events like they do now.
+
+For each mode it measures the requests per second the idle tabs cost, how long a sent message takes to show
+up in its receiver's tab, and the throughput and latency left for --probes clients calling /api/filter and
+/api/prompts as fast as they can. A run without tabs shows what those routes manage on their own. Every SQL
+statement sleeps --db-latency-ms first, standing in for the round trip to PostgreSQL.
+
+Usage: python benchmarks/bench_chat_push.py [--clients 200] [--seconds 20]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from datagen import FACULTIES, create_app, seed, seed_messages
+from liveserver import EventClient, free_port, percentile, session_cookie, start_server, stop_server
+
+MESSAGES_POLL_SECONDS = 5
+UNREAD_POLL_SECONDS = 30
+
+
+class Traffic:
+    """Messages sent during one run and the delays until their receivers' tabs saw them"""
+
+    def __init__(self, port, stop):
+        self.port = port
+        self.stop = stop
+        self.lock = threading.Lock()
+        self.sending = threading.Event()
+        self.sent = {}
+        self.delivered = []
+        # Delays to stream tabs, split by whether their stream was held open or answered as a poll
+        self.by_tab = {True: [], False: []}
+        self.tab_requests = 0
+
+    def request(self, method, path, user_id=None, body=None, timeout=30):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=timeout)
+        headers = {'Content-Type': 'application/json'}
+        if user_id is not None:
+            headers['Cookie'] = session_cookie(user_id)
+        try:
+            connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def seen(self, content, held=None):
+        arrived = time.perf_counter()
+        with self.lock:
+            sent = self.sent.pop(content, None)
+            if sent is not None:
+                self.delivered.append((arrived - sent) * 1000)
+                if held is not None:
+                    self.by_tab[held].append((arrived - sent) * 1000)
+
+    def count_tab_request(self):
+        with self.lock:
+            self.tab_requests += 1
+
+
+def polling_tab(traffic, user_id, other_id, rng):
+    """Poll one open conversation and the unread counts on the old schedule"""
+    newest, next_unread = None, time.monotonic() + rng.uniform(0, UNREAD_POLL_SECONDS)
+    traffic.stop.wait(rng.uniform(0, MESSAGES_POLL_SECONDS))
+    while not traffic.stop.is_set():
+        query = f'user_id={user_id}&other_id={other_id}' + (f'&after_id={newest}' if newest is not None else '')
+        try:
+            status, body = traffic.request('GET', f'/api/messages?{query}', user_id)
+            traffic.count_tab_request()
+            for message in json.loads(body) if status == 200 else ():
+                newest = max(newest or 0, message['id'])
+                traffic.seen(message['content'])
+            if time.monotonic() >= next_unread:
+                traffic.request('GET', f'/api/unread_messages?user_id={user_id}', user_id)
+                traffic.count_tab_request()
+                next_unread += UNREAD_POLL_SECONDS
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+        traffic.stop.wait(MESSAGES_POLL_SECONDS)
+
+
+def sender(traffic, pairs, interval, rng):
+    sent = 0
+    while not traffic.sending.wait(interval):
+        user_id, other_id = rng.choice(pairs)
+        sent += 1
+        content = f'push {sent}'
+        with traffic.lock:
+            traffic.sent[content] = time.perf_counter()
+        try:
+            traffic.request('POST', '/api/messages', other_id,
+                        {'sender_id': other_id, 'receiver_id': user_id, 'content': content})
+        except (OSError, http.client.HTTPException):
+            pass
+
+
+def probe(traffic, deadline, rng, results):
+    """Browse routes unrelated to chat as fast as possible"""
+    latencies, errors = [], 0
+    while time.perf_counter() < deadline:
+        path = f'/api/filter?faculty={rng.choice(FACULTIES)}' if rng.random() < 0.5 else '/api/prompts'
+        started = time.perf_counter()
+        try:
+            status, _ = traffic.request('GET', path, timeout=10)
+            failed = status >= 500
+        except (OSError, http.client.HTTPException):
+            failed = True
+        if failed:
+            errors += 1
+        elif time.perf_counter() < deadline:
+            latencies.append((time.perf_counter() - started) * 1000)
+    results.append((latencies, errors))
+
+
+def run_mode(mode, env, pairs, args):
+    port = free_port()
+    server = start_server(port, env, app_spec='bench_threads:latency_app()')
+    stop = threading.Event()
+    traffic = Traffic(port, stop)
+    rng = random.Random(0)
+    tabs = []
+    try:
+        if mode == 'polling':
+            tabs = [threading.Thread(target=polling_tab, args=(traffic, user_id, other_id, random.Random(n)),
+                                     daemon=True)
+                    for n, (user_id, other_id) in enumerate(pairs)]
+        elif mode == 'streams':
+            def on_event(tab, event_type, data):
+                if event_type == 'message':
+                    traffic.seen(json.loads(data)['content'], tab.held)
+            tabs = [EventClient(port, user_id, stop, on_event) for user_id, _ in pairs]
+        for tab in tabs:
+            tab.start()
+        # Let the tabs settle into their schedule before measuring
+        time.sleep(MESSAGES_POLL_SECONDS if tabs else 1)
+        traffic.tab_requests = 0
+        connects = sum(getattr(tab, 'connects', 0) for tab in tabs)
+
+        threads = [threading.Thread(target=sender, args=(traffic, pairs, args.send_interval, rng), daemon=True)] \
+            if tabs else []
+        results = []
+        deadline = time.perf_counter() + args.seconds
+        threads += [threading.Thread(target=probe, args=(traffic, deadline, random.Random(n), results))
+                    for n in range(args.probes)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        traffic.sending.set()
+        for thread in threads:
+            thread.join()
+        if mode == 'streams':
+            traffic.tab_requests = sum(tab.connects for tab in tabs) - connects
+        held = sum(getattr(tab, 'held', False) for tab in tabs)
+        # Messages sent in the last poll interval had no chance to arrive yet
+        time.sleep(MESSAGES_POLL_SECONDS + 1)
+    finally:
+        stop.set()
+        stop_server(server)
+
+    latencies = [value for probe_latencies, _ in results for value in probe_latencies]
+    errors = sum(probe_errors for _, probe_errors in results)
+    delivered = traffic.delivered
+    total = len(delivered) + len(traffic.sent)
+    print(f'{mode:>10} {len(tabs):6} {held:6} {traffic.tab_requests / args.seconds:10.1f} '
+          f'{percentile(delivered, 0.5):9.0f} {percentile(delivered, 0.99):9.0f} {len(delivered):5}/{total:<5} '
+          f'{len(latencies) / args.seconds:9.0f} {percentile(latencies, 0.99):9.1f} {errors:7}')
+    if mode == 'streams':
+        for was_held, label in ((True, 'held streams'), (False, 'tabs past EVENTS_MAX_STREAMS, polling')):
+            delays = traffic.by_tab[was_held]
+            print(f'{"":>10} delivery to {label}: p50 {percentile(delays, 0.5):.0f}ms, '
+                  f'p99 {percentile(delays, 0.99):.0f}ms over {len(delays)} messages')
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='branchout-push-')
+    try:
+        db_path = os.path.join(directory, 'push.db')
+        app = create_app(db_path)
+        students = max(args.clients * 2, 1000)
+        with app.app_context():
+            seed(students)
+            pairs = seed_messages(students, args.clients, args.history)
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', BENCH_DB_LATENCY_MS=str(args.db_latency_ms),
+                   PROMETHEUS_MULTIPROC_DIR=os.path.join(directory, 'metrics'))
+        print(f'{args.clients} idle tabs, a message every {args.send_interval}s, {args.probes} probe clients, '
+              f'{args.db_latency_ms}ms per statement, {args.seconds}s per mode, shipped gunicorn.conf.py')
+        print(f"{'mode':>10} {'tabs':>6} {'held':>6} {'tab req/s':>10} {'deliv p50':>9} {'deliv p99':>9} "
+              f"{'delivered':>11} {'probe/s':>9} {'probe p99':>9} {'errors':>7}")
+        for mode in ('no tabs', 'polling', 'streams'):
+            run_mode(mode, env, pairs, args)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=200, help='idle tabs, each with its own conversation')
+    parser.add_argument('--seconds', type=float, default=20, help='measured time per mode')
+    parser.add_argument('--probes', type=int, default=8, help='clients calling /api/filter and /api/prompts')
+    parser.add_argument('--send-interval', type=float, default=0.2, help='seconds between sent messages')
+    parser.add_argument('--db-latency-ms', type=float, default=2, help='simulated round trip per SQL statement')
+    parser.add_argument('--history', type=int, default=50, help='messages already in each conversation')
+    run(parser.parse_args())
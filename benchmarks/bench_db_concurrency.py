@@ -0,0 +1,131 @@
+"""Drive mixed read/write chat traffic from several worker processes at one SQLite database, comparing SQLite's
+defaults (rollback journal, synchronous=FULL, no mmap) with the engine settings app.py applies (WAL,
+synchronous=NORMAL, mmap and a busy timeout).
+
+Each worker imports the real app, like a gunicorn worker, and loops over /api/messages reads (which also mark
+messages read), /api/unread_messages polls and /api/messages sends. Requests that fail with "database is locked"
+are counted as errors.
+
+Usage: python benchmarks/bench_db_concurrency.py [--workers 4] [--seconds 10] [--write-ratio 0.2]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from datagen import create_app, seed, seed_messages
+
+# SQLite's own defaults, applied through the same settings the tuned run uses
+MODES = {
+    'default': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': '0',
+                'SQLITE_BUSY_TIMEOUT_MS': '5000'},
+    'tuned': {},
+}
+OPERATIONS = ('read', 'unread', 'send')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def worker(db_path, settings, pairs, write_ratio, seconds, rng_seed, barrier, results):
+    os.environ.update(settings)
+    from datagen import load_app
+    from sqlalchemy.exc import OperationalError
+    app = load_app(db_path).app
+    # Let database errors reach the loop instead of becoming logged 500 responses
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    client = app.test_client()
+    rng = random.Random(rng_seed)
+    latencies = {operation: [] for operation in OPERATIONS}
+    errors = {operation: 0 for operation in OPERATIONS}
+
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    sent = 0
+    while time.perf_counter() < deadline:
+        user_id, other_id = rng.choice(pairs)
+        if rng.random() < 0.5:
+            user_id, other_id = other_id, user_id
+        roll = rng.random()
+        operation = 'send' if roll < write_ratio else 'read' if roll < (1 + write_ratio) / 2 else 'unread'
+        started = time.perf_counter()
+        try:
+            if operation == 'send':
+                sent += 1
+                response = client.post('/api/messages', json={'sender_id': user_id, 'receiver_id': other_id,
+                                                               'content': f'Bench message {rng_seed}-{sent}'})
+            elif operation == 'read':
+                response = client.get('/api/messages', query_string={'user_id': user_id, 'other_id': other_id})
+            else:
+                response = client.get('/api/unread_messages', query_string={'user_id': user_id})
+            failed = response.status_code >= 500
+        except OperationalError:
+            failed = True
+        if failed:
+            errors[operation] += 1
+        else:
+            latencies[operation].append((time.perf_counter() - started) * 1000)
+    results.put((latencies, errors))
+
+
+def run_mode(name, db_path, pairs, args):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(db_path, MODES[name], pairs, args.write_ratio, args.seconds,
+                                                      n, barrier, results))
+                 for n in range(args.workers)]
+    for process in processes:
+        process.start()
+    latencies = {operation: [] for operation in OPERATIONS}
+    errors = {operation: 0 for operation in OPERATIONS}
+    for _ in processes:
+        worker_latencies, worker_errors = results.get()
+        for operation in OPERATIONS:
+            latencies[operation] += worker_latencies[operation]
+            errors[operation] += worker_errors[operation]
+    for process in processes:
+        process.join()
+
+    total = sum(len(values) for values in latencies.values())
+    print(f'{name}: {total / args.seconds:,.0f} requests/s, {sum(errors.values())} locked errors')
+    for operation in OPERATIONS:
+        values = latencies[operation]
+        print(f'  {operation:>7}: {len(values):>7} ok {errors[operation]:>5} errors  '
+              f'p50 {percentile(values, 0.5):7.2f}ms  p99 {percentile(values, 0.99):8.2f}ms')
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='branchout-bench-')
+    try:
+        seeded = os.path.join(directory, 'seeded.db')
+        app = create_app(seeded)
+        with app.app_context():
+            seed(args.students)
+            pairs = seed_messages(args.students, args.conversations, args.history)
+        print(f'{args.workers} workers, {args.seconds}s per mode, {args.write_ratio:.0%} sends, '
+              f'{args.students:,} students, {args.conversations:,} conversations')
+        for name in MODES:
+            db_path = os.path.join(directory, f'{name}.db')
+            shutil.copy(seeded, db_path)
+            run_mode(name, db_path, pairs, args)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='share of requests that send a message')
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--conversations', type=int, default=1000)
+    parser.add_argument('--history', type=int, default=50, help='messages already in each conversation')
+    run(parser.parse_args())
@@ -0,0 +1,147 @@
+"""Replay a simulated polling session against the app twice: once with clients that ignore ETags, once with
+clients that send If-None-Match, and compare the response bytes, server CPU time and SQL statements.
+
+Every client keeps a page open that polls /api/unread_messages, /api/matches, /api/prompts and one
+/api/filter page on fixed intervals, while chat messages are sent and read at --writes-per-minute. The
+session runs on a virtual clock, so a ten minute session replays in seconds; both runs replay the same
+events against copies of one seeded database.
+
+Usage: python benchmarks/bench_etags.py [--clients 200] [--minutes 10] [--writes-per-minute 30]
+"""
+import argparse
+import heapq
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from datagen import create_app, random_filters, seed, seed_matches, seed_messages
+from sqlalchemy import event
+from app import create_app as create_branchout
+from etags import version_cache
+from facets import facet_index
+from models.models import db
+
+# Seconds between polls of each endpoint by one open page
+POLL_SECONDS = {'unread': 10, 'matches': 30, 'prompts': 60, 'filter': 60}
+
+
+def build_session(args, pairs):
+    """Return the session as a time-ordered list of (seconds, client, kind)"""
+    rng = random.Random(0)
+    events = []
+    for client in range(args.clients):
+        for kind, interval in POLL_SECONDS.items():
+            # Pages open at random times, so the polls do not all line up
+            first = rng.uniform(0, interval)
+            events += [(first + n * interval, client, kind) for n in range(int(args.minutes * 60 / interval))]
+    writes = int(args.minutes * args.writes_per_minute)
+    events += [(rng.uniform(0, args.minutes * 60), rng.randrange(len(pairs)), rng.choice(('send', 'read')))
+               for _ in range(writes)]
+    heapq.heapify(events)
+    return [heapq.heappop(events) for _ in range(len(events))]
+
+
+def client_urls(args, pairs):
+    """The polled URLs of every client, as {kind: (path, query)}"""
+    rng = random.Random(1)
+    urls = []
+    for client in range(args.clients):
+        user_id = pairs[client % len(pairs)][client % 2]
+        filters = random_filters(rng, 2)
+        urls.append({
+            'unread': ('/api/unread_messages', {'user_id': user_id}),
+            'matches': ('/api/matches', {'user_id': user_id}),
+            'prompts': ('/api/prompts', {}),
+            'filter': ('/api/filter', {key: value for key, value in filters.items() if value}),
+        })
+    return urls
+
+
+def header_bytes(response):
+    return len(response.status) + sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+
+
+def replay(db_path, session, urls, pairs, conditional):
+    app = create_branchout({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+    # Both runs share this process, so start each from cold caches
+    facet_index.invalidate()
+    version_cache.invalidate()
+    statements = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+    client = app.test_client()
+    etags = {}
+    totals = {'polls': 0, 'not_modified': 0, 'body': 0, 'headers': 0}
+    sent = 0
+    started = time.process_time()
+    for _, index, kind in session:
+        if kind == 'send':
+            sent += 1
+            sender, receiver = pairs[index]
+            client.post('/api/messages', json={'sender_id': sender, 'receiver_id': receiver,
+                                               'content': f'Session message {sent}'})
+            continue
+        if kind == 'read':
+            receiver, sender = pairs[index]
+            client.get('/api/messages', query_string={'user_id': receiver, 'other_id': sender})
+            continue
+        path, query = urls[index][kind]
+        headers = {}
+        if conditional and (index, kind) in etags:
+            headers['If-None-Match'] = etags[index, kind]
+        response = client.get(path, query_string=query, headers=headers)
+        if response.headers.get('ETag'):
+            etags[index, kind] = response.headers['ETag']
+        totals['polls'] += 1
+        totals['not_modified'] += response.status_code == 304
+        totals['body'] += len(response.data)
+        totals['headers'] += header_bytes(response)
+    totals['cpu'] = time.process_time() - started
+    totals['statements'] = statements[0]
+    return totals
+
+
+def report(name, totals):
+    print(f"{name:>14}: {totals['polls']:,} polls, {totals['not_modified'] / totals['polls']:6.1%} answered 304, "
+          f"{totals['body'] / 1024:9,.0f} KiB bodies + {totals['headers'] / 1024:7,.0f} KiB headers, "
+          f"{totals['cpu']:6.2f}s CPU, {totals['statements']:,} SQL statements")
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='branchout-etags-')
+    try:
+        seeded = os.path.join(directory, 'seeded.db')
+        app = create_app(seeded)
+        with app.app_context():
+            seed(args.students)
+            pairs = seed_messages(args.students, args.clients, args.history)
+            seed_matches(args.students, args.matches)
+        session = build_session(args, pairs)
+        urls = client_urls(args, pairs)
+        print(f'{args.clients} open pages for {args.minutes} simulated minutes, {args.writes_per_minute} chat '
+              f'sends and reads per minute, {args.students:,} students; CPU includes the test client')
+        results = {}
+        for name, conditional in (('no ETags', False), ('If-None-Match', True)):
+            db_path = os.path.join(directory, f'{name}.db')
+            shutil.copy(seeded, db_path)
+            results[name] = replay(db_path, session, urls, pairs, conditional)
+            report(name, results[name])
+        before, after = results['no ETags'], results['If-None-Match']
+        print(f"saved {1 - (after['body'] + after['headers']) / (before['body'] + before['headers']):.0%} of the "
+              f"response bytes, {1 - after['cpu'] / before['cpu']:.0%} of the CPU time and "
+              f"{1 - after['statements'] / before['statements']:.0%} of the SQL statements")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=200, help='pages open and polling')
+    parser.add_argument('--minutes', type=float, default=10, help='simulated session length')
+    parser.add_argument('--writes-per-minute', type=float, default=30, help='chat sends and reads per minute')
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--matches', type=int, default=20000)
+    parser.add_argument('--history', type=int, default=20, help='messages already in each conversation')
+    run(parser.parse_args())
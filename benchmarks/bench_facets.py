@@ -0,0 +1,74 @@
+"""Compare the facet index against the old join-per-value SQL filter, and time facet counts.
+
+Usage: python benchmarks/bench_facets.py [--sizes 10000 100000 1000000] [--queries 50]
+"""
+import argparse
+import os
+import random
+import time
+
+from datagen import create_app, seed, random_filters
+from sqlalchemy.orm import aliased
+from facets import FACET_TABLES, FacetIndex
+from models.models import Student
+
+
+def sql_filter_ids(filters):
+    """The filter_students() query as it was before the facet index.
+
+    The old route joined the unaliased tables once per value, which SQLite rejects
+    as ambiguous when two values of one facet are picked, so each join pair is
+    aliased here to keep the same join count with working SQL.
+    """
+    query = Student.query
+    if filters.get('faculty'):
+        query = query.filter(Student.faculty == filters['faculty'])
+    for facet, (assoc, column, taxonomy) in FACET_TABLES.items():
+        for value in filters.get(facet) or []:
+            assoc_alias, taxonomy_alias = aliased(assoc), aliased(taxonomy)
+            query = query.join(assoc_alias, assoc_alias.student_id == Student.id).join(
+                taxonomy_alias, taxonomy_alias.id == getattr(assoc_alias, column)
+            ).filter(taxonomy_alias.name == value)
+    return sorted(student_id for (student_id,) in query.with_entities(Student.id))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(size, queries):
+    app = create_app()
+    try:
+        with app.app_context():
+            _, seed_ms = timed(seed, size)
+            index = FacetIndex(ttl=0)
+            _, build_ms = timed(index.build)
+
+            rng = random.Random(size)
+            workload = [random_filters(rng, rng.randint(1, 5)) for _ in range(queries)]
+            sql_ms, index_ms, counts_ms = [], [], []
+            for filters in workload:
+                expected, elapsed = timed(sql_filter_ids, filters)
+                sql_ms.append(elapsed)
+                actual, elapsed = timed(index.filter_ids, filters)
+                index_ms.append(elapsed)
+                assert actual == expected, filters
+                _, elapsed = timed(index.counts, filters)
+                counts_ms.append(elapsed)
+
+            print(f'{size:>9} students | seed {seed_ms / 1000:7.1f}s | index build {build_ms:8.1f}ms | '
+                  f'sql {sum(sql_ms) / queries:8.2f}ms/query | index {sum(index_ms) / queries:8.2f}ms/query | '
+                  f'facet counts {sum(counts_ms) / queries:6.2f}ms/query')
+    finally:
+        os.remove(app.config['BENCH_DB_PATH'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.queries)
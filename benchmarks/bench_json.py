@@ -0,0 +1,79 @@
+"""Measure the size and encoding time of a large student list, like the full directory or a broad /api/filter,
+with the stdlib and orjson JSON providers, in the default and the compact wire format, and compressed with
+gzip and (when the brotli package is installed) brotli at the levels the app uses.
+
+Usage: python benchmarks/bench_json.py [--students 10000] [--runs 20]
+"""
+import argparse
+import gzip
+import os
+import statistics
+import time
+
+from datagen import create_app, seed
+from app import create_app as create_branchout
+from compression import CODINGS, compress
+from facets import load_students
+from models.models import db, Student
+from serializers import serialize_students
+
+
+def median_ms(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+
+def run(args):
+    seeded = create_app()
+    try:
+        with seeded.app_context():
+            seed(args.students)
+        measure(seeded.config['SQLALCHEMY_DATABASE_URI'], args)
+    finally:
+        os.remove(seeded.config['BENCH_DB_PATH'])
+
+
+def measure(db_url, args):
+    apps = {name: create_branchout({'SQLALCHEMY_DATABASE_URI': db_url, 'JSON_PROVIDER': name})
+            for name in ('stdlib', 'orjson')}
+
+    with apps['stdlib'].app_context():
+        students = load_students(db.session.execute(db.select(Student.id).order_by(Student.id)).scalars().all())
+        serialize_ms, names = median_ms(lambda: {'students': serialize_students(students)}, max(1, args.runs // 4))
+        taxonomy = {}
+        compact = {'students': serialize_students(students, taxonomy), 'taxonomy': taxonomy}
+    payloads = {'names': names, 'compact': compact}
+    print(f'{args.students:,} students, median of {args.runs} runs; building the dicts takes {serialize_ms:.0f}ms')
+
+    print(f"{'format':>8} {'provider':>8} {'bytes':>11} {'encode ms':>10}")
+    bodies = {}
+    for format_name, payload in payloads.items():
+        for provider, app in apps.items():
+            with app.app_context():
+                ms, response = median_ms(lambda: app.json.response(payload), args.runs)
+            bodies[format_name] = response.get_data()
+            print(f'{format_name:>8} {provider:>8} {len(bodies[format_name]):>11,} {ms:>10.2f}')
+
+    config = apps['orjson'].config
+    print(f"{'format':>8} {'coding':>8} {'bytes':>11} {'ratio':>7} {'compress ms':>12} {'decompress ms':>14}")
+    for format_name, body in bodies.items():
+        for coding in CODINGS:
+            ms, compressed = median_ms(lambda: compress(body, coding, config), args.runs)
+            if coding == 'gzip':
+                decompress_ms, _ = median_ms(lambda: gzip.decompress(compressed), args.runs)
+            else:
+                import brotli
+                decompress_ms, _ = median_ms(lambda: brotli.decompress(compressed), args.runs)
+            print(f'{format_name:>8} {coding:>8} {len(compressed):>11,} {len(compressed) / len(body):>7.1%} '
+                  f'{ms:>12.2f} {decompress_ms:>14.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=20)
+    run(parser.parse_args())
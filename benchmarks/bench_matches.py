@@ -0,0 +1,94 @@
+"""Count the SQL statements and time /api/matches for users with a growing number of matches, comparing the
+old lookup-per-match loop with the joined page.
+
+tests/test_matches.py pins each page to one statement. The data version lookup behind the route's ETag is
+cached per process and not counted here.
+
+Usage: python benchmarks/bench_matches.py [--matches 1 10 50 200]
+"""
+import argparse
+import os
+import time
+
+from datagen import load_app, seed
+from sqlalchemy import event
+from models.models import db, Student, Prompt, Match
+
+
+def legacy_matches(user_id):
+    """get_matches() as it was: every submitted match, then its prompt and matched student one by one"""
+    result = []
+    for match in Match.query.filter_by(submitted_by=user_id).all():
+        prompt = Prompt.query.get(match.prompt_id)
+        matched_user = Student.query.get(match.matched_user_id)
+        result.append({
+            'id': match.id,
+            'prompt_text': prompt.text if prompt else 'Unknown prompt',
+            'matched_user_name': matched_user.name if matched_user else 'Unknown user',
+        })
+    return result
+
+
+def add_matches(user_id, count, first_student):
+    """Give ``user_id`` ``count`` submitted matches, one prompt each, and as many received ones"""
+    prompts = [Prompt(text=f'Bench prompt {user_id}-{n}', created_by=user_id) for n in range(count)]
+    db.session.add_all(prompts)
+    db.session.flush()
+    for n, prompt in enumerate(prompts):
+        db.session.add(Match(prompt_id=prompt.id, matched_user_id=first_student + n, submitted_by=user_id))
+        db.session.add(Match(prompt_id=prompt.id, matched_user_id=user_id, submitted_by=first_student + n))
+    db.session.commit()
+
+
+def measure(engine, fn):
+    statements = [0]
+
+    def counter(conn, cursor, statement, *args):
+        if 'data_versions' not in statement:
+            statements[0] += 1
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+    return statements[0], elapsed
+
+
+def run(branchout, sizes):
+    app = branchout.app
+    client = app.test_client()
+    with app.app_context():
+        seed(max(sizes) * len(sizes) + 1000)
+        users = {}
+        first_student = 1000
+        for user_id, count in enumerate(sizes, start=1):
+            add_matches(user_id, count, first_student)
+            users[count] = user_id
+            first_student += count
+
+    print(f"{'matches':>8} {'old loop':>20} {'submitted page':>20} {'received page':>20}")
+    for count, user_id in users.items():
+        with app.app_context():
+            old = measure(db.engine, lambda: legacy_matches(user_id))
+            db.session.remove()
+        pages = []
+        for view in ('submitted', 'received'):
+            url = f'/api/matches?user_id={user_id}&view={view}&limit={count}'
+            with app.app_context():
+                statements, elapsed = measure(db.engine, lambda: client.get(url))
+            pages.append((statements, elapsed))
+        cells = [f'{statements:>4} stmts {elapsed:7.2f}ms' for statements, elapsed in [old] + pages]
+        print(f'{count:>8} ' + ' '.join(f'{cell:>20}' for cell in cells))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--matches', type=int, nargs='+', default=[1, 10, 50, 200])
+    args = parser.parse_args()
+    branchout = load_app()
+    try:
+        run(branchout, args.matches)
+    finally:
+        os.remove(branchout.app.config['BENCH_DB_PATH'])
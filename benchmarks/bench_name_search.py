@@ -0,0 +1,136 @@
+"""Time name lookups against realistic student names: the old SQL equality and LIKE queries next to the
+in-memory name index behind /api/students/search, /api/validate-name, /api/dynamic-prompt and /api/match,
+for typeahead prefixes, full names, names with a typo and prefixes limited by a faculty and facet filter.
+
+Usage: python benchmarks/bench_name_search.py [--students 100000] [--queries 200] [--db PATH]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from datagen import FACULTIES, INTERESTS, create_app, seed
+from facets import facet_index
+from models.models import db, Student
+from namesearch import NameIndex, normalize
+
+FIRST_NAMES = ['James', 'Mary', 'Wei', 'Fatima', 'Liam', 'Olivia', 'Noah', 'Emma', 'Hiroshi', 'Aisha', 'Lucas',
+               'Sofia', 'Mateo', 'Chloé', 'Arjun', 'Priya', 'Jin', 'Yuna', 'Omar', 'Leila', 'Ethan', 'Ava', 'Diego',
+               'Zoë', 'Ivan', 'Anastasia', 'Kwame', 'Amara', 'Lars', 'Ingrid', 'Sean', 'Siobhán', 'Mohammed', 'Nour',
+               'Carlos', 'Lucía', 'Minh', 'Linh', 'Tomás', 'Björn']
+LAST_NAMES = ['Smith', 'Johnson', 'Wang', 'Li', 'Nguyen', 'Garcia', 'Martinez', 'Kim', 'Park', 'Tanaka', 'Sato',
+              'Müller', 'Schmidt', 'Rossi', 'Dubois', 'Moreau', 'Silva', 'Santos', 'Kowalski', 'Novak', 'Ivanova',
+              'Petrov', 'Okafor', 'Mensah', 'Hassan', 'Ali', 'Khan', 'Patel', 'Sharma', 'Singh', "O'Brien", 'Murphy',
+              'Andersson', 'Johansson', 'Cohen', 'Levi', 'Fernández', 'López', 'Tran', 'Chen', 'MacDonald', 'Brown',
+              'Taylor', 'Wilson', 'Anderson', 'Thomas', 'Jackson', 'White', 'Harris', 'Clark']
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return statistics.median(ordered), ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def rename(students, rng):
+    """Give the seeded students realistic, partly shared names: first, optional middle initial, last"""
+    names = []
+    for student_id in range(1, students + 1):
+        middle = f' {rng.choice("ABCDEFGHJKLMNPRSTW")}.' if rng.random() < 0.3 else ''
+        names.append({'id': student_id, 'name': f'{rng.choice(FIRST_NAMES)}{middle} {rng.choice(LAST_NAMES)}'})
+    db.session.execute(db.update(Student), names)
+    db.session.commit()
+    return [row['name'] for row in names]
+
+
+def typo(name, rng):
+    # Swap two neighbouring letters of the longest word, or drop one
+    words = name.split()
+    w = max(range(len(words)), key=lambda i: len(words[i]))
+    word = words[w]
+    i = rng.randrange(1, len(word) - 1)
+    words[w] = word[:i] + word[i + 1] + word[i] + word[i + 2:] if rng.random() < 0.5 else word[:i] + word[i + 1:]
+    return ' '.join(words)
+
+
+def timed(fn, queries):
+    samples, hits = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        hits += bool(fn(query))
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples) + (hits / len(queries),)
+
+
+def run(args):
+    reuse = args.db and os.path.exists(args.db) and os.path.getsize(args.db) > 0
+    app = create_app(args.db)
+    rng = random.Random(0)
+    with app.app_context():
+        if not reuse:
+            seed(args.students)
+            rename(args.students, random.Random(1))
+        names = db.session.execute(db.select(Student.name).order_by(Student.id)).scalars().all()
+
+        index = NameIndex(ttl=0)
+        start = time.perf_counter()
+        index.build()
+        print(f'{len(names):,} names, index built in {(time.perf_counter() - start) * 1000:.0f}ms; '
+              f'median and p99 of {args.queries} queries each')
+        facet_index.ensure_built()
+        # The first fuzzy search imports numpy
+        index.search('warm up')
+
+        picked = [rng.choice(names) for _ in range(args.queries)]
+        prefixes = [name[:rng.randint(2, 6)] for name in picked]
+        cases = {
+            'typeahead prefix': prefixes,
+            'full name': picked,
+            'full name, lowercase': [name.lower() for name in picked],
+            'name with a typo': [typo(name, rng) for name in picked],
+        }
+        filters = [{'faculty': rng.choice(FACULTIES), 'interests': [rng.choice(INTERESTS)]} for _ in picked]
+
+        def sql_equal(query):
+            return db.session.execute(db.select(Student.id).where(Student.name == query).limit(1)).first()
+
+        def sql_like(query):
+            return db.session.execute(db.select(Student.id, Student.name, Student.faculty)
+                                      .where(Student.name.like(f'{query}%')).order_by(Student.name).limit(10)).all()
+
+        print(f"{'query':<34} {'p50 ms':>8} {'p99 ms':>8} {'found':>6}")
+        for label, queries in cases.items():
+            baseline = sql_like if label == 'typeahead prefix' else sql_equal
+            for method, fn in ((f'SQL {"LIKE" if baseline is sql_like else "="}', baseline),
+                               ('index search', lambda query: index.search(query, limit=10)),
+                               ('index find', index.find)):
+                if method == 'index find' and label == 'typeahead prefix':
+                    continue
+                p50, p99, found = timed(fn, queries)
+                print(f'{label + ", " + method:<34} {p50:>8.2f} {p99:>8.2f} {found:>6.0%}')
+
+        pairs = list(zip(prefixes, filters))
+        p50, p99, found = timed(lambda pair: index.search(pair[0], pair[1], limit=10), pairs)
+        print(f'{"prefix + faculty and interest":<34} {p50:>8.2f} {p99:>8.2f} {found:>6.0%}')
+
+        # The first result for a typo should be the intended name
+        correct = sum(normalize(index.search(query, limit=1)[0][1]) == normalize(name) if index.search(query, limit=1)
+                      else 0 for query, name in zip(cases['name with a typo'], picked))
+        print(f'typo queries whose top result is the intended name: {correct / len(picked):.0%}')
+
+        samples = []
+        for student_id in rng.sample(range(1, len(names) + 1), 20):
+            start = time.perf_counter()
+            index.update_student(student_id)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f're-indexing one student after a profile save: p50 {statistics.median(samples):.2f}ms')
+
+    if not args.db:
+        os.remove(app.config['BENCH_DB_PATH'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--db', help='keep the seeded database at this path and reuse it on later runs')
+    run(parser.parse_args())
@@ -0,0 +1,104 @@
+"""p50/p99 latency of /api/dynamic-prompt for the three built-in prompt types, comparing the old per-click
+SQL with the cached candidate lists.
+
+The old route serialized every candidate, which takes seconds per request at 100k students, so it is
+timed on --full-requests calls only; the old filters with the page applied in SQL are also shown to
+separate the effect of paging from the effect of the cache. Every variant serializes its page the same
+way and skips the HTTP layer.
+
+Usage: python benchmarks/bench_prompts.py [--students 100000] [--requests 200] [--full-requests 5] [--users 20] [--limit 50]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from datagen import load_app, seed
+from sqlalchemy import select
+from candidates import candidate_cache
+from facets import load_students
+from models.models import db, Student, StudentInterest, StudentClub, StudentLanguage
+from serializers import serialize_students
+
+PROMPT_TYPES = ['same_faculty', 'same_language_and_hobby', 'different_year_same_club']
+
+
+def legacy_candidates(user_name, prompt_type, limit=None):
+    """dynamic_prompt() as it was: look the user up by name and filter with IN (subquery) on every click"""
+    user = Student.query.filter_by(name=user_name).first()
+    query = Student.query.filter(Student.id != user.id)
+    if prompt_type == 'same_faculty':
+        query = query.filter(Student.faculty == user.faculty)
+    elif prompt_type == 'same_language_and_hobby':
+        languages = select(StudentLanguage.student_id).where(
+            StudentLanguage.language_id.in_([language.id for language in user.languages]))
+        interests = select(StudentInterest.student_id).where(
+            StudentInterest.interest_id.in_([interest.id for interest in user.interests]))
+        query = query.filter(Student.id.in_(languages)).filter(Student.id.in_(interests))
+    else:
+        clubs = select(StudentClub.student_id).where(
+            StudentClub.club_id.in_([club.id for club in user.clubs]))
+        query = query.filter(Student.year != user.year).filter(Student.id.in_(clubs))
+    students = query.order_by(Student.id).limit(limit).all()
+    db.session.remove()
+    return serialize_students(students)
+
+
+def cached_candidates(user_name, prompt_type, limit=None):
+    """dynamic_prompt() now: the same name lookup, then a slice of the cached candidate bitset"""
+    user_id = Student.query.filter_by(name=user_name).with_entities(Student.id).first().id
+    student_ids, _ = candidate_cache.page(user_id, prompt_type, 0, limit)
+    students = load_students(student_ids)
+    db.session.remove()
+    return serialize_students(students)
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return statistics.median(ordered), ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def timed(fn, calls):
+    samples = []
+    for args in calls:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def run(students, requests, full_requests, users, limit):
+    branchout = load_app()
+    app = branchout.app
+    with app.app_context():
+        seed(students)
+    rng = random.Random(0)
+    # Users with clubs, languages and interests so every prompt type has candidates
+    with app.app_context():
+        pool = [row.name for row in Student.query.filter(Student.clubs.any()).limit(users * 5)]
+    pool = rng.sample(pool, users)
+
+    print(f'{students} students, {requests} requests per prompt type from {users} users', flush=True)
+    print(f"{'prompt type':<28}{'variant':<24}{'p50 ms':>9}{'p99 ms':>9}", flush=True)
+    for prompt_type in PROMPT_TYPES:
+        calls = [(rng.choice(pool), prompt_type) for _ in range(requests)]
+        with app.app_context():
+            variants = [
+                ('old route, every row', calls[:full_requests], lambda n, p: legacy_candidates(n, p)),
+                (f'old SQL, LIMIT {limit}', calls, lambda n, p: legacy_candidates(n, p, limit)),
+                (f'cached, limit {limit}', calls, lambda n, p: cached_candidates(n, p, limit)),
+            ]
+            for label, sample, fn in variants:
+                p50, p99 = timed(fn, sample)
+                print(f'{prompt_type:<28}{label:<24}{p50:>9.2f}{p99:>9.2f}', flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--full-requests', type=int, default=5)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+    run(args.students, args.requests, args.full_requests, args.users, args.limit)
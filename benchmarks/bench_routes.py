@@ -0,0 +1,361 @@
+"""Drive every route through the Flask test client against seeded databases of growing size and report latency
+percentiles, SQL statements per request and peak RSS, saved as a JSON baseline.
+
+Each size is seeded and measured in its own subprocess, so peak RSS belongs to that size alone. Students get
+Zipf-distributed faculties, years and facets, two-person chats and matches on the built-in and sample prompts.
+Seeding a million students takes several minutes; pass --keep-db to seed once and reuse the databases.
+
+Usage:
+    python benchmarks/bench_routes.py [--sizes 1000 10000 100000 1000000] [--requests 50] [--output FILE]
+    python benchmarks/bench_routes.py --sizes 10000 --compare bench_routes.json   # exit 1 on a regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+from datagen import CLUBS, FACULTIES, INTERESTS, LANGUAGES, random_filters
+
+# Routes the harness does not drive, with the reason
+SKIPPED = {
+    '/api/events': 'endless Server-Sent Events stream, see bench_chat_push.py',
+    '/recreate-db': 'drops every table',
+    '/login': 'Google OAuth',
+    '/login/google': 'Google OAuth',
+    '/authorize': 'Google OAuth',
+    '/logout': 'ends the benchmark session',
+    '/static/<path:filename>': 'static files',
+}
+
+# Compared against a baseline: p95 may grow by the tolerance plus this many milliseconds of timer noise
+NOISE_MS = 1.0
+
+
+def rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def route_specs(users, pairs, prompts, new_matches):
+    """(name, rule, method, heavy, request builder) for every route the harness drives.
+
+    Request builders take a random.Random and return (url, keyword arguments for the test client).
+    Heavy routes touch every student and run --heavy-requests times instead of --requests.
+    ``prompts`` holds the (student, built-in prompt type) pairs whose profile fits the prompt, and
+    ``new_matches`` a valid (prompt id, submitter, matched student) for every match the harness creates.
+    """
+    def user(rng):
+        return rng.choice(users)
+
+    def profile_form(rng):
+        return {
+            'name': f'Student {users[0]}', 'year': str(rng.randint(1, 5)), 'faculty': rng.choice(FACULTIES),
+            'interests': rng.sample(INTERESTS, 3), 'clubs': rng.sample(CLUBS, 2), 'languages': rng.sample(LANGUAGES, 1),
+        }
+
+    def prompt_request(rng):
+        student, prompt_type = rng.choice(prompts)
+        return '/api/dynamic-prompt', {'json': {
+            'logged_in_user': f'Student {student}', 'limit': 50, 'prompt_type': prompt_type}}
+
+    def match_request(rng):
+        prompt_id, submitter, matched = new_matches.pop()
+        # As sent by the matches page: the id picked in the typeahead, with the name as a fallback
+        return '/api/match', {'json': {
+            'prompt_id': prompt_id, 'submitted_by': submitter, 'matched_user_id': matched,
+            'matched_user_name': f'Student {matched}'}}
+
+    def message_request(rng):
+        sender, receiver = rng.choice(pairs)
+        return '/api/messages', {'json': {'sender_id': sender, 'receiver_id': receiver, 'content': 'Benchmark message'}}
+
+    return [
+        ('index', '/', 'GET', False, lambda rng: ('/', {})),
+        ('directory page', '/directory', 'GET', False, lambda rng: ('/directory', {})),
+        ('directory api', '/api/directory', 'GET', False,
+         lambda rng: (f'/api/directory?cursor={rng.randint(0, len(users) * 10)}&limit=50', {})),
+        ('directory export', '/api/directory/export', 'GET', True, lambda rng: ('/api/directory/export', {})),
+        ('filter', '/api/filter', 'POST', False, lambda rng: ('/api/filter', {'json': random_filters(rng)})),
+        ('filter get', '/api/filter', 'GET', False, lambda rng: ('/api/filter', {'query_string': {
+            facet: value for facet, value in random_filters(rng).items() if value}})),
+        ('facet counts', '/api/facets', 'POST', False, lambda rng: ('/api/facets', {'json': random_filters(rng, 2)})),
+        ('student search', '/api/students/search', 'GET', False, lambda rng: ('/api/students/search', {
+            'query_string': {'q': f'Student {user(rng)}'[:rng.randint(3, 10)]}})),
+        ('validate name', '/api/validate-name', 'POST', False, lambda rng: ('/api/validate-name', {'json': {
+            'name': f'Student {user(rng)}', 'filters': random_filters(rng, 1)}})),
+        ('dynamic prompt', '/api/dynamic-prompt', 'POST', False, prompt_request),
+        ('similar', '/api/similar', 'GET', False, lambda rng: (f'/api/similar?user_id={user(rng)}&k=10', {})),
+        ('prompts', '/api/prompts', 'GET', False, lambda rng: ('/api/prompts', {})),
+        ('matches api', '/api/matches', 'GET', False, lambda rng: (f'/api/matches?user_id={user(rng)}', {})),
+        ('matches page', '/matches', 'GET', True, lambda rng: ('/matches', {})),
+        ('legacy messages', '/get_messages', 'GET', False,
+         lambda rng: ('/get_messages?user_id=%d&other_id=%d' % rng.choice(pairs), {})),
+        ('unread messages', '/api/unread_messages', 'GET', False,
+         lambda rng: (f'/api/unread_messages?user_id={rng.choice(pairs)[0]}', {})),
+        ('messages api', '/api/messages', 'GET', False,
+         lambda rng: ('/api/messages?user_id=%d&other_id=%d' % rng.choice(pairs), {})),
+        ('messages page', '/messages', 'GET', True, lambda rng: ('/messages', {})),
+        ('privacy', '/privacy', 'GET', False, lambda rng: ('/privacy', {})),
+        ('terms', '/terms', 'GET', False, lambda rng: ('/terms', {})),
+        ('metrics', '/metrics', 'GET', False, lambda rng: ('/metrics', {})),
+        ('profile form', '/submit', 'GET', False, lambda rng: ('/submit', {})),
+        # Writes last, so they do not change what the reads see
+        ('profile save', '/submit', 'POST', False, lambda rng: ('/submit', {'data': profile_form(rng)})),
+        ('create match', '/api/match', 'POST', False, match_request),
+        ('create prompt', '/api/prompts', 'POST', False, lambda rng: ('/api/prompts', {'json': {
+            'text': 'Who would you like to benchmark with?', 'created_by': user(rng)}})),
+        ('send message', '/api/messages', 'POST', False, message_request),
+    ]
+
+
+def uncovered_routes(app, specs):
+    """Rules of the app that are neither driven nor listed in SKIPPED"""
+    driven = {(rule, method) for _, rule, method, _, _ in specs}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.rule in SKIPPED:
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (rule.rule, method) not in driven:
+                missing.append(f'{method} {rule.rule}')
+    return missing
+
+
+def seed_database(size, rng_seed):
+    """Seed students, chats and matches into the app's database; run in its own process"""
+    from datagen import load_app, seed, seed_messages, seed_matches
+    branchout = load_app(os.environ['BENCH_DB'])
+    with branchout.app.app_context():
+        from unread import rebuild_unread_counters
+        start = time.perf_counter()
+        seed(size, rng_seed, skew=1.0)
+        seed_messages(size, max(10, size // 20), 20, rng_seed)
+        rebuild_unread_counters()
+        seed_matches(size, size // 2, rng_seed)
+        print(f'seeded {size} students in {time.perf_counter() - start:.1f}s', file=sys.stderr, flush=True)
+
+
+def prompt_candidates(student_id, prompt_type):
+    """The candidate bitset of a built-in prompt for a student, or None when their profile does not fit it.
+
+    Computed without the candidate cache, so the timed requests still start from a cold one.
+    """
+    from candidates import CandidateError, _profile, compute_candidates
+    try:
+        return compute_candidates(student_id, prompt_type, _profile(student_id))
+    except CandidateError:
+        return None
+
+
+def valid_matches(count, size, rng):
+    """Return ``count`` (built-in prompt id, submitter, matched student) the app accepts.
+
+    Each submitter has no match on the prompt yet and the matched student is one
+    of the prompt's candidates for them, so every request creates a match.
+    """
+    from facets import iter_ids, popcount
+    from models.models import db, Match
+    from prompts import BUILTIN_PROMPTS, builtin_prompts
+    from sqlalchemy import select
+    taken = set(db.session.execute(select(Match.submitted_by, Match.prompt_id)).tuples())
+    matches = []
+    while len(matches) < count:
+        prompt_id, (prompt_type, _) = rng.choice(sorted(BUILTIN_PROMPTS.items()))
+        submitter = rng.randint(1, size)
+        key = (submitter, builtin_prompts.id_for(prompt_type))
+        bits = None if key in taken else prompt_candidates(submitter, prompt_type)
+        if not bits:
+            continue
+        taken.add(key)
+        matches.append((prompt_id, submitter, next(islice(iter_ids(bits), rng.randrange(popcount(bits)), None))))
+    return matches
+
+
+def measure_routes(size, requests, heavy_requests, warmup, rng_seed):
+    """Drive every route against the seeded database and return the results; run in its own process"""
+    from candidates import PROMPT_FACETS
+    from datagen import load_app
+    from models.models import db, Message
+    from sqlalchemy import event, func, select
+    branchout = load_app(os.environ['BENCH_DB'])
+    app = branchout.app
+    rng = random.Random(rng_seed)
+
+    with app.app_context():
+        engine = db.engine
+        max_message = db.session.execute(select(func.max(Message.id))).scalar()
+        sample = [rng.randint(1, max_message) for _ in range(200)]
+        pairs = [tuple(row) for row in db.session.execute(
+            select(Message.sender_id, Message.receiver_id).where(Message.id.in_(sample)))]
+    users = [rng.randint(1, size) for _ in range(200)]
+    with app.app_context():
+        prompts = [(student, prompt_type) for student in users for prompt_type in PROMPT_FACETS
+                   if prompt_candidates(student, prompt_type) is not None]
+        new_matches = valid_matches(warmup + requests, size, rng)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(users[0])
+
+    statements = [0]
+    counter = lambda *args: statements.__setitem__(0, statements[0] + 1)
+    specs = route_specs(users, pairs, prompts, new_matches)
+    results = {}
+    start_rss = rss_mb()
+    for name, rule, method, heavy, build in specs:
+        calls = (heavy_requests if heavy else requests)
+        timings, counts, statuses = [], [], Counter()
+        # No app context around the requests: each one must get and tear down its own session like in production
+        event.listen(engine, 'before_cursor_execute', counter)
+        try:
+            for n in range(warmup + calls):
+                url, kwargs = build(rng)
+                statements[0] = 0
+                begin = time.perf_counter()
+                response = client.open(url, method=method, **kwargs)
+                response.get_data()
+                elapsed = (time.perf_counter() - begin) * 1000
+                response.close()
+                if n >= warmup:
+                    timings.append(elapsed)
+                    counts.append(statements[0])
+                    statuses[str(response.status_code)] += 1
+        finally:
+            event.remove(engine, 'before_cursor_execute', counter)
+        # A route that fails fast would look like a speed-up, so every timed request must succeed
+        failed = {status: count for status, count in statuses.items() if int(status) >= 400}
+        if failed:
+            sys.exit(f'{name}: {method} {rule} answered {failed}')
+        timings.sort()
+        results[name] = {
+            'method': method,
+            'rule': rule,
+            'requests': calls,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'max_ms': round(timings[-1], 3),
+            'queries_median': statistics.median(counts),
+            'queries_max': max(counts),
+            'statuses': dict(statuses),
+            'peak_rss_mb': round(rss_mb(), 1),
+        }
+        print(f'{size:>9} {name:<18} p50 {results[name]["p50_ms"]:9.2f}ms  p99 {results[name]["p99_ms"]:9.2f}ms  '
+              f'{results[name]["queries_max"]:>4} queries  {dict(statuses)}', file=sys.stderr, flush=True)
+    return {'students': size, 'start_rss_mb': round(start_rss, 1), 'routes': results,
+            'not_covered': uncovered_routes(app, specs)}
+
+
+def run_size(args, size, db_path):
+    """Seed (unless the database exists) and measure one size in fresh subprocesses"""
+    env = dict(os.environ, BENCH_DB=db_path)
+    base = [sys.executable, os.path.abspath(__file__), '--size', str(size), '--seed', str(args.seed)]
+    if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
+        subprocess.run(base + ['--worker', 'seed'], env=env, check=True)
+    # Progress goes to stderr, the results to stdout
+    worker = subprocess.run(base + ['--worker', 'measure', '--requests', str(args.requests),
+                                    '--heavy-requests', str(args.heavy_requests), '--warmup', str(args.warmup)],
+                            env=env, check=True, stdout=subprocess.PIPE)
+    return json.loads(worker.stdout)
+
+
+def compare(baseline, report, tolerance):
+    """Return a description of every route that got slower or issues more statements than in the baseline"""
+    regressions = []
+    for size, result in report['sizes'].items():
+        old_routes = baseline.get('sizes', {}).get(size, {}).get('routes', {})
+        for name, new in result['routes'].items():
+            old = old_routes.get(name)
+            if old is None:
+                continue
+            if new['p95_ms'] > old['p95_ms'] * (1 + tolerance) + NOISE_MS:
+                regressions.append(f'{size} students, {name}: p95 {old["p95_ms"]:.2f}ms -> {new["p95_ms"]:.2f}ms')
+            if new['queries_max'] > old['queries_max']:
+                regressions.append(f'{size} students, {name}: {old["queries_max"]} -> {new["queries_max"]} queries')
+    return regressions
+
+
+def print_table(report):
+    print(f"{'students':>9} {'route':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'RSS MB':>8}")
+    for size, result in report['sizes'].items():
+        for name, route in result['routes'].items():
+            print(f"{size:>9} {name:<18} {route['p50_ms']:>9.2f} {route['p95_ms']:>9.2f} {route['p99_ms']:>9.2f} "
+                  f"{route['queries_max']:>8} {route['peak_rss_mb']:>8.1f}")
+        for route in result['not_covered']:
+            print(f'{size:>9} not benchmarked: {route}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--heavy-requests', type=int, default=3, help='timed requests per route that reads every student')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed requests per route, e.g. to build caches')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep-db', metavar='DIR', help='seed into DIR/branchout-<size>.db once and reuse it')
+    parser.add_argument('--output', default='bench_routes.json', help='where to save the JSON results')
+    parser.add_argument('--compare', metavar='FILE', help='baseline JSON to compare with; exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 growth over the baseline')
+    parser.add_argument('--worker', choices=['seed', 'measure'], help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker == 'seed':
+        seed_database(args.size, args.seed)
+        return
+    if args.worker == 'measure':
+        json.dump(measure_routes(args.size, args.requests, args.heavy_requests, args.warmup, args.seed), sys.stdout)
+        return
+
+    report = {
+        'created': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'requests': args.requests,
+        'sizes': {},
+    }
+    for size in args.sizes:
+        if args.keep_db:
+            os.makedirs(args.keep_db, exist_ok=True)
+            db_path = os.path.join(args.keep_db, f'branchout-{size}.db')
+            report['sizes'][str(size)] = run_size(args, size, db_path)
+        else:
+            fd, db_path = tempfile.mkstemp(suffix='.db', prefix=f'branchout-routes-{size}-')
+            os.close(fd)
+            os.remove(db_path)
+            try:
+                report['sizes'][str(size)] = run_size(args, size, db_path)
+            finally:
+                if os.path.exists(db_path):
+                    os.remove(db_path)
+
+    print_table(report)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f'saved {args.output}')
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(json.load(baseline), report, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Time the "people you should meet" ranking: building the packed matrix, scoring every student against
+one user with a top-k pick, and rewriting one row after a profile save.
+
+Usage: python benchmarks/bench_similarity.py [--students 1000000] [--queries 100] [--k 10] [--db PATH]
+
+Seeding a million students takes over a minute; pass --db to keep the database and reuse it on later runs.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from datagen import create_app, seed
+from similarity import SimilarityIndex
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return statistics.median(ordered), ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def run(students, queries, k, db_path=None):
+    reuse = db_path and os.path.exists(db_path) and os.path.getsize(db_path) > 0
+    app = create_app(db_path)
+    with app.app_context():
+        if not reuse:
+            start = time.perf_counter()
+            seed(students)
+            print(f'seeded {students} students in {time.perf_counter() - start:.1f}s', flush=True)
+
+        index = SimilarityIndex(ttl=0)
+        start = time.perf_counter()
+        index.build()
+        print(f'matrix build: {time.perf_counter() - start:.2f}s', flush=True)
+
+        rng = random.Random(0)
+        users = [rng.randint(1, students) for _ in range(queries)]
+        for metric in ('jaccard', 'cosine'):
+            samples = []
+            for user_id in users:
+                start = time.perf_counter()
+                index.top(user_id, k, metric)
+                samples.append((time.perf_counter() - start) * 1000)
+            p50, p99 = percentiles(samples)
+            print(f'{metric:<8} score {students} students + top {k}: p50 {p50:.1f}ms  p99 {p99:.1f}ms', flush=True)
+
+        samples = []
+        for user_id in users[:20]:
+            start = time.perf_counter()
+            index.update_student(user_id)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f'row update after a profile save: p50 {statistics.median(samples):.2f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--db', help='SQLite file to seed once and reuse')
+    args = parser.parse_args()
+    run(args.students, args.queries, args.k, args.db)
@@ -0,0 +1,115 @@
+"""Measure how long a fresh worker process takes to boot: interpreter start, importing app.py and building the
+app, and serving its first request, each in a new process the way gunicorn starts a worker.
+
+Pass --baseline REV to measure the same against another git revision, exported to a temporary directory, and
+print both side by side. Both trees use one database that the current tree bootstrapped beforehand.
+
+Usage: python benchmarks/bench_startup.py [--runs 10] [--baseline HEAD~1] [--url /api/prompts]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the worker process; app.py prints on import in older trees, so the result goes to a file
+WORKER = '''
+import json, resource, sys, time
+started = time.perf_counter()
+import app as module
+application = module.app
+booted = time.perf_counter()
+status = application.test_client().get(sys.argv[2]).status_code
+served = time.perf_counter()
+with open(sys.argv[1], 'w') as f:
+    json.dump({'boot_ms': (booted - started) * 1000, 'first_request_ms': (served - booted) * 1000,
+               'status': status, 'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+               'modules': len(sys.modules)}, f)
+'''
+
+
+def export_revision(revision, directory):
+    """Write the tree of a git revision into directory"""
+    archive = subprocess.run(['git', 'archive', revision], cwd=ROOT, check=True, capture_output=True).stdout
+    subprocess.run(['tar', '-x', '-C', directory], input=archive, check=True)
+
+
+def run_worker(tree, env, url):
+    fd, result_path = tempfile.mkstemp(suffix='.json', prefix='branchout-startup-')
+    os.close(fd)
+    try:
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', WORKER, result_path, url], cwd=tree, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        total = (time.perf_counter() - started) * 1000
+        with open(result_path) as f:
+            result = json.load(f)
+    finally:
+        os.remove(result_path)
+    result['process_ms'] = total
+    return result
+
+
+def import_profile(tree, env, top):
+    """The slowest modules app.py imports directly according to python -X importtime, as (module, ms)"""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app; app.app'], cwd=tree, env=env,
+                            check=True, capture_output=True, text=True).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nesting is two spaces per level after the separator; app.py's own imports are one level deep
+        if name.startswith('   ') and not name.startswith('     '):
+            modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda module: -module[1])[:top]
+
+
+def measure(tree, env, runs, url):
+    results = [run_worker(tree, env, url) for _ in range(runs)]
+    summary = {key: statistics.median(result[key] for result in results)
+               for key in ('process_ms', 'boot_ms', 'first_request_ms', 'rss_mb', 'modules')}
+    summary['status'] = results[0]['status']
+    summary['imports'] = import_profile(tree, env, 8)
+    return summary
+
+
+def report(name, summary):
+    print(f"{name}: process {summary['process_ms']:.0f}ms, import and create app {summary['boot_ms']:.0f}ms, "
+          f"first request {summary['first_request_ms']:.0f}ms (status {summary['status']}), "
+          f"{summary['modules']:.0f} modules, peak RSS {summary['rss_mb']:.0f} MB")
+    for module, ms in summary['imports']:
+        print(f'  {ms:8.1f}ms  {module}')
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='branchout-startup-')
+    try:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'startup.db')}")
+        env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+        subprocess.run([sys.executable, 'bootstrap.py'], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+        trees = [('current', ROOT)]
+        if args.baseline:
+            baseline = os.path.join(directory, 'baseline')
+            os.makedirs(baseline)
+            export_revision(args.baseline, baseline)
+            trees.insert(0, (args.baseline, baseline))
+        print(f'median of {args.runs} cold starts, first request GET {args.url}')
+        for name, tree in trees:
+            report(name, measure(tree, env, args.runs, args.url))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--baseline', metavar='REV', help='git revision to compare against, e.g. HEAD~1')
+    parser.add_argument('--url', default='/api/prompts', help='path of the first request')
+    run(parser.parse_args())
@@ -0,0 +1,77 @@
+"""Count the SQL statements one profile save issues, before and after the diff-based taxonomy sync.
+
+Usage: python benchmarks/bench_submit.py
+"""
+import os
+import time
+
+from datagen import create_app, seed
+from sqlalchemy import event
+from models.models import db, Interest, Club, Language, StudentInterest, StudentClub, StudentLanguage
+from taxonomy import save_student_facets
+
+SCENARIOS = [
+    ('first save', {'interests': ['Music', 'Art', 'Coding', 'Travel'], 'clubs': ['Chess Club', 'Drama Club', 'Book Club'], 'languages': ['English', 'French']}),
+    ('unchanged re-save', {'interests': ['Music', 'Art', 'Coding', 'Travel'], 'clubs': ['Chess Club', 'Drama Club', 'Book Club'], 'languages': ['English', 'French']}),
+    ('swap one interest', {'interests': ['Music', 'Art', 'Coding', 'Cooking'], 'clubs': ['Chess Club', 'Drama Club', 'Book Club'], 'languages': ['English', 'French']}),
+    ('add a new interest', {'interests': ['Music', 'Art', 'Coding', 'Cooking', 'Bouldering'], 'clubs': ['Chess Club', 'Drama Club', 'Book Club'], 'languages': ['English', 'French']}),
+]
+
+
+def legacy_save(student_id, selections):
+    """The submit() loop as it was: delete everything, then look up and insert one name at a time"""
+    with db.session.no_autoflush:
+        for assoc, taxonomy, column, names in (
+            (StudentInterest, Interest, 'interest_id', selections['interests']),
+            (StudentClub, Club, 'club_id', selections['clubs']),
+            (StudentLanguage, Language, 'language_id', selections['languages']),
+        ):
+            assoc.query.filter_by(student_id=student_id).delete()
+            db.session.flush()
+            for name in names:
+                row = taxonomy.query.filter_by(name=name).first()
+                if not row:
+                    row = taxonomy(name=name)
+                    db.session.add(row)
+                    db.session.flush()
+                db.session.add(assoc(student_id=student_id, **{column: row.id}))
+
+
+def measure(save, student_id):
+    statements = [0]
+    counter = lambda *args: statements.__setitem__(0, statements[0] + 1)
+    event.listen(db.engine, 'before_cursor_execute', counter)
+    results = []
+    try:
+        for name, selections in SCENARIOS:
+            statements[0] = 0
+            start = time.perf_counter()
+            save(student_id, selections)
+            db.session.commit()
+            results.append((name, statements[0], (time.perf_counter() - start) * 1000))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', counter)
+    return results
+
+
+def run():
+    app = create_app()
+    try:
+        with app.app_context():
+            seed(1000)
+            for assoc in (StudentInterest, StudentClub, StudentLanguage):
+                assoc.query.filter(assoc.student_id.in_([1, 2])).delete()
+            db.session.commit()
+            before = measure(legacy_save, 1)
+            db.session.query(Interest).filter_by(name='Bouldering').delete()
+            db.session.commit()
+            after = measure(save_student_facets, 2)
+        print(f"{'scenario':<20} {'before':>18} {'after':>18}")
+        for (name, old_count, old_ms), (_, new_count, new_ms) in zip(before, after):
+            print(f'{name:<20} {old_count:>4} stmts {old_ms:6.2f}ms {new_count:>4} stmts {new_ms:6.2f}ms')
+    finally:
+        os.remove(app.config['BENCH_DB_PATH'])
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,167 @@
+"""Serve the app with gunicorn while --streams browser tabs hold /api/events open, and drive mixed chat traffic
+over HTTP, to show whether the other routes stay responsive.
+
+Compares sync workers, gthread workers with 8 threads (or --threads) and no limit on streams, and the shipped
+gunicorn.conf.py, which keeps EVENTS_MAX_STREAMS threads per worker for streams and GUNICORN_REQUEST_THREADS for
+everything else, answering further tabs with a short poll. Every SQL statement sleeps --db-latency-ms first,
+standing in for the network round trip to PostgreSQL, so the workers spend their time waiting the way they do
+in production. Statements inside a write transaction are exempt, since SQLite would hold its database-wide
+write lock during the sleep. Requests that get no answer within --timeout seconds count as errors.
+
+Usage: python benchmarks/bench_threads.py [--streams 0 16 96] [--threads 8] [--workers 2] [--clients 32]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from liveserver import ROOT, EventClient, free_port, percentile, start_server, stop_server
+
+OPERATIONS = ('read', 'unread', 'send')
+
+
+def latency_app():
+    """The app with a sleep before every statement; gunicorn builds it through 'bench_threads:latency_app()'"""
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from models.models import db
+    from sqlalchemy import event
+
+    app = create_app()
+    delay = float(os.environ.get('BENCH_DB_LATENCY_MS', 0)) / 1000
+
+    def round_trip(conn, cursor, statement, parameters, context, executemany):
+        # Not while SQLite holds its database-wide write lock, which PostgreSQL's row locks do not emulate
+        if not cursor.connection.in_transaction:
+            time.sleep(delay)
+
+    if delay:
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', round_trip)
+    return app
+
+
+def client(port, pairs, write_ratio, deadline, timeout, rng_seed, results):
+    rng = random.Random(rng_seed)
+    latencies = {operation: [] for operation in OPERATIONS}
+    errors = 0
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    sent = 0
+    while time.perf_counter() < deadline:
+        user_id, other_id = rng.choice(pairs)
+        if rng.random() < 0.5:
+            user_id, other_id = other_id, user_id
+        roll = rng.random()
+        operation = 'send' if roll < write_ratio else 'read' if roll < (1 + write_ratio) / 2 else 'unread'
+        started = time.perf_counter()
+        try:
+            if operation == 'send':
+                sent += 1
+                body = json.dumps({'sender_id': user_id, 'receiver_id': other_id,
+                                   'content': f'Bench message {rng_seed}-{sent}'})
+                connection.request('POST', '/api/messages', body, {'Content-Type': 'application/json'})
+            elif operation == 'read':
+                connection.request('GET', f'/api/messages?user_id={user_id}&other_id={other_id}')
+            else:
+                connection.request('GET', f'/api/unread_messages?user_id={user_id}')
+            response = connection.getresponse()
+            response.read()
+            failed = response.status >= 500
+        except (OSError, http.client.HTTPException):
+            failed = True
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        if failed:
+            errors += 1
+        elif time.perf_counter() < deadline:
+            latencies[operation].append((time.perf_counter() - started) * 1000)
+    connection.close()
+    results.append((latencies, errors))
+
+
+def run_config(name, worker_args, env, pairs, streams, args):
+    port = free_port()
+    server = start_server(port, env, worker_args, 'bench_threads:latency_app()')
+    stop = threading.Event()
+    try:
+        tabs = [EventClient(port, pairs[n % len(pairs)][0], stop) for n in range(streams)]
+        for tab in tabs:
+            tab.start()
+        time.sleep(1)
+        results = []
+        deadline = time.perf_counter() + args.seconds
+        clients = [threading.Thread(target=client, args=(port, pairs, args.write_ratio, deadline, args.timeout, n,
+                                                         results))
+                   for n in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        held = sum(tab.held for tab in tabs)
+    finally:
+        stop.set()
+        stop_server(server)
+
+    latencies = {operation: [] for operation in OPERATIONS}
+    errors = 0
+    for client_latencies, client_errors in results:
+        errors += client_errors
+        for operation in OPERATIONS:
+            latencies[operation] += client_latencies[operation]
+    every = [value for values in latencies.values() for value in values]
+    send = latencies['send']
+    print(f'{name:>22} {streams:8} {held:5} {len(every) / args.seconds:8.0f} {percentile(every, 0.5):8.1f} '
+          f'{percentile(every, 0.99):8.1f} {percentile(send, 0.99):9.1f} {errors:7}')
+
+
+def run(args):
+    from datagen import create_app, seed, seed_messages
+
+    directory = tempfile.mkdtemp(prefix='branchout-threads-')
+    try:
+        db_path = os.path.join(directory, 'threads.db')
+        app = create_app(db_path)
+        with app.app_context():
+            seed(args.students)
+            pairs = seed_messages(args.students, args.conversations, args.history)
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', BENCH_DB_LATENCY_MS=str(args.db_latency_ms),
+                   WEB_CONCURRENCY=str(args.workers), PROMETHEUS_MULTIPROC_DIR=os.path.join(directory, 'metrics'))
+        env.pop('EVENTS_MAX_STREAMS', None)
+        env.pop('GUNICORN_REQUEST_THREADS', None)
+        print(f'{args.workers} workers, {args.clients} clients, {args.db_latency_ms}ms per statement, '
+              f'{args.write_ratio:.0%} sends, {args.seconds}s per run; "held" streams are open, the rest poll')
+        print(f"{'worker model':>22} {'streams':>8} {'held':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'send p99':>9} {'errors':>7}")
+        for streams in args.streams:
+            # gunicorn turns sync workers into gthread ones whenever threads > 1, as gunicorn.conf.py sets it
+            run_config('sync', ['-k', 'sync', '--threads', '1'], dict(env, EVENTS_MAX_STREAMS='0'), pairs, streams,
+                       args)
+            for threads in args.threads:
+                run_config(f'gthread x{threads}, no limit', ['-k', 'gthread', '--threads', str(threads)],
+                           dict(env, EVENTS_MAX_STREAMS='0', DB_POOL_SIZE=str(threads)), pairs, streams, args)
+            run_config('gunicorn.conf.py', [], env, pairs, streams, args)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, nargs='+', default=[0, 16, 96],
+                        help='browser tabs following /api/events during each run')
+    parser.add_argument('--threads', type=int, nargs='+', default=[8], help='gthread sizes to run without a limit')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=32, help='concurrent HTTP clients')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--timeout', type=float, default=5, help='seconds before a request counts as an error')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='share of requests that send a message')
+    parser.add_argument('--db-latency-ms', type=float, default=5, help='simulated round trip per SQL statement')
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--conversations', type=int, default=1000)
+    parser.add_argument('--history', type=int, default=50, help='messages already in each conversation')
+    run(parser.parse_args())
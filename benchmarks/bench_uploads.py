@@ -0,0 +1,88 @@
+"""Compare the image bytes one directory page downloads with original uploads and with the resized renditions,
+and the time a profile save spends on the picture when processing inline or on the upload pipeline.
+
+Usage: python benchmarks/bench_uploads.py [--photos 10] [--page-size 50]
+"""
+import argparse
+import io
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+from uploads import make_renditions, is_image
+
+
+def synthetic_photo(rng, width=3024, height=4032):
+    """A phone-camera sized JPEG with sensor-like noise, shapes and an EXIF block"""
+    base = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    image = Image.blend(base, noise, 0.35)
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randrange(50, 600)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    exif = Image.Exif()
+    exif[0x0110] = 'Benchmark Phone'   # Model
+    exif[0x0112] = 6                   # Orientation: rotate 90
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=92, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def run(photos, page_size):
+    rng = random.Random(0)
+    folder = tempfile.mkdtemp(prefix='branchout-uploads-')
+    try:
+        sizes = {'original': [], 'thumb.jpg': [], 'thumb.webp': [], 'medium.jpg': [], 'medium.webp': []}
+        inline, queued = [], []
+        for n in range(photos):
+            data = synthetic_photo(rng)
+            source = os.path.join(folder, f'photo{n}.jpg')
+
+            # What submit() does on the request thread now: check the header and save the bytes
+            start = time.perf_counter()
+            stream = io.BytesIO(data)
+            is_image(stream)
+            with open(source, 'wb') as f:
+                f.write(stream.read())
+            queued.append((time.perf_counter() - start) * 1000)
+
+            # What it would cost to resize and re-encode inline
+            start = time.perf_counter()
+            written = make_renditions(source, folder, f'photo{n}')
+            inline.append(queued[-1] + (time.perf_counter() - start) * 1000)
+
+            sizes['original'].append(len(data))
+            for name in written:
+                sizes[name.split('_', 1)[1]].append(os.path.getsize(os.path.join(folder, name)))
+            with Image.open(os.path.join(folder, f'photo{n}_thumb.jpg')) as thumb:
+                assert not thumb.getexif(), 'rendition kept EXIF metadata'
+
+        with Image.open(source) as image:
+            width, height = image.size
+        print(f"{photos} synthetic {width}x{height} photos, directory page of {page_size} cards")
+        print(f"{'variant':<12}{'avg bytes':>12}{'bytes/page':>14}{'vs original':>13}")
+        original_page = statistics.mean(sizes['original']) * page_size
+        for key, values in sizes.items():
+            page = statistics.mean(values) * page_size
+            print(f"{key:<12}{statistics.mean(values):>12,.0f}{page:>14,.0f}{original_page / page:>12.1f}x")
+        print(f"\nprofile save picture handling: inline {statistics.median(inline):.1f} ms, "
+              f"queued {statistics.median(queued):.1f} ms (median)")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--photos', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+    run(args.photos, args.page_size)
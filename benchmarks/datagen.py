@@ -0,0 +1,201 @@
+"""Synthetic student data for the benchmark scripts"""
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from models.models import (db, Student, Interest, Club, Language, StudentInterest, StudentClub, StudentLanguage,
+                           Message, Prompt, Match)
+from prompts import builtin_prompts
+
+# Same sample taxonomies as recreate_db.py
+LANGUAGES = ['English', 'Mandarin', 'Spanish', 'French', 'German', 'Japanese', 'Korean', 'Arabic', 'Russian', 'Hindi']
+INTERESTS = ['Reading', 'Sports', 'Music', 'Art', 'Gaming', 'Cooking', 'Travel', 'Photography', 'Coding', 'Dancing']
+CLUBS = ['Chess Club', 'Debate Society', 'Drama Club', 'Music Society', 'Sports Club', 'Coding Club', 'Photography Club', 'Art Club', 'Dance Club', 'Book Club']
+FACULTIES = ['Engineering', 'Science', 'Arts', 'Business', 'Medicine', 'Law', 'Education', 'Design']
+YEARS = [1, 2, 3, 4, 5]
+
+# Same sample prompts as /recreate-db
+SAMPLE_PROMPTS = [
+    "Who's the most helpful person this week?",
+    "Who made you smile today?",
+    "Most creative person this week?",
+    "Who would you like to collaborate with?",
+    "Who gave the best presentation recently?",
+    "Who helped you learn something new?",
+    "Who has the most interesting hobby?",
+    "Who would you recommend as a study partner?",
+    "Who has the most positive energy?",
+    "Who would you like to know better?",
+]
+
+BATCH_SIZE = 10000
+
+
+def create_app(db_path=None):
+    """Create a bare Flask app bound to a scratch SQLite database"""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(suffix='.db', prefix='branchout-bench-')
+        os.close(fd)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    app.config['BENCH_DB_PATH'] = db_path
+    return app
+
+
+def load_app(db_path=None):
+    """Build the real app from app.py bound to a scratch SQLite database, returning the module"""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(suffix='.db', prefix='branchout-bench-')
+        os.close(fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    import app as branchout
+    branchout.app.config['BENCH_DB_PATH'] = db_path
+    return branchout
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(model.__table__.insert(), rows[start:start + BATCH_SIZE])
+
+
+def zipf_weights(count, skew):
+    """Weights 1/rank**skew for ``count`` values, so the first values in a list are the most popular"""
+    return [1.0 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def _weighted_sample(rng, population, weights, k):
+    # k distinct values, each drawn with probability proportional to its weight (Efraimidis-Spirakis keys)
+    keys = sorted(((rng.random() ** (1.0 / weight), value) for value, weight in zip(population, weights)), reverse=True)
+    return [value for _, value in keys[:k]]
+
+
+def seed(count, rng_seed=0, skew=0.0):
+    """Create the schema and insert ``count`` students with random facets.
+
+    With ``skew`` 0 every faculty, year, interest, club and language is equally
+    likely. A positive ``skew`` draws them from a Zipf-like distribution instead,
+    like a real campus where a few faculties and hobbies dominate and fewer
+    students stay for the later years.
+
+    Must be called inside an app context.
+    """
+    rng = random.Random(rng_seed)
+    db.drop_all()
+    db.create_all()
+    builtin_prompts.load()
+
+    _insert(Language, [{'id': i + 1, 'name': name} for i, name in enumerate(LANGUAGES)])
+    _insert(Interest, [{'id': i + 1, 'name': name} for i, name in enumerate(INTERESTS)])
+    _insert(Club, [{'id': i + 1, 'name': name} for i, name in enumerate(CLUBS)])
+
+    def pick(values, k):
+        if not skew:
+            return rng.sample(values, k)
+        return _weighted_sample(rng, values, zipf_weights(len(values), skew), k)
+
+    for start in range(1, count + 1, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, count + 1)
+        students, interests, clubs, languages = [], [], [], []
+        for student_id in range(start, stop):
+            if skew:
+                year = rng.choices(YEARS, zipf_weights(len(YEARS), skew / 2))[0]
+                faculty = rng.choices(FACULTIES, zipf_weights(len(FACULTIES), skew))[0]
+            else:
+                year = rng.randint(1, 5)
+                faculty = rng.choice(FACULTIES)
+            students.append({
+                'id': student_id,
+                'name': f'Student {student_id}',
+                'year': year,
+                'faculty': faculty,
+                'profile_picture': '/static/img/default-profile.jpg',
+                'email': f'student{student_id}@example.com',
+                'first_login': False,
+            })
+            for interest_id in pick(range(1, len(INTERESTS) + 1), rng.randint(1, 4)):
+                interests.append({'student_id': student_id, 'interest_id': interest_id})
+            for club_id in pick(range(1, len(CLUBS) + 1), rng.randint(0, 3)):
+                clubs.append({'student_id': student_id, 'club_id': club_id})
+            for language_id in pick(range(1, len(LANGUAGES) + 1), rng.randint(1, 2)):
+                languages.append({'student_id': student_id, 'language_id': language_id})
+        _insert(Student, students)
+        _insert(StudentInterest, interests)
+        _insert(StudentClub, clubs)
+        _insert(StudentLanguage, languages)
+        db.session.commit()
+
+
+def seed_messages(students, conversations, per_conversation, rng_seed=0):
+    """Insert ``conversations`` two-person chats of ``per_conversation`` messages each.
+
+    Returns the (user_id, other_id) pairs so callers can poll them.
+    """
+    rng = random.Random(rng_seed)
+    start = datetime.utcnow() - timedelta(days=30)
+    pairs, rows = [], []
+    for _ in range(conversations):
+        user_id, other_id = rng.sample(range(1, students + 1), 2)
+        pairs.append((user_id, other_id))
+        for n in range(per_conversation):
+            sender, receiver = (user_id, other_id) if rng.random() < 0.5 else (other_id, user_id)
+            rows.append({
+                'sender_id': sender,
+                'receiver_id': receiver,
+                'content': f'Message {n}',
+                'timestamp': start + timedelta(minutes=n),
+                'read': n < per_conversation - 2,
+            })
+    _insert(Message, rows)
+    db.session.commit()
+    return pairs
+
+
+def seed_matches(students, count, rng_seed=0):
+    """Insert the sample prompts and about ``count`` matches on them and on the built-in prompts.
+
+    Submitters, prompts and matched students are drawn at random, keeping at
+    most one match per submitter and prompt. Returns the number of matches.
+    """
+    rng = random.Random(rng_seed)
+    _insert(Prompt, [{'text': text, 'created_by': rng.randint(1, students)} for text in SAMPLE_PROMPTS])
+    prompt_ids = list(db.session.execute(db.select(Prompt.id)).scalars())
+    start = datetime.utcnow() - timedelta(days=30)
+    seen, rows = set(), []
+    for _ in range(count):
+        submitter, matched = rng.sample(range(1, students + 1), 2)
+        prompt_id = rng.choice(prompt_ids)
+        if (submitter, prompt_id) in seen:
+            continue
+        seen.add((submitter, prompt_id))
+        rows.append({
+            'prompt_id': prompt_id,
+            'matched_user_id': matched,
+            'submitted_by': submitter,
+            'timestamp': start + timedelta(seconds=rng.randint(0, 30 * 86400)),
+        })
+    _insert(Match, rows)
+    db.session.commit()
+    return len(rows)
+
+
+def random_filters(rng, facets=3):
+    """Build a random /api/filter payload selecting ``facets`` values"""
+    filters = {'faculty': '', 'interests': [], 'clubs': [], 'languages': []}
+    for _ in range(facets):
+        facet = rng.choice(['faculty', 'interests', 'clubs', 'languages'])
+        if facet == 'faculty':
+            filters['faculty'] = rng.choice(FACULTIES)
+        elif facet == 'interests':
+            filters['interests'].append(rng.choice(INTERESTS))
+        elif facet == 'clubs':
+            filters['clubs'].append(rng.choice(CLUBS))
+        else:
+            filters['languages'].append(rng.choice(LANGUAGES))
+    return filters
@@ -0,0 +1,122 @@
+"""Run the app under gunicorn with the shipped gunicorn.conf.py for the benchmark scripts that talk HTTP"""
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = 'benchmark-secret-key'
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, env, worker_args=(), app_spec='app:create_app()'):
+    """Start gunicorn on ``port`` and wait until it answers"""
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+               '--chdir', ROOT, '--pythonpath', os.path.join(ROOT, 'benchmarks'),
+               '-b', f'127.0.0.1:{port}', '--log-level', 'warning'] + list(worker_args) + [app_spec]
+    env = dict(env, SECRET_KEY=SECRET_KEY)
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/api/prompts')
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def stop_server(server):
+    # SIGINT is gunicorn's quick shutdown, which does not wait for the open streams
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def session_cookie(user_id):
+    """A Cookie header that signs the request in as ``user_id``, like a finished Google login"""
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    value = app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(user_id), '_fresh': True})
+    return f'session={value}'
+
+
+class EventClient(threading.Thread):
+    """Follow /api/events like a browser's EventSource: reconnect after the advertised retry with
+    Last-Event-ID, and call ``on_event(client, event_type, data)`` for every dispatched event"""
+
+    def __init__(self, port, user_id, stop, on_event=None, timeout=60):
+        super().__init__(daemon=True)
+        self.port = port
+        self.user_id = user_id
+        self.stop = stop
+        self.on_event = on_event
+        self.timeout = timeout
+        self.last_id = None
+        self.connects = 0
+        # Whether the server is holding this stream open rather than answering it as a poll
+        self.held = False
+
+    def run(self):
+        retry = 2.0
+        while not self.stop.is_set():
+            headers = {'Cookie': session_cookie(self.user_id)}
+            if self.last_id is not None:
+                headers['Last-Event-ID'] = self.last_id
+            connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+            try:
+                connection.request('GET', f'/api/events?user_id={self.user_id}', headers=headers)
+                response = connection.getresponse()
+                self.connects += 1
+                retry = self._read(response, retry)
+            except (OSError, http.client.HTTPException):
+                pass
+            finally:
+                connection.close()
+                self.held = False
+            self.stop.wait(retry)
+
+    def _read(self, response, retry):
+        event_type, data = 'message', []
+        while not self.stop.is_set():
+            line = response.readline()
+            if not line:
+                return retry
+            line = line.decode().rstrip('\n')
+            if not line:
+                if data and self.on_event:
+                    self.on_event(self, event_type, '\n'.join(data))
+                event_type, data = 'message', []
+            elif line.startswith('retry: '):
+                retry = int(line[7:]) / 1000
+                self.held = retry <= 2
+            elif line.startswith('id: '):
+                self.last_id = line[4:]
+            elif line.startswith('event: '):
+                event_type = line[7:]
+            elif line.startswith('data: '):
+                data.append(line[6:])
+        return retry
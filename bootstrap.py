@@ -0,0 +1,76 @@
+"""One-time setup of a deployment: directories, the default profile picture, the schema and built-in prompts.
+
+Run it once per deploy, before the workers start:
+    flask --app app bootstrap
+    python bootstrap.py
+"""
+import os
+import click
+from sqlalchemy import inspect
+from models.models import db, Student
+from migrations import stamp, upgrade
+from prompts import builtin_prompts
+
+
+def create_default_picture(path):
+    """Draw the placeholder profile picture (a blue circle on white), returning False without Pillow"""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return False
+    img = Image.new('RGB', (200, 200), color=(255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((20, 20, 180, 180), fill=(66, 133, 244))
+    img.save(path)
+    return True
+
+
+def bootstrap(app):
+    """Create what the app expects to exist and bring the database up to date; safe to run again.
+
+    Returns a list of what was done, for the command to report.
+    """
+    done = []
+    img_dir = os.path.join(app.static_folder, 'img')
+    for folder in (app.config['UPLOAD_FOLDER'], img_dir):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+            done.append(f'created {folder}')
+
+    default_img_path = os.path.join(img_dir, 'default-profile.jpg')
+    if not os.path.exists(default_img_path):
+        if create_default_picture(default_img_path):
+            done.append(f'created {default_img_path}')
+        else:
+            done.append('Pillow is not installed, so no default profile picture was created (pip install pillow)')
+
+    with app.app_context():
+        fresh = not inspect(db.engine).has_table(Student.__tablename__)
+        db.create_all()
+        if fresh:
+            # create_all() built the current schema, so there is nothing for the migrations to change
+            stamp()
+            done.append('created the schema')
+        else:
+            applied = upgrade()
+            if applied:
+                done.append(f'applied migrations {applied}')
+        builtin_prompts.load()
+    return done
+
+
+def init_bootstrap(app):
+    """Register the ``flask bootstrap`` command"""
+
+    @app.cli.command('bootstrap')
+    def bootstrap_command():
+        """Create the schema, apply migrations, seed the built-in prompts and create missing assets."""
+        for line in bootstrap(app) or ['Nothing to do']:
+            click.echo(line)
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    for line in bootstrap(create_app()) or ['Nothing to do']:
+        print(line)
@@ -0,0 +1,181 @@
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import islice
+from models.models import db, Student
+from facets import facet_index, iter_ids, popcount, YEAR
+from serializers import load_facet_names
+
+# Facets each built-in prompt compares with the user's own profile
+PROMPT_FACETS = {
+    'same_faculty': ('faculty',),
+    'same_language_and_hobby': ('languages', 'interests'),
+    'different_year_same_club': ('clubs',),
+}
+
+
+def page_bits(bits, offset=0, limit=None):
+    """Return (ids, total) for a slice of a bitset in id order"""
+    ids = list(islice(iter_ids(bits), offset, None if limit is None else offset + limit))
+    return ids, popcount(bits)
+
+
+def compact(bits):
+    """Return the smaller of a bitset and the sorted array of its ids.
+
+    A bitset costs a bit per student up to the highest id in it, however few are
+    set, so sparse candidate sets are stored as 4-byte ids instead.
+    """
+    count = popcount(bits)
+    if count * 4 < bits.bit_length() // 8:
+        return array('I', iter_ids(bits))
+    return bits
+
+
+def page_entry(entry, offset=0, limit=None):
+    """Return (ids, total) for a slice of a compacted candidate set in id order"""
+    if isinstance(entry, array):
+        return list(entry[offset:None if limit is None else offset + limit]), len(entry)
+    return page_bits(entry, offset, limit)
+
+
+def entry_size(entry):
+    """Bytes a cached entry holds on to"""
+    return sys.getsizeof(entry)
+
+
+class CandidateError(Exception):
+    """The user's profile lacks what a prompt type needs"""
+
+
+def _profile(user_id):
+    """Return {facet: [values]} for one student, or None if the student does not exist"""
+    student = db.session.get(Student, user_id)
+    if student is None:
+        return None
+    profile = load_facet_names([user_id])[user_id]
+    profile['faculty'] = [student.faculty] if student.faculty else []
+    profile[YEAR] = [student.year]
+    return profile
+
+
+def compute_candidates(user_id, prompt_type, profile):
+    """Return the bitset of students matching a built-in prompt for the user"""
+    if prompt_type == 'same_faculty':
+        bits = facet_index.union('faculty', profile['faculty'])
+    elif prompt_type == 'same_language_and_hobby':
+        if not profile['languages'] or not profile['interests']:
+            raise CandidateError('User needs languages and interests for this prompt')
+        bits = facet_index.union('languages', profile['languages']) & facet_index.union('interests', profile['interests'])
+    elif prompt_type == 'different_year_same_club':
+        if not profile['clubs']:
+            raise CandidateError('User needs clubs for this prompt')
+        bits = facet_index.union('clubs', profile['clubs']) & ~facet_index.union(YEAR, profile[YEAR])
+    else:
+        raise ValueError(f'Unknown prompt type {prompt_type}')
+    return bits & ~(1 << user_id)
+
+
+class CandidateCache:
+    """Candidate sets per (user, prompt type), kept until something they depend on changes.
+
+    Each set is kept as a bitset or a sorted id array, whichever is smaller, and
+    the least recently used entries are dropped once they hold ``max_bytes``.
+
+    An entry depends on its user's own profile and on the facet values the prompt
+    compares. The facet index reports every student change with the values that
+    student had before and after it, so only the entries of the changed user and
+    of users sharing one of those values are dropped.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._dependents = {}
+        # Bumped on every change so a load that raced with one is not stored
+        self._generation = 0
+
+    def get(self, user_id, prompt_type):
+        """Return the candidates for a built-in prompt, as a bitset or a sorted id array.
+
+        Raises CandidateError when the user's profile lacks what the prompt needs
+        and LookupError when the user does not exist.
+        """
+        facet_index.ensure_built()
+        key = (user_id, prompt_type)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+        entry = cached[0] if cached is not None else self._load(user_id, prompt_type)
+        if isinstance(entry, CandidateError):
+            raise entry
+        return entry
+
+    def _load(self, user_id, prompt_type):
+        generation = self._generation
+        profile = _profile(user_id)
+        if profile is None:
+            raise LookupError(user_id)
+        try:
+            entry = compact(compute_candidates(user_id, prompt_type, profile))
+        except CandidateError as error:
+            entry = error
+
+        key = (user_id, prompt_type)
+        depends_on = [('user', user_id)] + [(facet, value) for facet in PROMPT_FACETS[prompt_type]
+                                            for value in profile[facet]]
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            size = entry_size(entry)
+            if size > self.max_bytes or key in self._entries:
+                return entry
+            self._entries[key] = (entry, depends_on, size)
+            self._bytes += size
+            for dependency in depends_on:
+                self._dependents.setdefault(dependency, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._forget(*self._entries.popitem(last=False))
+        return entry
+
+    def _forget(self, key, cached):
+        # Caller holds the lock
+        self._bytes -= cached[2]
+        for dependency in cached[1]:
+            keys = self._dependents.get(dependency)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._dependents[dependency]
+
+    def page(self, user_id, prompt_type, offset=0, limit=None):
+        """Return (ids, total) for a slice of the candidates in id order"""
+        return page_entry(self.get(user_id, prompt_type), offset, limit)
+
+    def on_student_changed(self, student_id, values):
+        """Facet index listener: drop the entries a student change can affect"""
+        with self._lock:
+            self._generation += 1
+            if values is None:
+                self._entries.clear()
+                self._dependents.clear()
+                self._bytes = 0
+                return
+            stale = set()
+            for dependency in [('user', student_id)] + list(values):
+                stale |= self._dependents.get(dependency, set())
+            for key in stale:
+                self._forget(key, self._entries.pop(key))
+
+
+candidate_cache = CandidateCache()
+facet_index.add_listener(candidate_cache.on_student_changed)
+
+
+def init_candidates(app):
+    """Configure the prompt candidate cache for the Flask app"""
+    candidate_cache.max_bytes = app.config.setdefault('CANDIDATE_CACHE_BYTES', 32 * 1024 * 1024)
@@ -0,0 +1,66 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip is offered without it
+    brotli = None
+
+# Content types worth compressing; images and streamed responses are left alone
+COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/css', 'text/plain', 'text/javascript',
+                      'application/javascript', 'image/svg+xml'}
+# Codings in order of preference when the client accepts several with the same quality
+CODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def encoded_etag(etag, coding):
+    """The strong ETag of a compressed representation, which must differ from the uncompressed one"""
+    return f'{etag}-{coding}'
+
+
+def etag_variants(etag):
+    """Return the ETags this request may validate: ``etag`` and the variant for the coding it negotiates.
+
+    A client that no longer accepts a coding must not get a 304 for the body it cached in that coding.
+    """
+    coding = request.accept_encodings.best_match(CODINGS)
+    return [etag] + ([encoded_etag(etag, coding)] if coding else [])
+
+
+def compress(body, coding, config):
+    if coding == 'br':
+        return brotli.compress(body, quality=config['COMPRESS_BROTLI_QUALITY'])
+    # mtime=0 keeps the output, and so its Content-Length, the same for the same body
+    return gzip.compress(body, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+
+def init_compression(app):
+    """Compress text responses above a size threshold with the best coding the client accepts"""
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in COMPRESSIBLE_TYPES or response.direct_passthrough or response.is_streamed:
+            return response
+        if response.status_code == 304:
+            # A 304 refreshes a 200 that varied by coding, so caches must key it the same way
+            response.vary.add('Accept-Encoding')
+            return response
+        if not 200 <= response.status_code < 300 or 'Content-Encoding' in response.headers:
+            return response
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        if len(body) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        coding = request.accept_encodings.best_match(CODINGS)
+        if coding is None:
+            return response
+
+        response.set_data(compress(body, coding, app.config))
+        response.headers['Content-Encoding'] = coding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(encoded_etag(etag, coding), weak)
+        return response
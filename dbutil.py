@@ -0,0 +1,84 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.models import db
+
+# Dialects whose INSERT supports ON CONFLICT
+CONFLICT_INSERTS = {'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
+
+# Engine settings and the environment variables that override them
+ENGINE_SETTINGS = {
+    # SQLite: WAL lets readers and the single writer run at the same time, and NORMAL only syncs at
+    # checkpoints, which is still safe against corruption in WAL mode
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    # Other databases: connections per worker process, and how long a checked-in connection may live
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+}
+
+
+def conflict_insert(model):
+    """Return an INSERT for model that supports on_conflict_*(), or None if the database has no ON CONFLICT"""
+    insert = CONFLICT_INSERTS.get(db.session.get_bind().dialect.name)
+    return insert(model) if insert is not None else None
+
+
+def _setting(app, name):
+    default = ENGINE_SETTINGS[name]
+    value = os.environ.get(name)
+    if value is None:
+        value = default
+    elif isinstance(default, bool):
+        value = value.lower() in ('1', 'true', 'yes', 'on')
+    elif isinstance(default, int):
+        value = int(value)
+    return app.config.setdefault(name, value)
+
+
+def configure_engine(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS for the configured database; call before db.init_app()"""
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # The driver's own lock timeout, in seconds, also covers BEGIN before the busy_timeout pragma runs
+        options.setdefault('connect_args', {}).setdefault('timeout', _setting(app, 'SQLITE_BUSY_TIMEOUT_MS') / 1000)
+        for name in ('SQLITE_JOURNAL_MODE', 'SQLITE_SYNCHRONOUS', 'SQLITE_MMAP_SIZE'):
+            _setting(app, name)
+        return
+    options.setdefault('pool_size', _setting(app, 'DB_POOL_SIZE'))
+    options.setdefault('max_overflow', _setting(app, 'DB_MAX_OVERFLOW'))
+    options.setdefault('pool_timeout', _setting(app, 'DB_POOL_TIMEOUT'))
+    # Recycle before the server or a proxy drops idle connections, and test each one on checkout
+    options.setdefault('pool_recycle', _setting(app, 'DB_POOL_RECYCLE'))
+    options.setdefault('pool_pre_ping', _setting(app, 'DB_POOL_PRE_PING'))
+
+
+def init_engine(app):
+    """Apply the SQLite pragmas to every new connection; call after db.init_app()"""
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+    if not engines:
+        return
+    pragmas = [
+        f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+    ]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    for engine in engines:
+        event.listen(engine, 'connect', set_pragmas)
@@ -0,0 +1,214 @@
+import functools
+import hashlib
+import threading
+import time
+from flask import current_app, make_response, request
+from sqlalchemy import event
+from models.models import db
+from compression import etag_variants
+from versions import EPOCH, bump_version, get_versions
+
+# Tables whose writes bump a data version of the same name when the transaction commits. Unread
+# counters are versioned per receiver through mark_changed() instead, so one chat message does not
+# change every user's ETag.
+TRACKED_TABLES = ('clubs', 'interests', 'languages', 'matches', 'prompts', 'student_clubs', 'student_interests',
+                  'student_languages', 'students')
+
+
+class VersionCache:
+    """Process-wide copy of the data versions the conditional routes asked for.
+
+    The copy is dropped every ``check_interval`` seconds and then refilled with one
+    query per set of missing names, so a conditional request whose ETag still matches
+    usually runs no query at all. A commit in this process drops the copy at once;
+    commits in other workers can take up to ``check_interval`` seconds to show.
+    """
+
+    def __init__(self, check_interval=1):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._checked_at = 0
+        self._generation = 0
+
+    def get(self, names):
+        """Return the versions of ``names`` as a tuple, reading the ones not in the copy"""
+        if time.monotonic() - self._checked_at > self.check_interval:
+            self.invalidate()
+        generation = self._generation
+        versions = self._versions
+        missing = [name for name in names if name not in versions]
+        if not missing:
+            return tuple(versions[name] for name in names)
+
+        loaded = dict.fromkeys(missing, 0)
+        loaded.update(get_versions(missing))
+        with self._lock:
+            # A local commit during the query may have made these versions stale already
+            if generation == self._generation:
+                versions.update(loaded)
+        return tuple(loaded[name] if name in loaded else versions[name] for name in names)
+
+    def invalidate(self):
+        """Drop the copy so the next get() re-reads it"""
+        with self._lock:
+            self._versions = {}
+            self._checked_at = time.monotonic()
+            self._generation += 1
+
+
+version_cache = VersionCache()
+
+# Every VersionWatch, told about the versions each local commit bumped
+_watches = []
+
+
+class VersionWatch:
+    """Tells an in-memory index when another worker committed to the tables it is built from.
+
+    The index records the versions of ``names`` it was built at, and ``stale()``
+    compares them with the current ones at most every ``check_interval`` seconds.
+    Commits in this process move the recorded versions forward instead, since the
+    code that commits also patches the index; a version that moved further than
+    that commit means another worker wrote too, and the index is stale.
+    """
+
+    def __init__(self, names, check_interval=1):
+        self.names = (EPOCH,) + tuple(names)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._versions = None
+        self._checked_at = 0
+        _watches.append(self)
+
+    def current(self):
+        """Read the versions now, before loading the data the index is built from"""
+        versions = dict.fromkeys(self.names, 0)
+        versions.update(get_versions(self.names))
+        return versions
+
+    def built(self, versions):
+        """Record the versions returned by current() once the index is built"""
+        with self._lock:
+            self._versions = versions
+            self._checked_at = time.monotonic()
+
+    def stale(self):
+        """Check whether another worker changed the tables since the index was built"""
+        versions = self._versions
+        now = time.monotonic()
+        if versions is None or now - self._checked_at <= self.check_interval:
+            return False
+        self._checked_at = now
+        return version_cache.get(self.names) != tuple(versions[name] for name in self.names)
+
+    def committed(self, bumped):
+        """Move past the versions a local commit bumped, when nothing else bumped them first"""
+        with self._lock:
+            if self._versions is None:
+                return
+            versions = dict(self._versions)
+            for name, version in bumped.items():
+                if versions.get(name) == version - 1:
+                    versions[name] = version
+            self._versions = versions
+
+
+def _changed_versions(session):
+    return session.info.setdefault('changed_versions', set())
+
+
+def mark_changed(name):
+    """Bump the data version ``name`` when the current transaction commits"""
+    _changed_versions(db.session).add(name)
+
+
+def _track_objects(session, *args):
+    # Objects added, changed or deleted through the unit of work; dirty ones may hold no net change
+    changed = _changed_versions(session)
+    for instances in (session.new, session.dirty, session.deleted):
+        for instance in instances:
+            table = getattr(instance, '__tablename__', None)
+            if table in TRACKED_TABLES and table not in changed and session.is_modified(instance):
+                changed.add(table)
+
+
+def _track_statement(orm_execute_state):
+    # INSERT, UPDATE and DELETE statements, including bulk and ON CONFLICT ones
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement.table, 'name', None)
+        if table in TRACKED_TABLES:
+            _changed_versions(orm_execute_state.session).add(table)
+
+
+def _bump_versions(session):
+    _track_objects(session)
+    changed = session.info.get('changed_versions')
+    if changed:
+        # Last thing before COMMIT, so PostgreSQL holds the version row locks only briefly, and in
+        # name order so concurrent transactions take them in the same order
+        for name in sorted(changed):
+            bump_version(name)
+        # The rows stay locked until COMMIT, so these are exactly the versions this commit writes
+        session.info['bumped_versions'] = get_versions(sorted(changed))
+        session.info['changed_versions'] = set()
+
+
+def _after_commit(session):
+    bumped = session.info.pop('bumped_versions', None)
+    if bumped:
+        version_cache.invalidate()
+        for watch in _watches:
+            watch.committed(bumped)
+
+
+def _after_rollback(session):
+    session.info.pop('changed_versions', None)
+    session.info.pop('bumped_versions', None)
+
+
+def etag_for(names, key=''):
+    """Return a strong ETag for the data versions ``names`` and a request-specific ``key``"""
+    versions = version_cache.get((EPOCH,) + tuple(names))
+    return hashlib.sha1(repr((names, versions, key)).encode()).hexdigest()
+
+
+def conditional(names, key=None):
+    """Serve a GET view with an ETag derived from the data versions ``names`` and the request URL.
+
+    A request whose If-None-Match holds that ETag, or the ETag of the compressed
+    response it negotiates, gets a 304 before the view runs.
+    ``names`` is a tuple, or a callable returning one for the current request, and
+    ``key`` returns extra state the response depends on, such as an in-memory index.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            etag = etag_for(names() if callable(names) else names, (request.full_path, key() if key else None))
+            matched = next((tag for tag in etag_variants(etag) if request.if_none_match.contains(tag)), None)
+            if matched:
+                response = current_app.response_class(status=304)
+                response.set_etag(matched)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+            # Let browsers keep the body but revalidate it on every request
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def init_etags(app):
+    """Track writes to the versioned tables and configure the version cache for the Flask app"""
+    version_cache.check_interval = app.config.setdefault('ETAG_VERSION_CHECK_INTERVAL', 1)
+    # Session events apply to the session class, so register them once for every app
+    for name, listener in (('before_flush', _track_objects), ('do_orm_execute', _track_statement),
+                           ('before_commit', _bump_versions), ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
@@ -0,0 +1,246 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, or_
+from models.models import db, Notification
+from metrics import sse_clients
+
+
+class EventBroker:
+    """Fan out chat events to the Server-Sent Events streams open in this process.
+
+    Events raised in this worker are published straight to the local subscriber
+    queues. Every event is also written to the ``notifications`` table in the same
+    transaction as the change that caused it, and a single background thread per
+    worker tails that table, so streams held by other gunicorn workers receive it
+    within ``EVENTS_POLL_INTERVAL`` seconds. A reconnecting browser sends the last
+    event id it saw, and the stream replays that user's newer rows first.
+
+    Every open stream holds a worker thread, so a worker keeps at most
+    ``EVENTS_MAX_STREAMS`` of them. Later requests get the replay only and are
+    asked to come back after ``EVENTS_POLL_RETRY`` seconds, which leaves the other
+    threads to the rest of the routes however many tabs are open.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._streams = 0
+        self._poller = None
+        self._last_id = 0
+        # Ids below _last_id not seen yet, with when they were noticed. On PostgreSQL a row can
+        # commit after one with a higher id, so the poller keeps looking for them for a while.
+        self._gaps = {}
+        # Ids already published by this process, so the poller does not deliver them twice
+        self._published = deque(maxlen=4096)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('EVENTS_POLL_INTERVAL', 1.0)
+        app.config.setdefault('EVENTS_KEEPALIVE', 15)
+        app.config.setdefault('EVENTS_STREAM_MAX_AGE', 300)
+        app.config.setdefault('EVENTS_RETENTION', 300)
+        app.config.setdefault('EVENTS_GAP_TIMEOUT', 30)
+        app.config.setdefault('EVENTS_REPLAY_LIMIT', 500)
+        app.config.setdefault('EVENTS_MAX_STREAMS', None)
+        app.config.setdefault('EVENTS_POLL_RETRY', 5)
+
+    def subscribe(self, user_id):
+        """Register a queue that receives events for ``user_id``"""
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(events)
+        sse_clients.inc()
+        self._start_poller()
+        return events
+
+    def unsubscribe(self, user_id, events):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if not queues or events not in queues:
+                return
+            queues.discard(events)
+            if not queues:
+                del self._subscribers[user_id]
+        sse_clients.dec()
+
+    def _reserve_stream(self):
+        limit = self.app.config['EVENTS_MAX_STREAMS']
+        with self._lock:
+            if limit and self._streams >= limit:
+                return False
+            self._streams += 1
+            return True
+
+    def _release_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    def client_count(self):
+        """Return the number of open streams in this process"""
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, user_id, event):
+        """Deliver an event to the streams of ``user_id`` open in this process"""
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for events in queues:
+            events.put(event)
+
+    def notify(self, user_id, kind, data):
+        """Queue a notification row in the current session; call publish_pending() after commit"""
+        notification = Notification(user_id=user_id, kind=kind, payload=json.dumps(data))
+        db.session.add(notification)
+        return notification
+
+    def publish_pending(self, notification):
+        """Publish a committed notification to local streams without waiting for the poller"""
+        self._published.append(notification.id)
+        self.publish(notification.user_id, _event(notification))
+
+    def backlog(self, user_id, after_id):
+        """Return the retained events for ``user_id`` with ids above ``after_id``, oldest first"""
+        rows = db.session.execute(
+            select(Notification)
+            .where(Notification.user_id == user_id, Notification.id > after_id)
+            .order_by(Notification.id)
+            .limit(self.app.config['EVENTS_REPLAY_LIMIT'])
+        ).scalars().all()
+        return [_event(notification) for notification in rows]
+
+    def _start_poller(self):
+        with self._lock:
+            if self._poller is not None and self._poller.is_alive():
+                return
+            self._poller = threading.Thread(target=self._poll_forever, name='event-poller', daemon=True)
+            self._poller.start()
+
+    def _poll_forever(self):
+        interval = self.app.config['EVENTS_POLL_INTERVAL']
+        with self.app.app_context():
+            self._last_id = db.session.execute(select(func.max(Notification.id))).scalar() or 0
+            db.session.remove()
+        last_prune = time.monotonic()
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                watched = list(self._subscribers)
+            try:
+                with self.app.app_context():
+                    self._poll_once(watched)
+                    if time.monotonic() - last_prune > self.app.config['EVENTS_RETENTION']:
+                        self._prune()
+                        last_prune = time.monotonic()
+                    db.session.remove()
+            except Exception:
+                self.app.logger.exception('Event poller failed')
+
+    def _poll_once(self, watched):
+        if not watched:
+            # Nobody is listening here, just move the high-water mark forward
+            self._gaps.clear()
+            self._last_id = db.session.execute(select(func.max(Notification.id))).scalar() or self._last_id
+            return
+
+        condition = Notification.id > self._last_id
+        if self._gaps:
+            condition = or_(condition, Notification.id.in_(list(self._gaps)))
+        rows = db.session.execute(select(Notification).where(condition).order_by(Notification.id)).scalars().all()
+        now = time.monotonic()
+        for notification in rows:
+            self._gaps.pop(notification.id, None)
+            if notification.id > self._last_id:
+                # Skipped ids may still be in open transactions; a rolled back one never shows up
+                for missing in range(max(self._last_id + 1, notification.id - 1000), notification.id):
+                    self._gaps[missing] = now
+                self._last_id = notification.id
+            if notification.user_id in watched and notification.id not in self._published:
+                self.publish_pending(notification)
+        timeout = self.app.config['EVENTS_GAP_TIMEOUT']
+        for missing, noticed in list(self._gaps.items()):
+            if now - noticed > timeout:
+                del self._gaps[missing]
+
+    def _prune(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['EVENTS_RETENTION'])
+        Notification.query.filter(Notification.created_at < cutoff).delete()
+        db.session.commit()
+
+    def _catch_up(self, user_id, after_id):
+        """Return the events above ``after_id`` to replay, or without it an id-only event that gives
+        the browser a cursor, so its next reconnect replays whatever it missed"""
+        # Only for the query; the stream holds no database connection while it waits
+        with self.app.app_context():
+            if after_id is None:
+                latest = db.session.execute(select(func.max(Notification.id))).scalar() or 0
+                db.session.remove()
+                return [{'id': latest}]
+            backlog = self.backlog(user_id, after_id)
+            db.session.remove()
+        return backlog
+
+    def stream(self, user_id, after_id=None):
+        """Yield Server-Sent Events for ``user_id`` until the stream reaches its maximum age.
+
+        With ``after_id``, the events above it that were sent while the browser was
+        reconnecting are replayed first. When every stream slot of this worker is
+        taken, only the replay is sent.
+        """
+        if not self._reserve_stream():
+            yield f"retry: {int(self.app.config['EVENTS_POLL_RETRY'] * 1000)}\n\n"
+            for event in self._catch_up(user_id, after_id):
+                yield _format(event)
+            return
+        try:
+            yield from self._hold(user_id, after_id)
+        finally:
+            self._release_stream()
+
+    def _hold(self, user_id, after_id):
+        keepalive = self.app.config['EVENTS_KEEPALIVE']
+        deadline = time.monotonic() + self.app.config['EVENTS_STREAM_MAX_AGE']
+        # Subscribe before reading the backlog, so nothing committed in between is missed
+        events = self.subscribe(user_id)
+        try:
+            # Ask the browser to reconnect quickly once the server closes the stream
+            yield 'retry: 2000\n\n'
+            replayed = set()
+            for event in self._catch_up(user_id, after_id):
+                if 'type' in event:
+                    replayed.add(event['id'])
+                yield _format(event)
+            while time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event['id'] in replayed or (after_id is not None and event['id'] <= after_id):
+                    continue
+                yield _format(event)
+        finally:
+            self.unsubscribe(user_id, events)
+
+
+def _event(notification):
+    return {'id': notification.id, 'type': notification.kind, 'data': json.loads(notification.payload)}
+
+
+def _format(event):
+    if 'type' not in event:
+        # Without data the browser dispatches nothing, it only remembers the id
+        return f"id: {event['id']}\n\n"
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+broker = EventBroker()
+
+
+def init_events(app):
+    """Initialize the chat event broker for the Flask app"""
+    broker.init_app(app)
@@ -0,0 +1,303 @@
+import threading
+import time
+from sqlalchemy import select
+from models.models import db, Student, Interest, Club, Language, StudentInterest, StudentClub, StudentLanguage
+from etags import VersionWatch
+
+# Facet dimensions backed by an association table: (association model, foreign key, taxonomy model)
+FACET_TABLES = {
+    'interests': (StudentInterest, 'interest_id', Interest),
+    'clubs': (StudentClub, 'club_id', Club),
+    'languages': (StudentLanguage, 'language_id', Language),
+}
+FACETS = ('faculty',) + tuple(FACET_TABLES)
+# Tables the index is built from, whose data versions tell it that another worker changed a student
+FACET_SOURCE_TABLES = ('students', 'student_interests', 'student_clubs', 'student_languages', 'interests', 'clubs',
+                       'languages')
+# Indexed alongside the facets for prompt candidates, but not a directory filter
+YEAR = 'year'
+
+# Largest id batch sent as an IN list; bigger batches scan the table instead
+IN_LIMIT = 500
+
+
+def iter_ids(bits):
+    """Yield the student ids set in a bitset, in ascending order"""
+    if not bits:
+        return
+    # bin() runs in C, so scanning its reversed string beats shifting the int bit by bit
+    digits = bin(bits)[:1:-1]
+    i = digits.find('1')
+    while i != -1:
+        yield i
+        i = digits.find('1', i + 1)
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+def _bitset(ids, size):
+    """Pack a collection of ids into an int bitset"""
+    buf = bytearray(size // 8 + 1)
+    for student_id in ids:
+        buf[student_id >> 3] |= 1 << (student_id & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def _selected(filters, facet):
+    """Return the selected values for a facet as a list"""
+    value = filters.get(facet)
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class FacetIndex:
+    """One bitset of student ids per faculty, interest, club and language.
+
+    Bit ``n`` of a bitset is set when student ``n`` has that facet value, so an
+    AND filter over any number of facets is a handful of integer ``&`` operations
+    instead of one pair of joins per selected value.
+
+    The per-facet dicts are copy-on-write: writers build new ones under the lock and
+    swap them in, so readers can use a snapshot without holding the lock.
+
+    Local profile saves patch the bitsets through update_student(). Saves made by
+    other workers show up as a change in the data versions of the source tables,
+    checked every ``watch.check_interval`` seconds, and trigger a rebuild.
+    """
+
+    def __init__(self, ttl=300, check_interval=1):
+        self.ttl = ttl
+        self.watch = VersionWatch(FACET_SOURCE_TABLES, check_interval)
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._bits = None
+        self._all = 0
+        self._built_at = 0
+        self._listeners = []
+        # Bumped on every change to the bitsets, so responses built from them can be told apart
+        self.generation = 0
+
+    def add_listener(self, callback):
+        """Call ``callback(student_id, values)`` after a student's facets change.
+
+        ``values`` is the set of (facet, value) pairs the student had before or has
+        after the change, empty if the index was not built yet. Both are None when
+        the whole index is rebuilt or dropped.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, student_id=None, values=None):
+        for callback in self._listeners:
+            callback(student_id, values)
+
+    def build(self):
+        """Load every student's facets from the database and rebuild the bitsets"""
+        versions = self.watch.current()
+        students = db.session.execute(select(Student.id, Student.faculty, Student.year)).all()
+        size = max((student_id for student_id, _, _ in students), default=0)
+
+        groups = {'faculty': {}, YEAR: {}}
+        for student_id, faculty, year in students:
+            if faculty:
+                groups['faculty'].setdefault(faculty, []).append(student_id)
+            groups[YEAR].setdefault(year, []).append(student_id)
+
+        # Scan the association tables by id and resolve names once per taxonomy row
+        for facet, (assoc, column, taxonomy) in FACET_TABLES.items():
+            names = dict(db.session.execute(select(taxonomy.id, taxonomy.name)).all())
+            by_id = {}
+            for student_id, taxonomy_id in db.session.execute(select(assoc.student_id, getattr(assoc, column))):
+                by_id.setdefault(taxonomy_id, []).append(student_id)
+            groups[facet] = {names[taxonomy_id]: ids for taxonomy_id, ids in by_id.items() if taxonomy_id in names}
+
+        bits = {facet: {value: _bitset(ids, size) for value, ids in by_value.items()}
+                for facet, by_value in groups.items()}
+        everyone = _bitset((student_id for student_id, _, _ in students), size)
+
+        with self._lock:
+            self._bits = bits
+            self._all = everyone
+            self._built_at = time.monotonic()
+            self.generation += 1
+        self.watch.built(versions)
+        self._notify()
+
+    def invalidate(self):
+        """Drop the index so the next lookup rebuilds it"""
+        with self._lock:
+            self._bits = None
+            self.generation += 1
+        self._notify()
+
+    def ensure_built(self):
+        """Build the index if it was never built, was dropped, is older than the TTL or another worker changed it.
+
+        Only one thread rebuilds; the others keep using the current bitsets meanwhile,
+        or wait for it when there are none yet.
+        """
+        bits, built_at = self._bits, self._built_at
+        if bits is not None and not (self.ttl and time.monotonic() - built_at > self.ttl) and not self.watch.stale():
+            return
+        if not self._build_lock.acquire(blocking=bits is None):
+            return
+        try:
+            # Skip the build when another thread finished one while this one waited
+            if self._bits is None or self._built_at == built_at:
+                self.build()
+        finally:
+            self._build_lock.release()
+
+    def _snapshot(self):
+        # The bitsets and the set of everyone, built if needed and read together
+        while True:
+            self.ensure_built()
+            with self._lock:
+                if self._bits is not None:
+                    return self._bits, self._all
+
+    def _without(self, student_id):
+        # Caller holds the lock; returns copies of the bitsets without the student and the
+        # (facet, value) pairs it had
+        mask = ~(1 << student_id)
+        bits = {}
+        removed = set()
+        for facet, by_value in self._bits.items():
+            bits[facet] = copy = {}
+            for value, value_bits in by_value.items():
+                if value_bits >> student_id & 1:
+                    removed.add((facet, value))
+                    value_bits &= mask
+                if value_bits:
+                    copy[value] = value_bits
+        return bits, self._all & mask, removed
+
+    def update_student(self, student_id):
+        """Re-read one student's facets after a commit and patch the bitsets"""
+        if self._bits is None:
+            # Nothing built yet, the first lookup will load the student anyway
+            self._notify(student_id, set())
+            return
+
+        student = db.session.get(Student, student_id)
+        values = None
+        if student:
+            values = {'faculty': [student.faculty] if student.faculty else [], YEAR: [student.year]}
+            for facet, (assoc, column, taxonomy) in FACET_TABLES.items():
+                rows = db.session.execute(
+                    select(taxonomy.name).join(assoc, taxonomy.id == getattr(assoc, column))
+                    .where(assoc.student_id == student_id)
+                )
+                values[facet] = rows.scalars().all()
+
+        with self._lock:
+            if self._bits is None:
+                changed = set()
+            else:
+                bits, everyone, changed = self._without(student_id)
+                if values is not None:
+                    bit = 1 << student_id
+                    everyone |= bit
+                    for facet, names in values.items():
+                        for name in names:
+                            bits[facet][name] = bits[facet].get(name, 0) | bit
+                            changed.add((facet, name))
+                self._bits, self._all = bits, everyone
+            self.generation += 1
+        self._notify(student_id, changed)
+
+    def remove_student(self, student_id):
+        """Drop a deleted student from the bitsets"""
+        with self._lock:
+            if self._bits is None:
+                return
+            self._bits, self._all, changed = self._without(student_id)
+            self.generation += 1
+        self._notify(student_id, changed)
+
+    def match(self, filters):
+        """Return the bitset of students matching every selected facet value"""
+        return self._match(self._snapshot(), filters)
+
+    def _match(self, snapshot, filters):
+        bits, result = snapshot
+        for facet in FACETS:
+            for value in _selected(filters, facet):
+                result &= bits[facet].get(value, 0)
+                if not result:
+                    return 0
+        return result
+
+    def union(self, facet, values):
+        """Return the bitset of students having any of ``values`` for one facet"""
+        by_value = self._snapshot()[0][facet]
+        result = 0
+        for value in values:
+            result |= by_value.get(value, 0)
+        return result
+
+    def filter_ids(self, filters):
+        """Return the sorted ids of students matching the filters"""
+        return list(iter_ids(self.match(filters)))
+
+    def page(self, filters, after_id=0, limit=50):
+        """Return up to ``limit`` matching ids above ``after_id``, and whether more follow"""
+        start = after_id + 1
+        ids = []
+        for offset in iter_ids(self.match(filters) >> start):
+            if len(ids) == limit:
+                return ids, True
+            ids.append(start + offset)
+        return ids, False
+
+    def contains(self, student_id, filters):
+        """Check whether one student matches the filters"""
+        return bool(self.match(filters) >> student_id & 1)
+
+    def counts(self, filters):
+        """Count the students matching each facet value on top of the current filters.
+
+        Faculty is single-select, so its counts ignore the selected faculty and show
+        what picking a different one would return. The multi-select facets AND
+        together, so their counts include the current selection.
+        """
+        snapshot = self._snapshot()
+        matched = self._match(snapshot, filters)
+        without_faculty = self._match(snapshot, dict(filters, faculty=None))
+        bits = snapshot[0]
+        result = {'total': popcount(matched)}
+        for facet in FACETS:
+            base = without_faculty if facet == 'faculty' else matched
+            result[facet] = {value: popcount(base & value_bits) if base else 0
+                             for value, value_bits in bits[facet].items()}
+        return result
+
+    def values(self, facet):
+        """Return every known value of a facet"""
+        return sorted(self._snapshot()[0][facet])
+
+
+facet_index = FacetIndex()
+
+
+def load_students(ids):
+    """Load students by id in id order with a single query"""
+    query = Student.query.order_by(Student.id)
+    if len(ids) <= IN_LIMIT:
+        return query.filter(Student.id.in_(ids)).all() if ids else []
+    # Too many ids for one IN list, scan and keep the wanted rows
+    wanted = set(ids)
+    return [student for student in query if student.id in wanted]
+
+
+def init_facets(app):
+    """Configure the facet index for the Flask app"""
+    facet_index.ttl = app.config.setdefault('FACET_INDEX_TTL', 300)
+    facet_index.watch.check_interval = app.config.setdefault('FACET_INDEX_CHECK_INTERVAL', 1)
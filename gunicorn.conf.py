@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+
+# Threaded workers: each process serves `threads` requests at once, so a slow query or an open
+# /api/events stream holds one thread instead of the whole worker. Every directory and messages tab keeps
+# a stream open, so each worker gets EVENTS_MAX_STREAMS threads for streams on top of GUNICORN_REQUEST_THREADS
+# for everything else. Tabs past the stream threads are answered with a short poll every EVENTS_POLL_RETRY
+# seconds instead of waiting, so set EVENTS_MAX_STREAMS to the tabs open at peak divided by WEB_CONCURRENCY.
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+request_threads = int(os.environ.get('GUNICORN_REQUEST_THREADS', 8))
+stream_threads = int(os.environ.setdefault('EVENTS_MAX_STREAMS', '32'))
+threads = request_threads + stream_threads
+# Reuse browser connections between the 5-second message polls
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Open event streams are cut off after this long on a restart; browsers reconnect by themselves
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# One pooled database connection per request thread, so no request waits on the pool at full load.
+# Streams only borrow one from the overflow while they read the backlog.
+os.environ.setdefault('DB_POOL_SIZE', str(request_threads))
+
+# Every worker writes its Prometheus samples to files in this directory and /metrics adds them up.
+# It must be set before the workers import the app.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'branchout-metrics'))
+
+
+def on_starting(server):
+    # Start from empty files so a restart does not report the previous run's counters again
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a worker that exited; its counters and histograms are kept
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
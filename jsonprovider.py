@@ -0,0 +1,72 @@
+import logging
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib json module is used instead
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's default JSON behaviour, encoded and decoded by orjson.
+
+    Dates still go through ``default()`` and become HTTP dates, and keys stay
+    sorted, so responses read the same as with the stdlib provider; only non-ASCII
+    text is sent as UTF-8 rather than ``\\u`` escapes. Anything orjson rejects, such
+    as integers wider than 64 bits, falls back to the stdlib encoder.
+    """
+
+    @staticmethod
+    def _options(sort_keys=True, indent=None, separators=None, ensure_ascii=None, **unsupported):
+        # orjson flags for the stdlib keyword arguments, or None when orjson cannot honour them
+        if unsupported or indent not in (None, 2) or separators not in (None, (',', ':')):
+            return None
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        options = self._options(**kwargs)
+        if options is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=options).decode()
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        # orjson.JSONDecodeError is a ValueError, so bad request bodies are still a 400
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        options = self._options(sort_keys=self.sort_keys, indent=2 if pretty else None)
+        try:
+            # Straight to bytes, without the str round trip of dumps()
+            body = orjson.dumps(obj, default=self.default, option=options | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+# Values of the JSON_PROVIDER setting
+JSON_PROVIDERS = {'orjson': OrjsonProvider, 'stdlib': DefaultJSONProvider}
+
+
+def init_json(app):
+    """Install the JSON provider named by JSON_PROVIDER, falling back to the stdlib one"""
+    name = app.config.setdefault('JSON_PROVIDER', 'orjson')
+    provider = JSON_PROVIDERS[name]
+    if provider is OrjsonProvider and orjson is None:
+        logger.warning('orjson is not installed, using the stdlib JSON provider')
+        provider = DefaultJSONProvider
+    app.json = provider(app)
@@ -0,0 +1,28 @@
+import sys
+from app import app
+from uploads import find_reference_mismatches, rehash_uploads, collect_garbage
+
+# Run this script to move profile pictures to content-addressed file names and rebuild their reference counts.
+# Pass --check to only report out of date reference counts, or --gc to delete pictures nobody uses.
+with app.app_context():
+    upload_folder = app.config['UPLOAD_FOLDER']
+
+    if '--gc' in sys.argv:
+        removed = collect_garbage(upload_folder, app.config['UPLOAD_GC_GRACE'])
+        for name in removed:
+            print(f"removed {name}")
+        print(f"Removed {len(removed)} unreferenced file(s)")
+        sys.exit(0)
+
+    mismatches = find_reference_mismatches()
+    for digest, (stored, actual) in sorted(mismatches.items()):
+        print(f"{digest}: reference count {stored}, students {actual}")
+    print(f"{len(mismatches)} reference count(s) out of date")
+
+    if '--check' in sys.argv:
+        sys.exit(1 if mismatches else 0)
+
+    rewritten, missing = rehash_uploads(upload_folder)
+    for url in missing:
+        print(f"missing file for {url}")
+    print(f"Moved {rewritten} picture(s) to content-addressed names and rebuilt the reference counts, {len(missing)} missing")
@@ -0,0 +1,97 @@
+import hmac
+import os
+import time
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from models.models import db
+
+# Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a directory shared by the workers.
+# Each worker then keeps its samples in memory-mapped files there and /metrics sums them.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+UPLOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+requests_total = Counter('branchout_http_requests_total', 'HTTP requests by endpoint, method and status',
+                         ['endpoint', 'method', 'status'])
+request_seconds = Histogram('branchout_http_request_duration_seconds',
+                            'Time to handle a request, including a streamed body, by endpoint',
+                            ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+requests_in_progress = Gauge('branchout_http_requests_in_progress', 'Requests being handled',
+                             multiprocess_mode='livesum')
+pool_wait_seconds = Histogram('branchout_db_pool_checkout_seconds',
+                              'Time to get a database connection from the pool, including opening a new one',
+                              buckets=POOL_WAIT_BUCKETS)
+sse_clients = Gauge('branchout_sse_clients', 'Open Server-Sent Events streams', multiprocess_mode='livesum')
+upload_seconds = Histogram('branchout_upload_processing_seconds',
+                           'Time to decode a profile picture and write its renditions', buckets=UPLOAD_BUCKETS)
+upload_failures = Counter('branchout_upload_failures_total', 'Profile pictures whose renditions could not be written')
+
+
+def _time_checkouts(engine):
+    # Every Connection gets its DBAPI connection through Engine.raw_connection(), which waits on the pool
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            pool_wait_seconds.observe(time.perf_counter() - started)
+
+    engine.raw_connection = timed_raw_connection
+
+
+def render_metrics():
+    """Return the Prometheus text exposition of every worker's metrics"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def init_metrics(app):
+    """Count and time every request and serve the metrics at /metrics.
+
+    Polling clients show up as the request rate of /api/messages and
+    /api/unread_messages; push clients as branchout_sse_clients. Set
+    METRICS_TOKEN to require ``Authorization: Bearer <token>`` on /metrics.
+    """
+    app.config.setdefault('METRICS_TOKEN', None)
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        _time_checkouts(engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        requests_in_progress.inc()
+
+    @app.teardown_request
+    def record_request(error=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        requests_in_progress.dec()
+        # Unmatched URLs share one label so scanners cannot grow the number of series
+        endpoint = request.endpoint or 'unmatched'
+        status = g.pop('metrics_status', 500 if error is not None else 200)
+        request_seconds.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        requests_total.labels(endpoint, request.method, str(status)).inc()
+
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config['METRICS_TOKEN']
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_metrics(), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,216 @@
+"""Versioned schema migrations for existing databases.
+
+Usage:
+    python migrations.py            apply pending migrations
+    python migrations.py --status   list applied and pending migrations
+    python migrations.py --explain  check that the hot queries use an index
+"""
+import sys
+from sqlalchemy import delete, func, inspect, or_, select, text, update
+from sqlalchemy.schema import CreateTable
+from models.models import (db, Student, StudentInterest, StudentClub, StudentLanguage, Prompt, Match, Message,
+                           Notification, UnreadCounter, DataVersion, SchemaVersion, Upload)
+
+# Every migration must be safe to run against a database that create_all() already brought up to date
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a migration function under a version number"""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return fn
+    return register
+
+
+def _create_indexes(bind, *models, unique=False):
+    for model in models:
+        for index in model.__table__.indexes:
+            # Unique indexes belong to the migration that removes the duplicates first
+            if index.unique and not unique:
+                continue
+            index.create(bind, checkfirst=True)
+
+
+def _columns(bind, table_name):
+    return {column['name']: column for column in inspect(bind).get_columns(table_name)}
+
+
+def _rebuild_sqlite_table(bind, model):
+    """Recreate a table from its model and copy the rows across, since SQLite cannot ALTER a column's constraints"""
+    table = model.__table__
+    staging = f'{table.name}_rebuild'
+    existing = _columns(bind, table.name)
+    ddl = str(CreateTable(table).compile(dialect=bind.dialect))
+    bind.execute(text(ddl.replace(f'CREATE TABLE {table.name} (', f'CREATE TABLE {staging} (', 1)))
+    columns = ', '.join(column.name for column in table.columns if column.name in existing)
+    bind.execute(text(f'INSERT INTO {staging} ({columns}) SELECT {columns} FROM {table.name}'))
+    # Foreign keys in other tables name the table, so they point at the new one after the rename
+    bind.execute(text(f'DROP TABLE {table.name}'))
+    bind.execute(text(f'ALTER TABLE {staging} RENAME TO {table.name}'))
+
+
+@migration(1, 'Add notifications and unread_counters tables')
+def add_push_tables(bind):
+    for model in (Notification, UnreadCounter):
+        model.__table__.create(bind, checkfirst=True)
+
+
+@migration(2, 'Backfill unread counters from messages')
+def backfill_unread_counters(bind):
+    from unread import rebuild_unread_counters
+    rebuild_unread_counters()
+
+
+@migration(3, 'Add indexes for conversation, unread, match, name and reverse facet lookups')
+def add_hot_path_indexes(bind):
+    _create_indexes(bind, Message, Match, Student, StudentInterest, StudentClub, StudentLanguage)
+
+
+@migration(4, 'Add data_versions table')
+def add_data_versions(bind):
+    DataVersion.__table__.create(bind, checkfirst=True)
+
+
+@migration(5, 'Add uploads table for picture reference counts')
+def add_uploads(bind):
+    Upload.__table__.create(bind, checkfirst=True)
+    from uploads import rebuild_upload_references
+    rebuild_upload_references()
+
+
+@migration(6, 'Add built-in prompt keys and allow one match per submitter and prompt')
+def add_builtin_prompts_and_unique_matches(bind):
+    from prompts import BUILTIN_PROMPTS
+
+    columns = _columns(bind, 'prompts')
+    if bind.dialect.name == 'sqlite':
+        if 'builtin' not in columns or not columns['created_by']['nullable']:
+            _rebuild_sqlite_table(bind, Prompt)
+    else:
+        if 'builtin' not in columns:
+            bind.execute(text('ALTER TABLE prompts ADD COLUMN builtin VARCHAR(50)'))
+        bind.execute(text('ALTER TABLE prompts ALTER COLUMN created_by DROP NOT NULL'))
+
+    # create_match() used to create the built-in prompts on demand, so claim the oldest row with each text
+    for prompt_type, prompt_text in BUILTIN_PROMPTS.values():
+        if bind.execute(select(Prompt.id).where(Prompt.builtin == prompt_type)).first() is None:
+            oldest = bind.execute(select(func.min(Prompt.id)).where(Prompt.text == prompt_text)).scalar()
+            if oldest is not None:
+                bind.execute(update(Prompt).where(Prompt.id == oldest).values(builtin=prompt_type))
+
+    # Keep the first match of every (submitter, prompt) pair that concurrent requests duplicated
+    first = select(func.min(Match.id)).group_by(Match.submitted_by, Match.prompt_id)
+    bind.execute(delete(Match).where(Match.id.not_in(first)))
+    bind.execute(text('DROP INDEX IF EXISTS ix_matches_submitter_prompt'))
+    _create_indexes(bind, Prompt, Match, unique=True)
+
+
+@migration(7, 'Add index for the matches a student received')
+def add_received_matches_index(bind):
+    _create_indexes(bind, Match)
+
+
+def current_version():
+    """Return the highest applied migration version, 0 for a database that has never been migrated"""
+    SchemaVersion.__table__.create(db.engine, checkfirst=True)
+    return db.session.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def upgrade():
+    """Apply every pending migration in order, one transaction each, and return the versions applied"""
+    applied = []
+    version = current_version()
+    # Commits bump data_versions for tracked tables, so it has to exist before the migration that adds it runs
+    DataVersion.__table__.create(db.engine, checkfirst=True)
+    for number, description, fn in MIGRATIONS:
+        if number <= version:
+            continue
+        fn(db.session.connection())
+        db.session.add(SchemaVersion(version=number, description=description))
+        db.session.commit()
+        applied.append(number)
+    return applied
+
+
+def stamp():
+    """Record every migration as applied, for a database that create_all() has just built from scratch"""
+    version = current_version()
+    for number, description, _ in MIGRATIONS:
+        if number > version:
+            db.session.add(SchemaVersion(version=number, description=description))
+    db.session.commit()
+
+
+def hot_queries():
+    """The statements behind the busiest routes, with placeholder ids"""
+    return {
+        'conversation page': select(Message).where(or_(
+            (Message.sender_id == 1) & (Message.receiver_id == 2),
+            (Message.sender_id == 2) & (Message.receiver_id == 1)
+        )).order_by(Message.id.desc()).limit(50),
+        'unread scan': select(Message).where(Message.receiver_id == 1, Message.read == False),
+        'duplicate match check': select(Match).where(Match.prompt_id == 1, Match.submitted_by == 1),
+        'received matches': select(Match).where(Match.matched_user_id == 1, Match.id > 0).order_by(Match.id).limit(50),
+        'student by name': select(Student).where(Student.name == 'Alex'),
+        'students by interest': select(StudentInterest.student_id).where(StudentInterest.interest_id == 1),
+        'students by club': select(StudentClub.student_id).where(StudentClub.club_id == 1),
+        'students by language': select(StudentLanguage.student_id).where(StudentLanguage.language_id == 1),
+        'unread counters': select(UnreadCounter).where(UnreadCounter.receiver_id == 1),
+    }
+
+
+def explain(statement):
+    """Return (uses_index, plan lines) for a statement on the current database"""
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        plan = [row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+        full_scan = any(line.startswith('SCAN ') and 'USING' not in line for line in plan)
+        return not full_scan and any('INDEX' in line or 'PRIMARY KEY' in line for line in plan), plan
+    if dialect.name == 'postgresql':
+        # Tiny tables would be sequentially scanned anyway, so ask whether an index can be used at all
+        db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        plan = [row[0] for row in db.session.execute(text('EXPLAIN ' + sql))]
+        return not any('Seq Scan' in line for line in plan), plan
+    raise NotImplementedError(f'EXPLAIN check is not supported on {dialect.name}')
+
+
+def check_query_plans():
+    """Print the plan of every hot query and return the names of those that do not use an index.
+    Queries on tables a pending migration has not created yet are reported and counted as failures."""
+    failures = []
+    inspector = inspect(db.engine)
+    for name, statement in hot_queries().items():
+        missing = sorted(table.name for table in statement.get_final_froms() if not inspector.has_table(table.name))
+        if missing:
+            print(f"MISSING {name} (no table {', '.join(missing)}; run python migrations.py first)")
+            failures.append(name)
+            continue
+        uses_index, plan = explain(statement)
+        print(f"{'ok  ' if uses_index else 'SCAN'} {name}")
+        for line in plan:
+            print(f'       {line}')
+        if not uses_index:
+            failures.append(name)
+    db.session.rollback()
+    return failures
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        if '--status' in sys.argv:
+            version = current_version()
+            for number, description, _ in MIGRATIONS:
+                print(f"{'applied' if number <= version else 'pending'}  {number:>3}  {description}")
+        elif '--explain' in sys.argv:
+            failures = check_query_plans()
+            if failures:
+                print(f"{len(failures)} hot query(s) do not use an index: {', '.join(failures)}")
+                sys.exit(1)
+        else:
+            applied = upgrade()
+            print(f"Applied migrations: {applied}" if applied else "Database is up to date")
@@ -6,16 +6,19 @@ db = SQLAlchemy()
 # Association tables
 class StudentInterest(db.Model):
     __tablename__ = 'student_interests'
+    __table_args__ = (db.Index('ix_student_interests_interest', 'interest_id', 'student_id'),)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
     interest_id = db.Column(db.Integer, db.ForeignKey('interests.id'), primary_key=True)
 
 class StudentClub(db.Model):
     __tablename__ = 'student_clubs'
+    __table_args__ = (db.Index('ix_student_clubs_club', 'club_id', 'student_id'),)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
     club_id = db.Column(db.Integer, db.ForeignKey('clubs.id'), primary_key=True)
 
 class StudentLanguage(db.Model):
     __tablename__ = 'student_languages'
+    __table_args__ = (db.Index('ix_student_languages_language', 'language_id', 'student_id'),)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
     language_id = db.Column(db.Integer, db.ForeignKey('languages.id'), primary_key=True)
 
@@ -23,7 +26,7 @@ class StudentLanguage(db.Model):
 class Student(db.Model):
     __tablename__ = 'students'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     year = db.Column(db.Integer, nullable=False)
     faculty = db.Column(db.String(100), nullable=False)
     profile_picture = db.Column(db.String(255), nullable=False, default='/static/img/default-profile.jpg')
@@ -54,9 +57,11 @@ class Language(db.Model):
 
 class Prompt(db.Model):
     __tablename__ = 'prompts'
+    __table_args__ = (db.Index('ux_prompts_builtin', 'builtin', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(255), nullable=False)
-    created_by = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('students.id'))  # None for built-in prompts
+    builtin = db.Column(db.String(50))  # Prompt type of a built-in prompt, None for prompts students create
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     
     # Relationships
@@ -64,6 +69,10 @@ class Prompt(db.Model):
 
 class Match(db.Model):
     __tablename__ = 'matches'
+    __table_args__ = (
+        db.Index('ux_matches_submitter_prompt', 'submitted_by', 'prompt_id', unique=True),
+        db.Index('ix_matches_matched_user', 'matched_user_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     prompt_id = db.Column(db.Integer, db.ForeignKey('prompts.id'), nullable=False)
     matched_user_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -77,6 +86,10 @@ class Match(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_conversation', 'sender_id', 'receiver_id', 'id'),
+        db.Index('ix_messages_unread', 'receiver_id', 'read'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('students.id'))
     receiver_id = db.Column(db.Integer, db.ForeignKey('students.id'))
@@ -87,3 +100,34 @@ class Message(db.Model):
     # Relationships
     sender = db.relationship('Student', foreign_keys=[sender_id], backref=db.backref('sent_messages', lazy='dynamic'))
     receiver = db.relationship('Student', foreign_keys=[receiver_id], backref=db.backref('received_messages', lazy='dynamic'))
+
+class Notification(db.Model):
+    __tablename__ = 'notifications'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False, index=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UnreadCounter(db.Model):
+    __tablename__ = 'unread_counters'
+    receiver_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class Upload(db.Model):
+    __tablename__ = 'uploads'
+    digest = db.Column(db.String(64), primary_key=True)  # SHA-256 of the uploaded bytes
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,326 @@
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from contextlib import contextmanager
+from bisect import bisect_left, insort
+from itertools import chain
+from sqlalchemy import select
+from models.models import db, Student
+from facets import FACETS, _selected, facet_index
+
+# Sorts after every character, so (prefix + LAST,) bounds the entries starting with prefix
+LAST = chr(0x10FFFF)
+# Postings are arrays of C unsigned ints, which numpy reads in place as np.uintc
+EMPTY = array('I')
+
+APOSTROPHES = re.compile(r"['’]")
+NON_WORD = re.compile(r'\W+')
+
+
+def normalize(name):
+    """Casefold, drop accents and apostrophes, and turn other punctuation into single spaces"""
+    letters = name or ''
+    if not letters.isascii():
+        letters = ''.join(c for c in unicodedata.normalize('NFKD', letters) if not unicodedata.combining(c))
+    letters = letters.casefold()
+    return ' '.join(NON_WORD.sub(' ', APOSTROPHES.sub('', letters)).split())
+
+
+def word_trigrams(word):
+    """Return the trigrams of one word, padded like PostgreSQL's pg_trgm"""
+    padded = f'  {word} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(normalized):
+    """Return the set of trigrams of each word of a normalized name"""
+    grams = set()
+    for word in normalized.split():
+        grams |= word_trigrams(word)
+    return grams
+
+
+class NameIndex:
+    """Every student's name, searchable by prefix and by trigram similarity.
+
+    A sorted list of whole names and a sorted vocabulary of name words answer
+    prefix lookups with a bisect, and per-word and per-trigram id arrays find names
+    by any of their words and names with typos. Results can be limited
+    to the facet filters of /api/validate-name, and the index follows profile
+    changes through the facet index's listeners.
+    """
+
+    def __init__(self, ttl=300, min_similarity=0.3):
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._students = None
+        self._built_at = 0
+
+    def build(self):
+        """Load every student's name from the database and rebuild the index"""
+        rows = db.session.execute(select(Student.id, Student.name, Student.faculty)).all()
+        students, names, words, word_grams = {}, [], {}, {}
+        # Trigrams per student id, the denominator of the similarity
+        gram_counts = array('H', bytes(2 * (max((row[0] for row in rows), default=0) + 1)))
+        for student_id, name, faculty in rows:
+            normalized = normalize(name)
+            students[student_id] = (name, faculty, normalized)
+            names.append((normalized, student_id))
+            name_grams = set()
+            for word in set(normalized.split()):
+                words.setdefault(word, []).append(student_id)
+                # Names share most of their words, so each word is split into trigrams once
+                if word not in word_grams:
+                    word_grams[word] = word_trigrams(word)
+                name_grams |= word_grams[word]
+            gram_counts[student_id] = len(name_grams)
+        names.sort()
+
+        # A name has a trigram when one of its words does
+        grams = {}
+        for word, ids in words.items():
+            for gram in word_grams[word]:
+                grams.setdefault(gram, []).append(ids)
+        grams = {gram: array('I', sorted(set(chain.from_iterable(id_lists)))) for gram, id_lists in grams.items()}
+
+        with self._lock:
+            self._students = students
+            self._names = names
+            self._vocabulary = sorted(words)
+            self._words = {word: array('I', sorted(ids)) for word, ids in words.items()}
+            self._grams = grams
+            self._gram_counts = gram_counts
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        """Drop the index so the next lookup rebuilds it"""
+        with self._lock:
+            self._students = None
+
+    def ensure_built(self):
+        """Build the index if it was never built, was dropped or is older than the TTL.
+
+        The facet index is checked first: when another worker changed a student it
+        rebuilds and drops this index through its listener. Only one thread rebuilds.
+        """
+        facet_index.ensure_built()
+        students, built_at = self._students, self._built_at
+        if students is not None and not (self.ttl and time.monotonic() - built_at > self.ttl):
+            return
+        if not self._build_lock.acquire(blocking=students is None):
+            return
+        try:
+            if self._students is None or self._built_at == built_at:
+                self.build()
+        finally:
+            self._build_lock.release()
+
+    @contextmanager
+    def _built(self):
+        # Hold the lock over a built index, building again if another thread dropped it in between
+        while True:
+            self.ensure_built()
+            with self._lock:
+                if self._students is not None:
+                    yield
+                    return
+
+    def _remove(self, student_id):
+        # Caller holds the lock
+        entry = self._students.pop(student_id, None)
+        if entry is None:
+            return
+        normalized = entry[2]
+        del self._names[bisect_left(self._names, (normalized, student_id))]
+        for word in set(normalized.split()):
+            ids = self._words[word]
+            del ids[bisect_left(ids, student_id)]
+            if not ids:
+                del self._words[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+        for gram in trigrams(normalized):
+            ids = self._grams[gram]
+            del ids[bisect_left(ids, student_id)]
+        self._gram_counts[student_id] = 0
+
+    def _add(self, student_id, name, faculty):
+        # Caller holds the lock
+        normalized = normalize(name)
+        self._students[student_id] = (name, faculty, normalized)
+        insort(self._names, (normalized, student_id))
+        for word in set(normalized.split()):
+            if word not in self._words:
+                self._words[word] = array('I')
+                insort(self._vocabulary, word)
+            ids = self._words[word]
+            ids.insert(bisect_left(ids, student_id), student_id)
+        name_grams = trigrams(normalized)
+        for gram in name_grams:
+            ids = self._grams.setdefault(gram, array('I'))
+            ids.insert(bisect_left(ids, student_id), student_id)
+        if student_id >= len(self._gram_counts):
+            self._gram_counts.extend(bytes(2 * (student_id + 1 - len(self._gram_counts))))
+        self._gram_counts[student_id] = len(name_grams)
+
+    def update_student(self, student_id):
+        """Re-read one student's name and faculty after a commit, or drop a deleted student"""
+        if self._students is None:
+            return
+        student = db.session.get(Student, student_id)
+        with self._lock:
+            if self._students is None:
+                return
+            self._remove(student_id)
+            if student is not None:
+                self._add(student_id, student.name, student.faculty)
+
+    def on_student_changed(self, student_id, values):
+        """Facet index listener: follow profile saves, signups and full rebuilds"""
+        if student_id is None:
+            self.invalidate()
+        else:
+            self.update_student(student_id)
+
+    def faculty(self, student_id):
+        """Return the faculty of a student returned by find() or search(), or None if it is gone"""
+        with self._built():
+            entry = self._students.get(student_id)
+            return entry[1] if entry is not None else None
+
+    def _allowed(self, filters):
+        # Bitset of the students passing the filters, or None when nothing is selected
+        if filters and any(_selected(filters, facet) for facet in FACETS):
+            return facet_index.match(filters)
+        return None
+
+    def find(self, name, filters=None):
+        """Return the id of the student called ``name``, ignoring case, accents and spacing, or None.
+
+        When several students match, one whose name is spelled exactly as given wins,
+        then the lowest id. Only students passing ``filters`` are considered.
+        """
+        normalized = normalize(name)
+        if not normalized:
+            return None
+        allowed = self._allowed(filters)
+        found = None
+        with self._built():
+            names = self._names
+            index = bisect_left(names, (normalized,))
+            while index < len(names) and names[index][0] == normalized:
+                student_id = names[index][1]
+                index += 1
+                if allowed is not None and not allowed >> student_id & 1:
+                    continue
+                if self._students[student_id][0] == name:
+                    return student_id
+                if found is None:
+                    found = student_id
+        return found
+
+    def search(self, query, filters=None, limit=10):
+        """Return up to ``limit`` students as (id, name, faculty), best matches first.
+
+        Names equal to the query come first, then names starting with it, then names
+        with a word starting with each query word (so "smi jo" finds "John Smith"),
+        then names within ``min_similarity`` trigram similarity, which tolerates typos.
+        """
+        normalized = normalize(query)
+        if not normalized or limit < 1:
+            return []
+        allowed = self._allowed(filters)
+        with self._built():
+            found = []
+            seen = set()
+
+            def take(student_id):
+                if student_id in seen or (allowed is not None and not allowed >> student_id & 1):
+                    return False
+                seen.add(student_id)
+                found.append(student_id)
+                return len(found) == limit
+
+            # Whole names starting with the query, in alphabetical order so an exact match is first
+            start = bisect_left(self._names, (normalized,))
+            end = bisect_left(self._names, (normalized + LAST,))
+            for _, student_id in self._names[start:end]:
+                if take(student_id):
+                    return self._results(found)
+
+            for student_id in self._word_prefixes(normalized, allowed):
+                if take(student_id):
+                    return self._results(found)
+
+            for student_id in self._similar(normalized, seen, allowed, limit - len(found)):
+                take(student_id)
+            return self._results(found)
+
+    def _word_prefixes(self, normalized, allowed):
+        # Ids of the names with a word starting with each query word, in name order. Caller holds the lock.
+        import numpy as np
+        postings = []
+        for word in normalized.split():
+            start = bisect_left(self._vocabulary, word)
+            end = bisect_left(self._vocabulary, word + LAST)
+            postings.append([self._words[name_word] for name_word in self._vocabulary[start:end]])
+        # Intersect from the query word with the fewest names, so the candidates shrink quickly
+        postings.sort(key=lambda arrays: sum(len(ids) for ids in arrays))
+        matches = None
+        for arrays in postings:
+            if not arrays:
+                return []
+            ids = np.concatenate([np.frombuffer(ids, dtype=np.uintc) for ids in arrays])
+            if matches is None:
+                matches = np.unique(ids)
+                if allowed is not None:
+                    matches = matches[_mask(allowed, int(matches[-1]) + 1)[matches]]
+            else:
+                matches = matches[np.isin(matches, ids)]
+            if not len(matches):
+                return []
+        return sorted(matches.tolist(), key=lambda student_id: (self._students[student_id][2], student_id))
+
+    def _similar(self, normalized, seen, allowed, limit):
+        # Up to `limit` ids not in `seen` whose names are at least min_similarity similar to the
+        # query, most similar first. Caller holds the lock.
+        grams = trigrams(normalized)
+        if len(grams) < 3:
+            return []
+        import numpy as np
+        # Counting every posting of the query's trigrams gives each name's shared trigrams at once
+        ids = np.concatenate([np.frombuffer(self._grams.get(gram, EMPTY), dtype=np.uintc) for gram in grams])
+        counts = np.frombuffer(self._gram_counts, dtype=np.uint16)
+        shared = np.bincount(ids, minlength=len(counts))[:len(counts)]
+        similarity = shared / (len(grams) + counts.astype(np.int64) - shared)
+        del counts
+        if seen:
+            similarity[list(seen)] = 0
+        if allowed is not None:
+            similarity *= _mask(allowed, len(similarity))
+        best = np.flatnonzero(similarity >= self.min_similarity)
+        best = best[np.lexsort((best, -similarity[best]))][:limit]
+        return best.tolist()
+
+    def _results(self, ids):
+        return [(student_id,) + self._students[student_id][:2] for student_id in ids]
+
+
+def _mask(bits, size):
+    # The first `size` bits of an int bitset as a numpy bool array
+    import numpy as np
+    data = bits.to_bytes(max(size, bits.bit_length()) // 8 + 1, 'little')
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little')[:size].view(bool)
+
+
+name_index = NameIndex()
+facet_index.add_listener(name_index.on_student_changed)
+
+
+def init_namesearch(app):
+    """Configure the name search index for the Flask app"""
+    name_index.ttl = app.config.setdefault('NAME_INDEX_TTL', 300)
+    name_index.min_similarity = app.config.setdefault('NAME_SEARCH_MIN_SIMILARITY', 0.3)
@@ -0,0 +1,139 @@
+import threading
+from sqlalchemy import exists, insert, select
+from sqlalchemy.orm import aliased
+from models.models import db, Student, StudentInterest, StudentClub, StudentLanguage, Prompt, Match
+from dbutil import conflict_insert
+
+# Prompts the match page offers under fixed ids: {id: (prompt type, text)}. The prompt type is also
+# stored in prompts.builtin, so each built-in prompt exists exactly once.
+BUILTIN_PROMPTS = {
+    '1': ('same_faculty', 'Find someone in the same faculty as you'),
+    '2': ('same_language_and_hobby', 'Find someone who speaks the same language and shares a hobby'),
+    '3': ('different_year_same_club', 'Find someone in a different year but in the same club'),
+}
+
+
+def seed_builtin_prompts():
+    """Create the built-in prompts that are missing and return {prompt type: prompt id}"""
+    rows = [{'builtin': prompt_type, 'text': text} for prompt_type, text in BUILTIN_PROMPTS.values()]
+    ids = dict(db.session.execute(select(Prompt.builtin, Prompt.id).where(Prompt.builtin.isnot(None))).all())
+    missing = [row for row in rows if row['builtin'] not in ids]
+    if missing:
+        statement = conflict_insert(Prompt)
+        if statement is not None:
+            # Every worker seeds at startup, so another one may insert the same rows concurrently
+            statement = statement.on_conflict_do_nothing(index_elements=['builtin'])
+        else:
+            statement = insert(Prompt)
+        db.session.execute(statement, missing)
+        db.session.commit()
+        ids = dict(db.session.execute(select(Prompt.builtin, Prompt.id).where(Prompt.builtin.isnot(None))).all())
+    return ids
+
+
+class BuiltinPrompts:
+    """Process-wide ids of the built-in prompt rows, seeded on first use"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = None
+
+    def load(self):
+        with self._lock:
+            self._ids = seed_builtin_prompts()
+        return self._ids
+
+    def invalidate(self):
+        """Forget the ids, e.g. after the tables were dropped and recreated"""
+        with self._lock:
+            self._ids = None
+
+    def id_for(self, prompt_type):
+        ids = self._ids
+        if ids is None:
+            ids = self.load()
+        return ids.get(prompt_type)
+
+
+builtin_prompts = BuiltinPrompts()
+
+
+def _shares(assoc, column, submitter_id, matched_id):
+    # Correlated EXISTS: do the two students have at least one value of this facet in common
+    mine, theirs = aliased(assoc), aliased(assoc)
+    return exists().where(mine.student_id == submitter_id, theirs.student_id == matched_id,
+                          getattr(mine, column) == getattr(theirs, column))
+
+
+def load_match_check(prompt_type, submitter_id, matched_id):
+    """Look up the matched student together with what ``prompt_type`` compares, in one query.
+
+    Returns None when no student has that id. Otherwise returns a row with ``id``
+    and ``name`` of the matched student, ``submitter_found``, and the columns
+    check_match() needs for the prompt type.
+    """
+    submitter = aliased(Student)
+    matched = aliased(Student)
+    columns = [matched.id, matched.name, (submitter.id != None).label('submitter_found')]
+    if prompt_type == 'same_faculty':
+        columns += [submitter.faculty.label('submitter_faculty'), matched.faculty.label('matched_faculty')]
+    elif prompt_type == 'same_language_and_hobby':
+        columns += [
+            _shares(StudentLanguage, 'language_id', submitter_id, matched.id).label('shares_language'),
+            _shares(StudentInterest, 'interest_id', submitter_id, matched.id).label('shares_interest'),
+        ]
+    elif prompt_type == 'different_year_same_club':
+        columns += [
+            submitter.year.label('submitter_year'), matched.year.label('matched_year'),
+            exists().where(StudentClub.student_id == submitter_id).label('submitter_has_clubs'),
+            _shares(StudentClub, 'club_id', submitter_id, matched.id).label('shares_club'),
+        ]
+    statement = (select(*columns)
+                 .select_from(matched)
+                 .outerjoin(submitter, submitter.id == submitter_id)
+                 .where(matched.id == matched_id))
+    return db.session.execute(statement).first()
+
+
+def check_match(prompt_type, row):
+    """Return why the matched student does not fit the prompt, or None if they do"""
+    if prompt_type == 'same_faculty':
+        if row.submitter_faculty != row.matched_faculty:
+            return f"This prompt requires someone from your faculty ({row.submitter_faculty})"
+    elif prompt_type == 'same_language_and_hobby':
+        if not row.shares_language:
+            return "This prompt requires someone who speaks at least one of your languages"
+        if not row.shares_interest:
+            return "This prompt requires someone who shares at least one of your interests"
+    elif prompt_type == 'different_year_same_club':
+        if row.submitter_year == row.matched_year:
+            return "This prompt requires someone from a different year than you"
+        # Club matching only applies when the submitter is in a club
+        if row.submitter_has_clubs and not row.shares_club:
+            return "This prompt requires someone who is in at least one of your clubs"
+    return None
+
+
+def load_matches(user_id, received=False, cursor=0, limit=50):
+    """Return up to ``limit + 1`` matches after the ``cursor`` match id, with their prompt and both students.
+
+    One query joins Match.prompt, Match.matched_user and Match.submitter. By
+    default these are the matches the student submitted; ``received`` lists the
+    ones other students made with them (Student.matches_received) instead.
+    """
+    matched = aliased(Student)
+    submitter = aliased(Student)
+    owner = Match.matched_user_id if received else Match.submitted_by
+    statement = (select(Match.id, Match.prompt_id, Prompt.text.label('prompt_text'),
+                        Match.matched_user_id, matched.name.label('matched_user_name'),
+                        matched.profile_picture.label('matched_user_profile_picture'),
+                        Match.submitted_by, submitter.name.label('submitted_by_name'),
+                        submitter.profile_picture.label('submitted_by_profile_picture'),
+                        Match.timestamp)
+                 .outerjoin(Match.prompt)
+                 .outerjoin(Match.matched_user.of_type(matched))
+                 .outerjoin(Match.submitter.of_type(submitter))
+                 .where(owner == user_id, Match.id > cursor)
+                 .order_by(Match.id)
+                 .limit(limit + 1))
+    return db.session.execute(statement).all()
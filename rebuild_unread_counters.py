@@ -0,0 +1,18 @@
+import sys
+from app import app
+from unread import find_unread_mismatches, rebuild_unread_counters
+
+# Run this script to check the unread counters against the messages table and rebuild them.
+# Pass --check to only report mismatches.
+with app.app_context():
+    mismatches = find_unread_mismatches()
+    for (receiver_id, sender_id), (stored, actual) in sorted(mismatches.items()):
+        print(f"receiver {receiver_id} / sender {sender_id}: counter {stored}, messages {actual}")
+    print(f"{len(mismatches)} unread counter(s) out of date")
+    
+    if mismatches and '--check' not in sys.argv:
+        rebuilt = rebuild_unread_counters()
+        print(f"Rebuilt {rebuilt} unread counter(s) from messages")
+    
+    if mismatches and '--check' in sys.argv:
+        sys.exit(1)
@@ -0,0 +1,85 @@
+from sqlalchemy import select
+from models.models import db
+from facets import FACET_TABLES, IN_LIMIT
+from uploads import picture_urls
+
+DEFAULT_PROFILE_PICTURE = '/static/img/default-profile.jpg'
+
+
+def load_facets(student_ids):
+    """Return {student_id: {'interests': [(id, name), ...], 'clubs': [...], 'languages': [...]}} using one query per facet"""
+    facets = {student_id: {facet: [] for facet in FACET_TABLES} for student_id in student_ids}
+    if not facets:
+        return facets
+
+    for facet, (assoc, column, taxonomy) in FACET_TABLES.items():
+        query = select(assoc.student_id, taxonomy.id, taxonomy.name).join(
+            taxonomy, taxonomy.id == getattr(assoc, column)
+        ).order_by(assoc.student_id, taxonomy.id)
+        if len(facets) <= IN_LIMIT:
+            query = query.where(assoc.student_id.in_(list(facets)))
+        for student_id, taxonomy_id, name in db.session.execute(query):
+            entry = facets.get(student_id)
+            if entry is not None:
+                entry[facet].append((taxonomy_id, name))
+    return facets
+
+
+def load_facet_names(student_ids):
+    """Return {student_id: {'interests': [...], 'clubs': [...], 'languages': [...]}} using one query per facet"""
+    return {student_id: {facet: [name for _, name in values] for facet, values in facets.items()}
+            for student_id, facets in load_facets(student_ids).items()}
+
+
+def serialize_students(students, taxonomy=None):
+    """Convert students to the JSON dict shared by the directory and API routes.
+
+    Interests, clubs and languages are loaded for the whole batch at once rather
+    than through each student's lazy relationships. For the compact wire format
+    pass a dict as ``taxonomy``: the facets then hold taxonomy ids, and ``taxonomy``
+    is filled with {facet: {id: name}} for the ids used, so each name is sent once.
+    """
+    loaded = load_facets([student.id for student in students])
+    if taxonomy is not None:
+        for facet in FACET_TABLES:
+            taxonomy.setdefault(facet, {})
+    result = []
+    for student in students:
+        if taxonomy is None:
+            facets = {facet: [name for _, name in values] for facet, values in loaded[student.id].items()}
+        else:
+            facets = {}
+            for facet, values in loaded[student.id].items():
+                facets[facet] = [taxonomy_id for taxonomy_id, _ in values]
+                taxonomy[facet].update(values)
+        pictures = picture_urls(student.profile_picture or DEFAULT_PROFILE_PICTURE)
+        result.append({
+            'id': student.id,
+            'name': student.name,
+            'year': student.year,
+            'faculty': student.faculty,
+            'interests': facets['interests'],
+            'clubs': facets['clubs'],
+            'languages': facets['languages'],
+            'profile_picture': pictures['thumb'],
+            'profile_picture_webp': pictures['thumb_webp'],
+            'profile_picture_medium': pictures['medium']
+        })
+    return result
+
+
+def serialize_student(student):
+    """Convert a single student to its JSON dict"""
+    return serialize_students([student])[0]
+
+
+def serialize_message(message):
+    """Convert a chat message to its JSON dict"""
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'receiver_id': message.receiver_id,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+        'read': message.read
+    }
@@ -0,0 +1,267 @@
+import threading
+import time
+from functools import lru_cache
+from itertools import chain
+from sqlalchemy import select
+from models.models import db, Student
+from facets import FACET_TABLES, facet_index
+from serializers import load_facet_names
+
+METRICS = ('jaccard', 'cosine')
+DEFAULT_WEIGHTS = {'interests': 1.0, 'clubs': 1.0, 'languages': 0.5}
+
+# Facet values are packed 16 to a uint16 word and counted through a 65,536-entry table.
+# numpy is imported inside the functions, so workers only load it once someone asks for recommendations.
+WORD_BITS = 16
+
+# Scores are bucketed into this many levels to find the top-k cutoff without a full partition
+SCORE_BUCKETS = 4096
+FETCH_BATCH = 100000
+
+
+def _words(columns):
+    return max(1, -(-columns // WORD_BITS))
+
+
+@lru_cache(maxsize=None)
+def _popcount16():
+    import numpy as np
+    return np.array([bin(i).count('1') for i in range(1 << WORD_BITS)], dtype=np.uint8)
+
+
+@lru_cache(maxsize=None)
+def _weighted_popcount(weight):
+    """Popcount table pre-multiplied by a facet weight, so one lookup yields the weighted overlap"""
+    import numpy as np
+    return (_popcount16() * np.float32(weight)).astype(np.float32)
+
+
+def _fetch_ints(statement, columns):
+    """Read an all-integer query into an (n, columns) array.
+
+    Goes through the DBAPI cursor in batches: building a SQLAlchemy Row per
+    association would take most of the build time at a million students.
+    """
+    import numpy as np
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute(str(statement.compile(dialect=db.engine.dialect)))
+        batches = iter(lambda: cursor.fetchmany(FETCH_BATCH), [])
+        values = np.fromiter(chain.from_iterable(chain.from_iterable(batches)), dtype=np.int64)
+    finally:
+        cursor.close()
+    return values.reshape(-1, columns)
+
+
+def _empty_matrix(rows, words):
+    import numpy as np
+    # Column-major so scoring reads each word of every student as one contiguous array
+    return np.zeros((rows, words), dtype=np.uint16, order='F')
+
+
+class SimilarityIndex:
+    """Packed bit matrix of every student's interests, clubs and languages.
+
+    Row ``n`` belongs to student ``n``, with one uint16 word per 16 values of a
+    facet, so scoring everyone against one user is a few vectorized AND and
+    popcount passes over the whole matrix. Profile saves rewrite a single row.
+    """
+
+    def __init__(self, ttl=300, weights=None):
+        self.ttl = ttl
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._built_at = 0
+        self._columns = None
+        self._bits = None
+        self._weighted_size = None
+        self._present = None
+
+    def build(self):
+        """Load every student's facets from the database and rebuild the matrix"""
+        import numpy as np
+        ids = _fetch_ints(select(Student.id), 1)[:, 0]
+        rows = int(ids.max()) + 1 if len(ids) else 1
+        present = np.zeros(rows, dtype=bool)
+        present[ids] = True
+
+        columns, bits = {}, {}
+        for facet, (assoc, column, taxonomy) in FACET_TABLES.items():
+            names = db.session.execute(select(taxonomy.id, taxonomy.name).order_by(taxonomy.id)).all()
+            columns[facet] = {name: n for n, (_, name) in enumerate(names)}
+            # Map taxonomy ids to bit positions with one array lookup instead of a dict per row
+            position = np.full(max((taxonomy_id for taxonomy_id, _ in names), default=0) + 1, -1, dtype=np.int64)
+            for n, (taxonomy_id, _) in enumerate(names):
+                position[taxonomy_id] = n
+            pairs = _fetch_ints(select(assoc.student_id, getattr(assoc, column)), 2)
+            pairs = pairs[(pairs[:, 0] < rows) & (pairs[:, 1] < len(position))]
+            student_ids, positions = pairs[:, 0], position[pairs[:, 1]]
+            keep = positions >= 0
+            student_ids, positions = student_ids[keep], positions[keep]
+
+            # (student, value) pairs are unique, so summing the bits of a word is the same as OR-ing them
+            words = _words(len(names))
+            flat = np.bincount(student_ids * words + positions // WORD_BITS,
+                               weights=np.left_shift(1, positions % WORD_BITS), minlength=rows * words)
+            bits[facet] = np.asfortranarray(flat.astype(np.uint16).reshape(rows, words))
+
+        with self._lock:
+            self._columns = columns
+            self._bits = bits
+            self._present = present
+            self._weighted_size = self._weighted_sizes(bits)
+            self._built_at = time.monotonic()
+
+    def _weighted_sizes(self, bits):
+        import numpy as np
+        total = np.zeros(len(next(iter(bits.values()))), dtype=np.float32)
+        for facet, matrix in bits.items():
+            table = _weighted_popcount(self.weights.get(facet, 1.0))
+            for word in range(matrix.shape[1]):
+                total += table[matrix[:, word]]
+        return total
+
+    def invalidate(self):
+        """Drop the matrix so the next lookup rebuilds it"""
+        with self._lock:
+            self._bits = None
+
+    def ensure_built(self):
+        """Build the matrix if it was never built, was dropped or is older than the TTL.
+
+        The facet index is checked first: when another worker changed a student it
+        rebuilds and drops this matrix through its listener. Only one thread rebuilds.
+        """
+        facet_index.ensure_built()
+        bits, built_at = self._bits, self._built_at
+        if bits is not None and not (self.ttl and time.monotonic() - built_at > self.ttl):
+            return
+        if not self._build_lock.acquire(blocking=bits is None):
+            return
+        try:
+            if self._bits is None or self._built_at == built_at:
+                self.build()
+        finally:
+            self._build_lock.release()
+
+    def _grow_rows(self, rows):
+        import numpy as np
+        # Caller holds the lock
+        capacity = len(self._present)
+        if rows <= capacity:
+            return
+        extra = rows - capacity
+        self._present = np.concatenate([self._present, np.zeros(extra, dtype=bool)])
+        self._weighted_size = np.concatenate([self._weighted_size, np.zeros(extra, dtype=np.float32)])
+        for facet, matrix in self._bits.items():
+            grown = _empty_matrix(rows, matrix.shape[1])
+            grown[:capacity] = matrix
+            self._bits[facet] = grown
+
+    def _column(self, facet, name):
+        # Caller holds the lock; new taxonomy names get the next bit, widening the facet if needed
+        columns = self._columns[facet]
+        if name not in columns:
+            columns[name] = len(columns)
+            matrix = self._bits[facet]
+            if _words(len(columns)) > matrix.shape[1]:
+                widened = _empty_matrix(len(matrix), matrix.shape[1] + 1)
+                widened[:, :-1] = matrix
+                self._bits[facet] = widened
+        return columns[name]
+
+    def _row(self, facet, names):
+        import numpy as np
+        # Caller holds the lock
+        columns = [self._column(facet, name) for name in names]
+        row = np.zeros(self._bits[facet].shape[1], dtype=np.uint16)
+        for column in columns:
+            row[column // WORD_BITS] |= 1 << (column % WORD_BITS)
+        return row
+
+    def update_student(self, student_id):
+        """Re-read one student's facets after a commit and rewrite their row"""
+        if self._bits is None:
+            return
+        exists = db.session.get(Student, student_id) is not None
+        names = load_facet_names([student_id])[student_id]
+        with self._lock:
+            if self._bits is None:
+                return
+            # scores() reads the matrix outside the lock, so the dict and arrays it may hold are replaced
+            # whole, never changed in place
+            self._bits = dict(self._bits)
+            self._grow_rows(student_id + 1)
+            rows = {facet: self._row(facet, names[facet] if exists else []) for facet in self._bits}
+            bits = {facet: matrix.copy(order='F') for facet, matrix in self._bits.items()}
+            present, sizes = self._present.copy(), self._weighted_size.copy()
+            present[student_id] = exists
+            size = 0.0
+            for facet, row in rows.items():
+                bits[facet][student_id] = row
+                size += float(_weighted_popcount(self.weights.get(facet, 1.0))[row].sum())
+            sizes[student_id] = size
+            self._bits, self._present, self._weighted_size = bits, present, sizes
+
+    def on_student_changed(self, student_id, values):
+        """Facet index listener: follow profile saves and full rebuilds"""
+        if student_id is None:
+            self.invalidate()
+        else:
+            self.update_student(student_id)
+
+    def scores(self, student_id, metric='jaccard'):
+        """Return the similarity of every row to one student, 0 for the student and for rows that are not students"""
+        import numpy as np
+        # Build again if another thread dropped the matrix in between
+        while True:
+            self.ensure_built()
+            with self._lock:
+                if self._bits is not None:
+                    # Writers replace these whole instead of changing them, so they stay consistent unlocked
+                    bits, present, sizes = self._bits, self._present, self._weighted_size
+                    break
+        if student_id >= len(present) or not present[student_id]:
+            raise LookupError(student_id)
+
+        overlap = np.zeros(len(present), dtype=np.float32)
+        for facet, matrix in bits.items():
+            table = _weighted_popcount(self.weights.get(facet, 1.0))
+            row = matrix[student_id]
+            for word in np.flatnonzero(row):
+                overlap += table[matrix[:, word] & row[word]]
+
+        own = sizes[student_id]
+        if not own:
+            return overlap
+        # Rows that are not students have no bits, so their overlap and score are already 0
+        if metric == 'cosine':
+            result = overlap / np.sqrt(sizes * own + np.float32(1e-12))
+        else:
+            result = overlap / (sizes + (own - overlap))
+        result[student_id] = 0
+        return result
+
+    def top(self, student_id, k=10, metric='jaccard'):
+        """Return [(student_id, score)] for the k most similar students with some overlap, best first"""
+        import numpy as np
+        scores = self.scores(student_id, metric)
+        # Find the lowest score bucket that still holds k students and only sort what is in or above it
+        buckets = (scores * (SCORE_BUCKETS - 1)).astype(np.uint16)
+        from_top = np.bincount(buckets, minlength=SCORE_BUCKETS)[::-1].cumsum()
+        cutoff = SCORE_BUCKETS - 1 - int(np.searchsorted(from_top, k))
+        best = np.flatnonzero(buckets >= cutoff) if cutoff > 0 else np.flatnonzero(scores > 0)
+        # Highest score first, lowest id first among equal scores
+        best = best[np.lexsort((best, -scores[best]))][:k]
+        return [(int(n), float(scores[n])) for n in best]
+
+
+similarity_index = SimilarityIndex()
+facet_index.add_listener(similarity_index.on_student_changed)
+
+
+def init_similarity(app):
+    """Configure the similarity ranking for the Flask app"""
+    similarity_index.ttl = app.config.setdefault('SIMILARITY_INDEX_TTL', 300)
+    similarity_index.weights = app.config.setdefault('SIMILARITY_WEIGHTS', dict(DEFAULT_WEIGHTS))
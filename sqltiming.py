@@ -0,0 +1,124 @@
+import json
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from models.models import db
+
+# Longest SQL text kept for the slow-request and repeated-statement logs
+STATEMENT_LOG_LENGTH = 500
+
+
+class RequestSql:
+    """Statements one request ran: count, total time, the slowest one and, in debug, how often each repeated"""
+
+    def __init__(self, track_repeats=False):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.repeats = Counter() if track_repeats else None
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_statement = statement
+        if self.repeats is not None:
+            # Statements are compiled with placeholders, so a query run once per row repeats the same text
+            self.repeats[statement] += 1
+
+    def server_timing(self, duration):
+        """Server-Timing header value, in milliseconds"""
+        metrics = [f'db;desc="{self.count} statements";dur={self.total * 1000:.2f}']
+        if self.count:
+            metrics.append(f'db-slowest;dur={self.slowest * 1000:.2f}')
+        metrics.append(f'total;dur={duration * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+def _shorten(statement):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= STATEMENT_LOG_LENGTH else statement[:STATEMENT_LOG_LENGTH] + '...'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.sqltiming_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'sqltiming_started', None)
+    # Background threads such as the upload pipeline have no request to charge the statement to
+    if started is not None and has_request_context():
+        stats = g.get('request_sql')
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - started)
+
+
+def init_sqltiming(app):
+    """Opt-in per-request SQL instrumentation, enabled by the SQL_INSTRUMENTATION setting.
+
+    Every response gets a Server-Timing header with the statement count, the
+    database time and the slowest statement. Requests slower than
+    SLOW_REQUEST_MS are logged as one JSON line. With SQL_DETECT_REPEATS, which
+    follows app.debug unless set, a statement run SQL_REPEAT_THRESHOLD times or
+    more in one request is logged as a suspected N+1 query. Queries a streamed
+    response runs after its headers were sent are not counted.
+    """
+    app.config.setdefault('SQL_INSTRUMENTATION', False)
+    app.config.setdefault('SLOW_REQUEST_MS', 500)
+    app.config.setdefault('SQL_DETECT_REPEATS', None)
+    app.config.setdefault('SQL_REPEAT_THRESHOLD', 5)
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_sql():
+        track_repeats = app.config['SQL_DETECT_REPEATS']
+        g.request_sql = RequestSql(track_repeats=app.debug if track_repeats is None else track_repeats)
+
+    @app.after_request
+    def report_request_sql(response):
+        stats = g.pop('request_sql', None)
+        if stats is None:
+            return response
+        duration = time.perf_counter() - stats.started
+        response.headers['Server-Timing'] = stats.server_timing(duration)
+
+        if duration * 1000 >= app.config['SLOW_REQUEST_MS']:
+            app.logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'db_ms': round(stats.total * 1000, 2),
+                'statements': stats.count,
+                'slowest_ms': round(stats.slowest * 1000, 2),
+                'slowest_statement': _shorten(stats.slowest_statement) if stats.slowest_statement else None,
+            }))
+
+        if stats.repeats:
+            threshold = app.config['SQL_REPEAT_THRESHOLD']
+            for statement, times in stats.repeats.most_common():
+                if times < threshold:
+                    break
+                app.logger.warning(json.dumps({
+                    'event': 'suspected_n_plus_one',
+                    'method': request.method,
+                    'path': request.path,
+                    'endpoint': request.endpoint,
+                    'times': times,
+                    'statement': _shorten(statement),
+                }))
+        return response
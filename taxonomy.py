@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import delete, insert, select
+from models.models import db, Student
+from facets import FACET_TABLES
+from dbutil import conflict_insert
+from versions import bump_version, get_version
+
+# Name of the data version bumped whenever an interest, club, language or faculty appears
+TAXONOMY_VERSION = 'taxonomy'
+
+# Plain rows rather than ORM objects so cached values outlive the session that loaded them
+TaxonomyItem = namedtuple('TaxonomyItem', ['id', 'name'])
+Taxonomy = namedtuple('Taxonomy', ['interests', 'clubs', 'languages', 'faculties'])
+
+
+def resolve_names(taxonomy, names):
+    """Return ({name: id}, created) for the given names, creating the missing taxonomy rows in one INSERT"""
+    names = list(dict.fromkeys(name for name in names if name))
+    if not names:
+        return {}, False
+
+    ids = dict(db.session.execute(select(taxonomy.name, taxonomy.id).where(taxonomy.name.in_(names))).all())
+    missing = [name for name in names if name not in ids]
+    if missing:
+        statement = conflict_insert(taxonomy)
+        if statement is not None:
+            # Another worker may create the same name concurrently
+            statement = statement.on_conflict_do_nothing(index_elements=['name'])
+        else:
+            statement = insert(taxonomy)
+        db.session.execute(statement, [{'name': name} for name in missing])
+        ids.update(db.session.execute(
+            select(taxonomy.name, taxonomy.id).where(taxonomy.name.in_(missing))
+        ).all())
+    return ids, bool(missing)
+
+
+def sync_student_facet(student_id, facet, names):
+    """Make a student's associations for one facet match ``names``, touching only the rows that changed.
+
+    Returns True when a new taxonomy row was created.
+    """
+    assoc, column, taxonomy = FACET_TABLES[facet]
+    foreign_key = getattr(assoc, column)
+    ids, created = resolve_names(taxonomy, names)
+    wanted = set(ids.values())
+    current = set(db.session.execute(select(foreign_key).where(assoc.student_id == student_id)).scalars())
+
+    removed = current - wanted
+    if removed:
+        db.session.execute(delete(assoc).where(assoc.student_id == student_id, foreign_key.in_(removed)))
+    added = wanted - current
+    if added:
+        db.session.execute(insert(assoc), [{'student_id': student_id, column: taxonomy_id} for taxonomy_id in added])
+    return created
+
+
+def save_student_facets(student_id, selections):
+    """Sync interests, clubs and languages from {'interests': [names], ...}.
+
+    Returns True when a taxonomy row had to be created for a new name.
+    """
+    created = False
+    for facet in FACET_TABLES:
+        created = sync_student_facet(student_id, facet, selections.get(facet, [])) or created
+    return created
+
+
+class TaxonomyCache:
+    """Process-wide copy of the interest, club, language and faculty lists.
+
+    Workers compare their copy with the ``taxonomy`` data version at most every
+    ``check_interval`` seconds, and reload unconditionally after ``ttl`` seconds,
+    so most page renders run no taxonomy queries at all.
+    """
+
+    def __init__(self, ttl=600, check_interval=5):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._loaded_at = 0
+        self._checked_at = 0
+
+    def get(self):
+        """Return the cached Taxonomy, reloading it if stale"""
+        now = time.monotonic()
+        # Read once, since invalidate() may drop it from another thread
+        value = self._value
+        if value is None or now - self._loaded_at > self.ttl:
+            return self._load()
+        if now - self._checked_at > self.check_interval:
+            self._checked_at = now
+            if get_version(TAXONOMY_VERSION) != self._version:
+                return self._load()
+        return value
+
+    def _load(self):
+        version = get_version(TAXONOMY_VERSION)
+        lists = {}
+        for facet, (_, _, taxonomy) in FACET_TABLES.items():
+            rows = db.session.execute(select(taxonomy.id, taxonomy.name).order_by(taxonomy.id))
+            lists[facet] = [TaxonomyItem(*row) for row in rows]
+        faculties = db.session.execute(
+            select(Student.faculty).where(Student.faculty != '').distinct().order_by(Student.faculty)
+        ).scalars().all()
+        value = Taxonomy(faculties=faculties, **lists)
+        now = time.monotonic()
+        with self._lock:
+            self._value = value
+            self._version = version
+            self._loaded_at = self._checked_at = now
+        return value
+
+    def invalidate(self):
+        """Drop the cached lists so the next get() reloads them"""
+        with self._lock:
+            self._value = None
+
+
+taxonomy_cache = TaxonomyCache()
+
+
+def mark_taxonomy_changed():
+    """Bump the taxonomy version in the current transaction; call taxonomy_cache.invalidate() after commit"""
+    bump_version(TAXONOMY_VERSION)
+
+
+def init_taxonomy(app):
+    """Configure the taxonomy cache for the Flask app"""
+    taxonomy_cache.ttl = app.config.setdefault('TAXONOMY_CACHE_TTL', 600)
+    taxonomy_cache.check_interval = app.config.setdefault('TAXONOMY_VERSION_CHECK_INTERVAL', 5)
@@ -0,0 +1,30 @@
+"""Shared test setup: the repo root and benchmarks/ on sys.path, and a counter for SQL statements"""
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from sqlalchemy import event
+from models.models import db
+
+
+@pytest.fixture(scope='session')
+def count_statements():
+    """A context manager that collects the statements the app's engine runs inside it, in an app context"""
+    @contextmanager
+    def counting():
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return counting
@@ -0,0 +1,69 @@
+"""Cached prompt candidates: compact entries that page like the bitsets they come from, within a byte cap"""
+from array import array
+
+import pytest
+
+from app import create_app
+from candidates import (PROMPT_FACETS, CandidateError, _profile, candidate_cache, compact, compute_candidates,
+                        entry_size, page_bits, page_entry)
+from datagen import seed
+from facets import facet_index
+
+USERS = range(1, 41)
+PAGES = ((0, None), (0, 5), (3, 10), (50, 10))
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    path = tmp_path_factory.mktemp('candidates') / 'candidates.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        seed(2000)
+        facet_index.invalidate()
+    return app
+
+
+def test_sparse_sets_are_kept_as_id_arrays():
+    # A few students near the end of a million-student index
+    sparse = sum(1 << student_id for student_id in range(999000, 1000000, 97))
+    dense = sum(1 << student_id for student_id in range(0, 100000, 3))
+    assert isinstance(compact(sparse), array)
+    assert isinstance(compact(dense), int)
+    assert entry_size(compact(sparse)) < entry_size(sparse) // 10
+    for bits in (sparse, dense, 0):
+        for offset, limit in PAGES:
+            assert page_entry(compact(bits), offset, limit) == page_bits(bits, offset, limit)
+
+
+def test_pages_match_the_bitsets(app):
+    with app.app_context():
+        for user_id in USERS:
+            for prompt_type in PROMPT_FACETS:
+                try:
+                    bits = compute_candidates(user_id, prompt_type, _profile(user_id))
+                except CandidateError:
+                    with pytest.raises(CandidateError):
+                        candidate_cache.page(user_id, prompt_type)
+                    continue
+                for offset, limit in PAGES:
+                    assert candidate_cache.page(user_id, prompt_type, offset, limit) == page_bits(bits, offset, limit)
+
+
+def test_cache_stays_within_its_byte_cap(app):
+    max_bytes = candidate_cache.max_bytes
+    candidate_cache.max_bytes = 4096
+    candidate_cache.on_student_changed(None, None)
+    try:
+        with app.app_context():
+            for user_id in USERS:
+                for prompt_type in PROMPT_FACETS:
+                    try:
+                        candidate_cache.page(user_id, prompt_type)
+                    except CandidateError:
+                        pass
+                    assert candidate_cache._bytes <= 4096
+        assert candidate_cache._entries
+        assert candidate_cache._bytes == sum(size for _, _, size in candidate_cache._entries.values())
+    finally:
+        candidate_cache.max_bytes = max_bytes
+        candidate_cache.on_student_changed(None, None)
@@ -0,0 +1,69 @@
+"""Revalidating with ETags: only for the coding a request negotiates, and never across a database reset"""
+import pytest
+
+from app import create_app
+from datagen import seed
+from etags import version_cache
+from facets import facet_index
+from models.models import db, Student
+from taxonomy import taxonomy_cache
+
+URL = '/api/filter?interests=Reading'
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    path = tmp_path_factory.mktemp('etags') / 'etags.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'COMPRESS_MIN_SIZE': 0})
+    with app.app_context():
+        seed(50)
+        for cache in (facet_index, taxonomy_cache, version_cache):
+            cache.invalidate()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '3'
+    return client
+
+
+def test_304_for_the_negotiated_coding_varies_by_accept_encoding(client):
+    response = client.get(URL, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    etag = response.headers['ETag']
+
+    response = client.get(URL, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_compressed_etag_does_not_validate_an_uncompressed_request(client):
+    etag = client.get(URL, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = client.get(URL, headers={'Accept-Encoding': 'identity', 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] != etag
+
+    response = client.get(URL, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_recreating_the_database_invalidates_old_etags(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'recreate.db'}"})
+    client = app.test_client()
+
+    def recreate_with_prompt(text):
+        client.get('/recreate-db')
+        with app.app_context():
+            db.session.add(Student(id=1, name='Student 1', year=1, faculty='Science', email='student1@example.com'))
+            db.session.commit()
+        client.post('/api/prompts', json={'text': text, 'created_by': 1})
+
+    # The prompts version is the same after both resets, only the epoch tells them apart
+    recreate_with_prompt('First')
+    etag = client.get('/api/prompts').headers['ETag']
+    recreate_with_prompt('Second')
+
+    response = client.get('/api/prompts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Second' in [prompt['text'] for prompt in response.get_json()]
@@ -0,0 +1,39 @@
+"""A page of /api/matches is one SQL statement, however many matches it lists"""
+import pytest
+
+from app import create_app
+from bench_matches import add_matches
+from datagen import seed
+from etags import version_cache
+
+SIZES = (1, 10, 50)
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    path = tmp_path_factory.mktemp('matches') / 'matches.db'
+    # Keep the version lookups behind the ETag cached, so only the page itself is counted
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'ETAG_VERSION_CHECK_INTERVAL': 3600})
+    with app.app_context():
+        seed(1000)
+        version_cache.invalidate()
+        first_student = 100
+        for user_id, count in enumerate(SIZES, start=1):
+            add_matches(user_id, count, first_student)
+            first_student += count
+    return app
+
+
+@pytest.mark.parametrize('view', ['submitted', 'received'])
+@pytest.mark.parametrize('user_id, count', list(enumerate(SIZES, start=1)))
+def test_matches_page_is_one_statement(app, count_statements, user_id, count, view):
+    client = app.test_client()
+    url = f'/api/matches?user_id={user_id}&view={view}&limit={count}'
+    with app.app_context():
+        # The first request caches the data versions, the second is what every later one costs
+        for _ in range(2):
+            with count_statements() as statements:
+                response = client.get(url)
+            assert response.status_code == 200
+    assert len(response.get_json()) == count
+    assert len(statements) == 1, statements
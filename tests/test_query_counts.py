@@ -0,0 +1,67 @@
+"""The read routes must issue the same number of SQL statements whatever the number of students"""
+import pytest
+
+from app import create_app
+from datagen import seed
+from etags import version_cache
+from facets import facet_index
+from taxonomy import taxonomy_cache
+
+SIZES = (20, 200)
+FILTERS = {'interests': ['Reading', 'Music']}
+
+REQUESTS = {
+    'directory': ('get', '/directory', None),
+    'filter (POST)': ('post', '/api/filter', FILTERS),
+    'filter (GET)': ('get', '/api/filter?interests=Reading&interests=Music', None),
+    'filter, compact': ('post', '/api/filter', dict(FILTERS, format='compact')),
+    'validate name': ('post', '/api/validate-name', {'name': 'Student 5', 'user_name': 'Student 3', 'filters': {}}),
+    'validate name, typo': ('post', '/api/validate-name', {'name': 'Studnet 5', 'filters': {}}),
+    'dynamic prompt, everyone': ('post', '/api/dynamic-prompt',
+                                 {'prompt_type': 'general', 'logged_in_user': 'Student 3'}),
+    'dynamic prompt, same faculty': ('post', '/api/dynamic-prompt',
+                                     {'prompt_type': 'same_faculty', 'logged_in_user': 'Student 3'}),
+    'dynamic prompt, language and hobby': ('post', '/api/dynamic-prompt',
+                                           {'prompt_type': 'same_language_and_hobby', 'logged_in_user': 'Student 3'}),
+}
+
+
+def count_queries(app, size, count_statements):
+    """Seed ``size`` students and return {request: statements} for a second, warm run of every request"""
+    with app.app_context():
+        seed(size)
+        # The per-process caches outlive the dropped tables, so start them from the new data
+        for cache in (facet_index, taxonomy_cache, version_cache):
+            cache.invalidate()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '3'
+
+    counts = {}
+    with app.app_context():
+        for name, (method, url, body) in REQUESTS.items():
+            # The first run builds the caches, the second shows what every later request costs
+            for _ in range(2):
+                with count_statements() as statements:
+                    response = getattr(client, method)(url, json=body)
+                assert response.status_code == 200, (name, response.get_json())
+            # An empty page would hide a statement per student
+            payload = response.get_json(silent=True)
+            rows = payload.get('students') if isinstance(payload, dict) else payload
+            assert rows is None or rows, f'{name} found no students'
+            counts[name] = len(statements)
+    return counts
+
+
+@pytest.fixture(scope='module')
+def counts(tmp_path_factory, count_statements):
+    path = tmp_path_factory.mktemp('query-counts') / 'students.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True})
+    return [count_queries(app, size, count_statements) for size in SIZES]
+
+
+@pytest.mark.parametrize('name', REQUESTS)
+def test_statement_count_does_not_grow_with_students(counts, name):
+    small, large = (by_size[name] for by_size in counts)
+    assert small == large, f'{name}: {small} statements for {SIZES[0]} students, {large} for {SIZES[1]}'
@@ -0,0 +1,40 @@
+"""Every hot query must use an index, on a new database and on one brought up to date by the migrations"""
+import os
+import shutil
+
+import pytest
+
+from app import create_app
+from migrations import check_query_plans, hot_queries, stamp, upgrade
+from models.models import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The database the app shipped with before the migrations existed
+LEGACY_DB = os.path.join(ROOT, 'instance', 'student_directory.db')
+
+
+def create_schema():
+    db.create_all()
+    stamp()
+
+
+def migrate():
+    upgrade()
+
+
+@pytest.mark.parametrize('prepare', [create_schema, migrate], ids=['create_all', 'migrations'])
+def test_hot_queries_use_an_index(tmp_path, capsys, prepare):
+    path = tmp_path / 'plans.db'
+    if prepare is migrate:
+        if not os.path.exists(LEGACY_DB):
+            pytest.skip('no legacy database to migrate')
+        shutil.copy(LEGACY_DB, path)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        prepare()
+        failures = check_query_plans()
+
+    reported = [line for line in capsys.readouterr().out.splitlines() if not line.startswith(' ')]
+    assert failures == []
+    assert reported == [f'ok   {name}' for name in hot_queries()]
@@ -0,0 +1,41 @@
+"""Moving legacy profile pictures to content-addressed names"""
+import os
+
+from PIL import Image
+
+from app import create_app
+from models.models import db, Student
+from uploads import UPLOAD_URL_PREFIX, rehash_uploads, upload_digest
+
+
+def add_student(student_id, picture):
+    db.session.add(Student(id=student_id, name=f'Student {student_id}', year=1, faculty='Science',
+                           email=f'student{student_id}@example.com', profile_picture=picture))
+
+
+def test_rehash_keeps_the_files_of_students_whose_original_is_gone(tmp_path):
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    # A legacy upload with its thumbnail, one whose original was deleted, and one nobody uses
+    Image.new('RGB', (300, 200), 'red').save(folder / 'kept_20240101.png')
+    Image.new('RGB', (200, 133), 'red').save(folder / 'kept_20240101_thumb.jpg')
+    Image.new('RGB', (200, 133), 'blue').save(folder / 'lost_20240101_thumb.jpg')
+    Image.new('RGB', (200, 133), 'blue').save(folder / 'lost_20240101_medium.jpg')
+    Image.new('RGB', (300, 200), 'green').save(folder / 'orphan_20240101.png')
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'uploads.db'}"})
+    with app.app_context():
+        db.create_all()
+        add_student(1, UPLOAD_URL_PREFIX + 'kept_20240101_thumb.jpg')
+        add_student(2, UPLOAD_URL_PREFIX + 'lost_20240101_thumb.jpg')
+        db.session.commit()
+
+        rewritten, missing = rehash_uploads(str(folder))
+
+        assert rewritten == 1
+        assert missing == [UPLOAD_URL_PREFIX + 'lost_20240101_thumb.jpg']
+        assert upload_digest(db.session.get(Student, 1).profile_picture)
+        assert db.session.get(Student, 2).profile_picture == UPLOAD_URL_PREFIX + 'lost_20240101_thumb.jpg'
+
+    remaining = {name for name in os.listdir(folder) if upload_digest(name) is None}
+    assert remaining == {'lost_20240101_thumb.jpg', 'lost_20240101_medium.jpg'}
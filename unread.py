@@ -0,0 +1,99 @@
+from sqlalchemy import func, select
+from models.models import db, Student, Message, UnreadCounter
+from dbutil import conflict_insert
+from etags import mark_changed
+
+# Data version bumped when every counter is rebuilt; each receiver's counters also have their own,
+# so one chat message changes only the receiver's /api/unread_messages ETag
+UNREAD_VERSION = 'unread_counters'
+
+
+def receiver_version(receiver_id):
+    return f'{UNREAD_VERSION}:{receiver_id}'
+
+
+def unread_versions(receiver_id):
+    """Return the data versions a receiver's unread counts depend on, sender names included"""
+    return (UNREAD_VERSION, receiver_version(receiver_id), 'students')
+
+
+def increment_unread(receiver_id, sender_id, amount=1):
+    """Add to the unread counter for (receiver, sender) in the current transaction"""
+    mark_changed(receiver_version(receiver_id))
+    insert = conflict_insert(UnreadCounter)
+    if insert is not None:
+        statement = insert.values(receiver_id=receiver_id, sender_id=sender_id, count=amount)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['receiver_id', 'sender_id'],
+            set_={'count': UnreadCounter.count + amount}
+        ))
+        return
+
+    # Databases without ON CONFLICT: update first, insert if there was no row
+    updated = UnreadCounter.query.filter_by(receiver_id=receiver_id, sender_id=sender_id).update(
+        {'count': UnreadCounter.count + amount}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(UnreadCounter(receiver_id=receiver_id, sender_id=sender_id, count=amount))
+
+
+def decrement_unread(receiver_id, sender_id, amount):
+    """Subtract the number of messages just marked read.
+
+    Subtracting rather than resetting to zero keeps messages that arrived
+    concurrently with the read-marking UPDATE counted.
+    """
+    if amount:
+        mark_changed(receiver_version(receiver_id))
+        UnreadCounter.query.filter_by(receiver_id=receiver_id, sender_id=sender_id).update(
+            {'count': UnreadCounter.count - amount}, synchronize_session=False
+        )
+
+
+def unread_by_sender(receiver_id):
+    """Return [{'count', 'sender_name', 'sender_id'}] for a receiver in one query"""
+    rows = db.session.query(UnreadCounter.sender_id, UnreadCounter.count, Student.name).outerjoin(
+        Student, Student.id == UnreadCounter.sender_id
+    ).filter(
+        UnreadCounter.receiver_id == receiver_id,
+        UnreadCounter.count > 0
+    ).order_by(UnreadCounter.sender_id)
+    return [{
+        'count': count,
+        'sender_name': name if name else 'Unknown',
+        'sender_id': sender_id
+    } for sender_id, count, name in rows]
+
+
+def count_unread_messages():
+    """Return {(receiver_id, sender_id): count} computed from the messages table"""
+    rows = db.session.execute(
+        select(Message.receiver_id, Message.sender_id, func.count())
+        .where(Message.read == False)
+        .group_by(Message.receiver_id, Message.sender_id)
+    )
+    return {(receiver_id, sender_id): count for receiver_id, sender_id, count in rows}
+
+
+def find_unread_mismatches():
+    """Compare the counters with the messages table, returning {(receiver, sender): (stored, actual)}"""
+    actual = count_unread_messages()
+    stored = {(row.receiver_id, row.sender_id): row.count for row in UnreadCounter.query}
+    mismatches = {}
+    for key in set(actual) | set(stored):
+        if stored.get(key, 0) != actual.get(key, 0):
+            mismatches[key] = (stored.get(key, 0), actual.get(key, 0))
+    return mismatches
+
+
+def rebuild_unread_counters():
+    """Replace every counter with a fresh count from the messages table"""
+    counts = count_unread_messages()
+    mark_changed(UNREAD_VERSION)
+    UnreadCounter.query.delete()
+    db.session.add_all(
+        UnreadCounter(receiver_id=receiver_id, sender_id=sender_id, count=count)
+        for (receiver_id, sender_id), count in counts.items()
+    )
+    db.session.commit()
+    return len(counts)
@@ -0,0 +1,356 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import request
+from sqlalchemy import select
+from models.models import db, Student, Upload
+from dbutil import conflict_insert
+from metrics import upload_seconds, upload_failures
+
+# Longest edge in pixels for each rendition
+RENDITIONS = {'thumb': 200, 'medium': 640}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}), 'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+UPLOAD_URL_PREFIX = '/static/uploads/'
+THUMB_SUFFIX = '_thumb.jpg'
+
+# Content-addressed files: <sha256>.<ext> for the original, <sha256>_<size>.<fmt> for renditions
+DIGEST_PATTERN = re.compile(r'^([0-9a-f]{64})(?:_(?:' + '|'.join(RENDITIONS) + r'))?\.\w+$')
+LEGACY_SUFFIX = re.compile(r'_(?:' + '|'.join(RENDITIONS) + r')$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def rendition_name(stem, size, fmt):
+    return f"{stem}_{size}.{fmt}"
+
+
+def thumbnail_url(digest):
+    return UPLOAD_URL_PREFIX + rendition_name(digest, 'thumb', 'jpg')
+
+
+def picture_urls(profile_picture):
+    """Return the rendition URLs for a stored profile picture.
+
+    Processed uploads are stored as their JPEG thumbnail URL, and the other
+    renditions sit next to it. Anything else (the default image, Google avatars,
+    uploads that are still processing) is used as-is for every size.
+    """
+    if not profile_picture or not profile_picture.startswith(UPLOAD_URL_PREFIX) or not profile_picture.endswith(THUMB_SUFFIX):
+        return {'thumb': profile_picture, 'thumb_webp': profile_picture, 'medium': profile_picture, 'medium_webp': profile_picture}
+    stem = profile_picture[:-len(THUMB_SUFFIX)]
+    return {
+        'thumb': profile_picture,
+        'thumb_webp': rendition_name(stem, 'thumb', 'webp'),
+        'medium': rendition_name(stem, 'medium', 'jpg'),
+        'medium_webp': rendition_name(stem, 'medium', 'webp'),
+    }
+
+
+def upload_digest(path):
+    """Return the content hash of an upload URL or file name, None for anything not content-addressed"""
+    if not path:
+        return None
+    if path.startswith(UPLOAD_URL_PREFIX):
+        path = path[len(UPLOAD_URL_PREFIX):]
+    elif '/' in path:
+        return None
+    match = DIGEST_PATTERN.match(path)
+    return match.group(1) if match else None
+
+
+def is_image(stream):
+    """Check that an upload decodes as an image without reading the whole file"""
+    # Pillow is imported on the first upload rather than when every worker boots
+    from PIL import Image
+    try:
+        Image.open(stream).verify()
+        return True
+    except Exception:
+        return False
+    finally:
+        stream.seek(0)
+
+
+def hash_stream(stream):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _replace_atomically(path, write):
+    """Write a file through a temporary name so readers never see it half written"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def store_upload(upload_folder, stream, extension):
+    """Save an upload under its SHA-256, skipping the write if the same bytes are already stored.
+
+    Returns (digest, url of the original).
+    """
+    digest = hash_stream(stream)
+    filename = f"{digest}.{extension}"
+    path = os.path.join(upload_folder, filename)
+    if os.path.exists(path):
+        # Refresh the mtime so a concurrent garbage collection leaves it alone
+        os.utime(path)
+    else:
+        _replace_atomically(path, lambda f: f.write(stream.read()))
+    return digest, UPLOAD_URL_PREFIX + filename
+
+
+def renditions_ready(upload_folder, digest):
+    """Return True if every rendition of an upload is already on disk"""
+    paths = [os.path.join(upload_folder, rendition_name(digest, size, fmt)) for size in RENDITIONS for fmt in FORMATS]
+    if not all(os.path.exists(path) for path in paths):
+        return False
+    for path in paths:
+        os.utime(path)
+    return True
+
+
+def make_renditions(source_path, upload_folder, stem):
+    """Decode an upload, drop its metadata and write every rendition; returns the written file names"""
+    from PIL import Image, ImageOps
+    written = []
+    with Image.open(source_path) as original:
+        # Apply the EXIF orientation, then rebuild the image from pixels only so no metadata survives
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        image = image.convert('RGB')
+
+        for size, edge in RENDITIONS.items():
+            rendition = image.copy()
+            rendition.thumbnail((edge, edge), Image.LANCZOS)
+            for fmt, (pil_format, options) in FORMATS.items():
+                name = rendition_name(stem, size, fmt)
+                _replace_atomically(os.path.join(upload_folder, name),
+                                    lambda f: rendition.save(f, pil_format, **options))
+                written.append(name)
+    return written
+
+
+def acquire_upload(digest):
+    """Count one more student picture pointing at an upload, in the current transaction"""
+    insert = conflict_insert(Upload)
+    if insert is not None:
+        db.session.execute(insert.values(digest=digest, ref_count=1).on_conflict_do_update(
+            index_elements=['digest'],
+            set_={'ref_count': Upload.ref_count + 1}
+        ))
+        return
+
+    updated = Upload.query.filter_by(digest=digest).update(
+        {'ref_count': Upload.ref_count + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(Upload(digest=digest, ref_count=1))
+
+
+def release_upload(digest):
+    """Drop one reference to an upload; files with no references are removed by collect_garbage()"""
+    Upload.query.filter_by(digest=digest).update(
+        {'ref_count': Upload.ref_count - 1}, synchronize_session=False
+    )
+
+
+def replace_picture(old_url, new_url):
+    """Move a student's reference from one picture to another, in the current transaction"""
+    old_digest, new_digest = upload_digest(old_url), upload_digest(new_url)
+    if old_digest == new_digest:
+        return
+    if new_digest:
+        acquire_upload(new_digest)
+    if old_digest:
+        release_upload(old_digest)
+
+
+def count_picture_references():
+    """Return {digest: number of students} computed from the students table"""
+    pictures = db.session.execute(
+        select(Student.profile_picture).where(Student.profile_picture.like(UPLOAD_URL_PREFIX + '%'))
+    ).scalars()
+    return Counter(digest for digest in map(upload_digest, pictures) if digest)
+
+
+def find_reference_mismatches():
+    """Compare the stored reference counts with the students table, returning {digest: (stored, actual)}"""
+    actual = count_picture_references()
+    stored = {row.digest: row.ref_count for row in Upload.query}
+    mismatches = {}
+    for digest in set(actual) | set(stored):
+        if stored.get(digest, 0) != actual.get(digest, 0):
+            mismatches[digest] = (stored.get(digest, 0), actual.get(digest, 0))
+    return mismatches
+
+
+def rebuild_upload_references():
+    """Replace every reference count with a fresh count from the students table"""
+    counts = count_picture_references()
+    Upload.query.delete()
+    db.session.add_all(Upload(digest=digest, ref_count=count) for digest, count in counts.items())
+    db.session.commit()
+    return len(counts)
+
+
+def collect_garbage(upload_folder, grace=3600):
+    """Delete content-addressed files that no student references any more.
+
+    Files modified within ``grace`` seconds are kept, which covers uploads whose
+    transaction has not committed yet. Returns the removed file names.
+    """
+    live = set(db.session.execute(select(Upload.digest).where(Upload.ref_count > 0)).scalars())
+    cutoff = time.time() - grace
+    removed = []
+    for name in os.listdir(upload_folder):
+        digest = upload_digest(name)
+        if digest is None or digest in live:
+            continue
+        path = os.path.join(upload_folder, name)
+        if os.path.getmtime(path) > cutoff:
+            continue
+        os.remove(path)
+        removed.append(name)
+    Upload.query.filter(Upload.ref_count <= 0).delete()
+    db.session.commit()
+    return removed
+
+
+def _legacy_stem(name):
+    return LEGACY_SUFFIX.sub('', os.path.splitext(name)[0])
+
+
+def rehash_uploads(upload_folder):
+    """Move pictures saved under name-and-time file names to content-addressed names.
+
+    Rewrites Student.profile_picture, rebuilds the reference counts and deletes the
+    legacy files no student points at any more. Returns (rewritten, missing) where
+    missing lists the pictures whose original file no longer exists; those students
+    keep their legacy picture and its renditions.
+    """
+    # A legacy picture may point at one of its renditions, so find files by their stem
+    originals = {}
+    for name in sorted(os.listdir(upload_folder)):
+        base = os.path.splitext(name)[0]
+        if upload_digest(name) is None and not name.startswith('.') and _legacy_stem(name) == base:
+            originals[base] = name
+
+    rewritten, missing = 0, []
+    students = Student.query.filter(Student.profile_picture.like(UPLOAD_URL_PREFIX + '%')).all()
+    for student in students:
+        if upload_digest(student.profile_picture):
+            continue
+        original = originals.get(_legacy_stem(student.profile_picture[len(UPLOAD_URL_PREFIX):]))
+        if original is None:
+            missing.append(student.profile_picture)
+            continue
+        extension = os.path.splitext(original)[1].lower().lstrip('.') or 'jpg'
+        with open(os.path.join(upload_folder, original), 'rb') as f:
+            digest, original_url = store_upload(upload_folder, f, extension)
+        try:
+            if not renditions_ready(upload_folder, digest):
+                make_renditions(os.path.join(upload_folder, f"{digest}.{extension}"), upload_folder, digest)
+            student.profile_picture = thumbnail_url(digest)
+        except Exception:
+            # Not decodable: keep serving the original under its new name
+            student.profile_picture = original_url
+        rewritten += 1
+    db.session.commit()
+    rebuild_upload_references()
+
+    # picture_urls() serves the renditions next to a legacy thumbnail too, so keep every file with a referenced stem
+    pictures = db.session.execute(
+        select(Student.profile_picture).where(Student.profile_picture.like(UPLOAD_URL_PREFIX + '%'))
+    ).scalars()
+    kept = {_legacy_stem(picture[len(UPLOAD_URL_PREFIX):]) for picture in list(pictures) + missing
+            if upload_digest(picture) is None}
+    for name in os.listdir(upload_folder):
+        if upload_digest(name) is None and not name.startswith('.') and _legacy_stem(name) not in kept:
+            os.remove(os.path.join(upload_folder, name))
+    return rewritten, missing
+
+
+class UploadPipeline:
+    """Process profile picture uploads on a small thread pool so the request can return right away"""
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('UPLOAD_WORKERS', 2)
+
+    def _pool(self):
+        # Under threaded gunicorn workers two saves can arrive at once; only one may create the executor
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.app.config['UPLOAD_WORKERS'],
+                                                    thread_name_prefix='upload')
+        return self._executor
+
+    def submit(self, student_id, original_url):
+        """Queue rendition processing for an upload saved at original_url"""
+        return self._pool().submit(self.process, student_id, original_url)
+
+    def process(self, student_id, original_url):
+        """Write the renditions, then point the student at the thumbnail if the picture was not replaced meanwhile"""
+        upload_folder = self.app.config['UPLOAD_FOLDER']
+        filename = original_url[len(UPLOAD_URL_PREFIX):]
+        stem = os.path.splitext(filename)[0]
+        try:
+            with upload_seconds.time():
+                make_renditions(os.path.join(upload_folder, filename), upload_folder, stem)
+        except Exception:
+            upload_failures.inc()
+            self.app.logger.exception('Could not process upload %s', original_url)
+            return None
+
+        thumbnail = UPLOAD_URL_PREFIX + rendition_name(stem, 'thumb', 'jpg')
+        with self.app.app_context():
+            updated = Student.query.filter_by(id=student_id, profile_picture=original_url).update(
+                {'profile_picture': thumbnail}, synchronize_session=False
+            )
+            db.session.commit()
+            db.session.remove()
+        return thumbnail if updated else None
+
+
+upload_pipeline = UploadPipeline()
+
+
+def init_uploads(app):
+    """Initialize the profile picture pipeline and long-lived caching of content-addressed files"""
+    upload_pipeline.init_app(app)
+    app.config.setdefault('UPLOAD_GC_GRACE', 3600)
+
+    @app.after_request
+    def cache_content_addressed_uploads(response):
+        # The URL changes whenever the bytes do, so browsers never need to revalidate
+        if response.status_code == 200 and upload_digest(request.path) and request.path.startswith(UPLOAD_URL_PREFIX):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.expires = datetime.utcnow() + timedelta(seconds=IMMUTABLE_MAX_AGE)
+        return response
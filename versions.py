@@ -0,0 +1,43 @@
+import secrets
+from sqlalchemy import select
+from models.models import db, DataVersion
+from dbutil import conflict_insert
+
+# A random value picked whenever the tables are recreated. Every ETag and VersionWatch includes it, so
+# data versions that restart from 1 after a reset never repeat a combination from before it.
+EPOCH = 'epoch'
+
+
+def bump_version(name):
+    """Increment a named data version in the current transaction"""
+    insert = conflict_insert(DataVersion)
+    if insert is not None:
+        db.session.execute(insert.values(name=name, version=1).on_conflict_do_update(
+            index_elements=['name'],
+            set_={'version': DataVersion.version + 1}
+        ))
+        return
+
+    updated = DataVersion.query.filter_by(name=name).update(
+        {'version': DataVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(DataVersion(name=name, version=1))
+
+
+def start_epoch():
+    """Start a new data epoch in the current transaction, after dropping and recreating the tables"""
+    # Random rather than a timestamp, so two resets within a second differ too; it fits a 32-bit column
+    db.session.merge(DataVersion(name=EPOCH, version=secrets.randbelow(2 ** 31 - 1) + 1))
+
+
+def get_version(name):
+    """Return the current value of a named data version, 0 if it was never bumped"""
+    return db.session.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+
+
+def get_versions(names):
+    """Return {name: version} for the named data versions in one query; names never bumped are left out"""
+    return dict(db.session.execute(
+        select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(names))
+    ).all())
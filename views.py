@@ -0,0 +1,791 @@
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, redirect, url_for, flash, stream_with_context
+from flask_login import login_required, current_user
+from models.models import db, Student, Interest, Club, Language, Prompt, Match, Message
+from sqlalchemy.exc import IntegrityError
+from facets import facet_index, load_students
+from serializers import DEFAULT_PROFILE_PICTURE, serialize_students, serialize_student, serialize_message
+from events import broker
+from unread import increment_unread, decrement_unread, unread_by_sender, unread_versions
+from taxonomy import save_student_facets, taxonomy_cache, mark_taxonomy_changed
+from candidates import PROMPT_FACETS, CandidateError, candidate_cache, page_bits
+from similarity import METRICS, similarity_index
+from prompts import BUILTIN_PROMPTS, builtin_prompts, load_match_check, check_match, load_matches
+from uploads import upload_pipeline, is_image, store_upload, renditions_ready, thumbnail_url, replace_picture
+from etags import conditional, version_cache
+from versions import start_epoch
+from namesearch import name_index
+
+# Pages and API routes, registered on the app by create_app()
+bp = Blueprint('main', __name__)
+
+# Tables a serialized student is read from, for the ETags of the routes that return students
+STUDENT_TABLES = ('students', 'student_interests', 'student_clubs', 'student_languages', 'interests', 'clubs',
+                  'languages')
+
+# Make APP_NAME available to all templates
+@bp.app_context_processor
+def inject_app_name():
+    return {'app_name': current_app.config.get('APP_NAME', 'BranchOut')}
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+
+def get_page_args(source):
+    """Read the keyset cursor and page size from a dict of request values, or return None if invalid"""
+    try:
+        cursor = int(source.get('cursor') or 0)
+        limit = int(source.get('limit') or current_app.config['PAGE_SIZE'])
+    except (TypeError, ValueError):
+        return None
+    if cursor < 0 or limit < 1:
+        return None
+    return cursor, min(limit, current_app.config['MAX_PAGE_SIZE'])
+
+def compact_taxonomy(source):
+    """Return a lookup table for serialize_students() to fill when the request asks for format=compact, else None"""
+    return {} if source.get('format') == 'compact' else None
+
+def get_message_page(query, args):
+    """Apply the after_id/before_id cursors and limit to a message query, or return None for a bad limit.
+
+    after_id returns the oldest messages newer than the cursor, before_id the newest
+    messages older than it, and no cursor the latest page. Pages are in chronological order.
+    """
+    after_id = args.get('after_id', None, type=int)
+    before_id = args.get('before_id', None, type=int)
+    limit = args.get('limit', current_app.config['MESSAGE_PAGE_SIZE'], type=int)
+    if limit < 1:
+        return None
+    limit = min(limit, current_app.config['MAX_PAGE_SIZE'])
+    
+    if after_id is not None:
+        return query.filter(Message.id > after_id).order_by(Message.id).limit(limit).all()
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+    return list(reversed(query.order_by(Message.id.desc()).limit(limit).all()))
+
+def mark_messages_read(user_id, other_id):
+    """Mark everything other_id sent to user_id as read in one UPDATE, committing only if rows changed"""
+    updated = Message.query.filter(
+        (Message.receiver_id == user_id) &
+        (Message.sender_id == other_id) &
+        (Message.read == False)
+    ).update({'read': True}, synchronize_session=False)
+    if updated:
+        decrement_unread(user_id, other_id, updated)
+        db.session.commit()
+    return updated
+
+@bp.route('/')
+def index():
+    if current_user.is_authenticated:
+        # Redirect to directory if already logged in
+        return redirect(url_for('main.directory', student_id=current_user.id))
+    return render_template('index.html')
+
+@bp.route('/submit', methods=['GET', 'POST'])
+@login_required
+def submit():
+    # Get the student_id from the URL parameter or current user
+    student_id = request.args.get('student_id', None, type=int)
+    
+    # If no student_id provided, use the current user's ID
+    if not student_id and current_user.is_authenticated:
+        student_id = current_user.id
+    
+    # Get the student from the database
+    student = Student.query.get(student_id)
+    
+    # If student not found, redirect to index
+    if not student:
+        flash('Student not found', 'danger')
+        return redirect(url_for('main.index'))
+    
+    # If this is a GET request, show the form
+    if request.method == 'GET':
+        # Get all interests, clubs, and languages for the form from the shared cache
+        taxonomy = taxonomy_cache.get()
+        return render_template('submit.html', student=student, selected=serialize_student(student),
+                               interests=taxonomy.interests, clubs=taxonomy.clubs, languages=taxonomy.languages)
+    
+    # If this is a POST request, process the form
+    # Get form data
+    name = request.form.get('name')
+    year = request.form.get('year')
+    faculty = request.form.get('faculty')
+    interests = request.form.getlist('interests')
+    clubs = request.form.getlist('clubs')
+    languages = request.form.getlist('languages')
+    
+    # Handle profile picture upload
+    profile_picture_path = student.profile_picture  # Keep existing picture by default
+    uploaded_picture = None
+    
+    if 'profile_picture' in request.files:
+        file = request.files['profile_picture']
+        if file and file.filename and allowed_file(file.filename) and is_image(file.stream):
+            # Store the file under its content hash so identical uploads share one copy
+            extension = file.filename.rsplit('.', 1)[1].lower()
+            digest, uploaded_picture = store_upload(current_app.config['UPLOAD_FOLDER'], file.stream, extension)
+            if renditions_ready(current_app.config['UPLOAD_FOLDER'], digest):
+                profile_picture_path = thumbnail_url(digest)
+                uploaded_picture = None
+            else:
+                profile_picture_path = uploaded_picture
+    
+    # Update student information
+    student.name = name
+    student.year = year
+    student.faculty = faculty
+    replace_picture(student.profile_picture, profile_picture_path)
+    student.profile_picture = profile_picture_path
+    student.first_login = False  # Mark as not first login anymore
+    
+    # Sync interests, clubs and languages, inserting or deleting only the associations that changed
+    created = save_student_facets(student.id, {'interests': interests, 'clubs': clubs, 'languages': languages})
+    
+    # Let every worker know the option lists changed
+    taxonomy_changed = created or (faculty and faculty not in taxonomy_cache.get().faculties)
+    if taxonomy_changed:
+        mark_taxonomy_changed()
+    
+    # Commit all changes
+    db.session.commit()
+    if taxonomy_changed:
+        taxonomy_cache.invalidate()
+    
+    # Keep the facet index in step with the saved profile
+    facet_index.update_student(student.id)
+    
+    # Resize and strip the new picture in the background; the original is shown until the renditions are ready
+    if uploaded_picture:
+        upload_pipeline.submit(student.id, uploaded_picture)
+    
+    # Redirect to directory with student_id parameter for welcome message
+    return redirect(url_for('main.directory', student_id=student.id))
+
+@bp.route('/directory')
+@login_required
+def directory():
+    # Get student_id from query parameter or current user
+    student_id = request.args.get('student_id', None, type=int)
+    
+    # If no student_id provided, use the current user's ID
+    if not student_id and current_user.is_authenticated:
+        student_id = current_user.id
+        
+    current_student = None
+    
+    if student_id:
+        current_student = Student.query.get(student_id)
+    
+    # Render the first page only, the rest is fetched from /api/directory
+    page_size = current_app.config['PAGE_SIZE']
+    students_query = Student.query.order_by(Student.id).limit(page_size + 1).all()
+    next_cursor = students_query[page_size - 1].id if len(students_query) > page_size else None
+    students_query = students_query[:page_size]
+    taxonomy = taxonomy_cache.get()
+    
+    # Convert student objects to JSON-serializable dictionaries
+    students = serialize_students(students_query)
+    
+    return render_template('directory.html', 
+                          students=students, 
+                          interests=taxonomy.interests, 
+                          clubs=taxonomy.clubs, 
+                          languages=taxonomy.languages,
+                          faculties=taxonomy.faculties,
+                          next_cursor=next_cursor,
+                          current_student=current_student)
+
+@bp.route('/api/directory', methods=['GET'])
+def directory_page_api():
+    page_args = get_page_args(request.args)
+    if not page_args:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    cursor, limit = page_args
+    
+    # Keyset pagination on the primary key keeps pages stable while students are added
+    students = Student.query.filter(Student.id > cursor).order_by(Student.id).limit(limit + 1).all()
+    next_cursor = students[limit - 1].id if len(students) > limit else None
+    
+    taxonomy = compact_taxonomy(request.args)
+    result = {'students': serialize_students(students[:limit], taxonomy), 'next_cursor': next_cursor}
+    if taxonomy is not None:
+        result['taxonomy'] = taxonomy
+    return jsonify(result)
+
+@bp.route('/api/directory/export', methods=['GET'])
+def export_directory():
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    # The app's JSON provider, orjson when installed, encodes each line
+    dumps = current_app.json.dumps
+    
+    def generate():
+        # yield_per streams rows from a server-side cursor, so only one batch is alive at a time.
+        # Plain column rows keep the session identity map from growing with the export.
+        query = db.select(
+            Student.id, Student.name, Student.year, Student.faculty, Student.profile_picture
+        ).order_by(Student.id).execution_options(yield_per=batch_size)
+        for batch in db.session.execute(query).partitions():
+            for student_data in serialize_students(batch):
+                yield dumps(student_data) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def args_filters():
+    # Query parameters as a filters dict, with a list for the ones given several times
+    return {name: values if len(values) > 1 else values[0] for name, values in request.args.lists()}
+
+def facet_generation():
+    # Build the index first, so the ETag of the first response names the index it was served from
+    facet_index.ensure_built()
+    return facet_index.generation
+
+@bp.route('/api/filter', methods=['GET', 'POST'])
+@conditional(STUDENT_TABLES, key=facet_generation)
+def filter_students():
+    # GET takes the filters as query parameters, repeated for several values, so browsers can revalidate the page
+    if request.method == 'GET':
+        data = args_filters()
+    else:
+        data = request.json
+    page_args = get_page_args(data)
+    if not page_args:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    cursor, limit = page_args
+    
+    # Intersect the facet bitsets instead of joining once per selected value
+    student_ids, has_more = facet_index.page(data, cursor, limit)
+    
+    # Get the filtered students
+    students = load_students(student_ids)
+    
+    # Format the results, with taxonomy ids and one lookup table in the compact format
+    taxonomy = compact_taxonomy(data)
+    result = {
+        'students': serialize_students(students, taxonomy),
+        'next_cursor': student_ids[-1] if has_more else None
+    }
+    if taxonomy is not None:
+        result['taxonomy'] = taxonomy
+    return jsonify(result)
+
+@bp.route('/api/facets', methods=['POST'])
+def facet_counts():
+    # Counts per faculty, interest, club and language for the current filter selection
+    data = request.json or {}
+    return jsonify(facet_index.counts(data))
+
+@bp.route('/api/students/search')
+def search_students():
+    # Typeahead over names, limited by the same facet filters as /api/filter
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing q parameter'}), 400
+    limit = request.args.get('limit', 10, type=int)
+    if limit < 1:
+        return jsonify({'error': 'Invalid limit'}), 400
+    filters = args_filters()
+    
+    results = name_index.search(query, filters, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    return jsonify([{'id': student_id, 'name': name, 'faculty': faculty} for student_id, name, faculty in results])
+
+@bp.route('/api/validate-name', methods=['POST'])
+def validate_name():
+    data = request.json
+    name = data.get('name')
+    filters = data.get('filters', {})
+    
+    # Get the user's faculty if name is provided for faculty filtering
+    if 'user_name' in data and data['user_name']:
+        user_id = name_index.find(data['user_name'])
+        if user_id is not None:
+            filters['faculty'] = name_index.faculty(user_id)
+    
+    # Check if the name exists in the filtered list, ignoring case and accents
+    student_id = name_index.find(name, filters)
+    student = db.session.get(Student, student_id) if student_id is not None else None
+    
+    if student:
+        return jsonify({'valid': True, 'student': serialize_student(student)})
+    else:
+        # Offer the closest names that pass the filters, for typos
+        suggestions = [found_name for _, found_name, _ in name_index.search(name or '', filters, 5)]
+        return jsonify({'valid': False, 'suggestions': suggestions})
+
+@bp.route('/api/dynamic-prompt', methods=['POST'])
+def dynamic_prompt():
+    data = request.json
+    logged_in_user_name = data.get('logged_in_user')
+    prompt_type = data.get('prompt_type')
+    
+    # Optional slice of the candidates; the total is sent in X-Total-Count
+    try:
+        offset = int(data.get('offset') or 0)
+        limit = int(data['limit']) if data.get('limit') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid offset or limit'}), 400
+    if offset < 0 or (limit is not None and limit < 1):
+        return jsonify({'error': 'Invalid offset or limit'}), 400
+    if limit is not None:
+        limit = min(limit, current_app.config['MAX_PAGE_SIZE'])
+    
+    # Get the logged-in user, without a query when it is the current user
+    logged_in_user_id = None
+    if logged_in_user_name:
+        if current_user.is_authenticated and current_user.student.name == logged_in_user_name:
+            logged_in_user_id = current_user.id
+        else:
+            logged_in_user_id = name_index.find(logged_in_user_name)
+            if logged_in_user_id is None:
+                return jsonify({'error': 'Logged in user not found'}), 404
+    
+    if prompt_type in PROMPT_FACETS:
+        if logged_in_user_id is None:
+            return jsonify({'error': 'Need logged in user for this prompt'}), 400
+        # Candidates are cached per user and prompt until a related profile changes
+        try:
+            student_ids, total = candidate_cache.page(logged_in_user_id, prompt_type, offset, limit)
+        except CandidateError as error:
+            return jsonify({'error': str(error)}), 400
+        except LookupError:
+            return jsonify({'error': 'Logged in user not found'}), 404
+    else:
+        # Any other prompt lists everyone except the logged-in user
+        bits = facet_index.match({})
+        if logged_in_user_id is not None:
+            bits &= ~(1 << logged_in_user_id)
+        student_ids, total = page_bits(bits, offset, limit)
+    
+    # The compact format wraps the list in an object to carry the lookup table
+    taxonomy = compact_taxonomy(data)
+    students = serialize_students(load_students(student_ids), taxonomy)
+    response = jsonify(students if taxonomy is None else {'students': students, 'taxonomy': taxonomy})
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+@bp.route('/api/similar')
+def similar_students():
+    # Rank everyone by shared interests, clubs and languages with the user
+    user_id = request.args.get('user_id', None, type=int)
+    if not user_id and current_user.is_authenticated:
+        user_id = current_user.id
+    if not user_id:
+        return jsonify({'error': 'Missing user_id parameter'}), 400
+    
+    metric = request.args.get('metric', 'jaccard')
+    if metric not in METRICS:
+        return jsonify({'error': f"metric must be one of {', '.join(METRICS)}"}), 400
+    k = request.args.get('k', 10, type=int)
+    if k < 1:
+        return jsonify({'error': 'Invalid k'}), 400
+    
+    try:
+        ranked = similarity_index.top(user_id, min(k, current_app.config['MAX_PAGE_SIZE']), metric)
+    except LookupError:
+        return jsonify({'error': 'User not found'}), 404
+    
+    # load_students returns id order, put them back in ranking order
+    by_id = {student['id']: student for student in serialize_students(load_students(sorted(dict(ranked))))}
+    students = []
+    for student_id, score in ranked:
+        if student_id in by_id:
+            students.append(dict(by_id[student_id], score=round(score, 4)))
+    return jsonify({'metric': metric, 'students': students})
+
+@bp.route('/api/match', methods=['POST'])
+def create_match():
+    data = request.json
+    prompt_id = data.get('prompt_id')
+    matched_user_id = data.get('matched_user_id')
+    matched_user_name = data.get('matched_user_name')
+    submitted_by = data.get('submitted_by')
+    prompt_type = data.get('prompt_type')
+    
+    # Validate input
+    if not prompt_id or not (matched_user_id or matched_user_name) or not submitted_by:
+        return jsonify({'error': 'Missing required fields'}), 400
+    if matched_user_id:
+        try:
+            matched_user_id = int(matched_user_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid matched user ID'}), 400
+    
+    # Built-in prompts are seeded once and always validated by their own type
+    builtin = BUILTIN_PROMPTS.get(prompt_id)
+    if builtin:
+        prompt_type = builtin[0]
+
+    # The matched user, the submitter and the prompt's criteria in one query. Names can collide once
+    # case and accents are ignored, so the id picked in the typeahead wins over the name.
+    matched_id = matched_user_id or name_index.find(matched_user_name)
+    matched_user = load_match_check(prompt_type, submitted_by, matched_id) if matched_id is not None else None
+    if not matched_user:
+        return jsonify({'error': 'Matched user not found'}), 404
+    if not matched_user.submitter_found:
+        return jsonify({'error': 'Submitter not found'}), 404
+
+    if builtin:
+        prompt_pk = builtin_prompts.id_for(prompt_type)
+    else:
+        try:
+            prompt_pk = db.session.execute(db.select(Prompt.id).where(Prompt.id == int(prompt_id))).scalar()
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid prompt ID'}), 400
+    if not prompt_pk:
+        return jsonify({'error': 'Prompt not found'}), 404
+
+    error_message = check_match(prompt_type, matched_user)
+    if error_message:
+        return jsonify({'error': error_message}), 400
+
+    # The unique (submitted_by, prompt_id) index rejects a second match, also from a concurrent request
+    match = Match(
+        prompt_id=prompt_pk,
+        matched_user_id=matched_user.id,
+        submitted_by=submitted_by
+    )
+    db.session.add(match)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'You have already matched someone to this prompt'}), 400
+
+    # Read the new row before committing, which would expire it and cost another SELECT
+    result = {
+        'id': match.id,
+        'prompt_id': match.prompt_id,
+        'matched_user_id': match.matched_user_id,
+        'matched_user_name': matched_user.name,
+        'submitted_by': match.submitted_by,
+        'timestamp': match.timestamp
+    }
+    db.session.commit()
+    return jsonify(result), 201
+
+@bp.route('/api/prompts', methods=['GET'])
+@conditional(('prompts',))
+def get_prompts():
+    prompts = Prompt.query.all()
+    result = []
+    
+    for prompt in prompts:
+        result.append({
+            'id': prompt.id,
+            'text': prompt.text,
+            'created_by': prompt.created_by,
+            'created_at': prompt.created_at
+        })
+    
+    return jsonify(result)
+
+@bp.route('/api/prompts', methods=['POST'])
+def create_prompt():
+    data = request.json
+    text = data.get('text')
+    created_by = data.get('created_by')
+    
+    # Validate input
+    if not text or not created_by:
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    # Check if the creator exists
+    creator = Student.query.get(created_by)
+    if not creator:
+        return jsonify({'error': 'Creator not found'}), 404
+    
+    # Create the prompt
+    prompt = Prompt(
+        text=text,
+        created_by=created_by
+    )
+    
+    db.session.add(prompt)
+    db.session.commit()
+    
+    return jsonify({
+        'id': prompt.id,
+        'text': prompt.text,
+        'created_by': prompt.created_by,
+        'created_at': prompt.created_at
+    }), 201
+
+@bp.route('/api/matches', methods=['GET'])
+@conditional(('matches', 'prompts', 'students'))
+def get_matches():
+    user_id = request.args.get('user_id', type=int)
+    
+    if not user_id:
+        return jsonify({'error': 'User ID is required'}), 400
+
+    # view=received lists the matches other students made with the user
+    view = request.args.get('view', 'submitted')
+    if view not in ('submitted', 'received'):
+        return jsonify({'error': 'Invalid view'}), 400
+    page_args = get_page_args(request.args)
+    if page_args is None:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    cursor, limit = page_args
+
+    # One joined query for the page, whatever its length
+    rows = load_matches(user_id, view == 'received', cursor, limit)
+    result = []
+    for row in rows[:limit]:
+        result.append({
+            'id': row.id,
+            'prompt_id': row.prompt_id,
+            'prompt_text': row.prompt_text or 'Unknown prompt',
+            'matched_user_id': row.matched_user_id,
+            'matched_user_name': row.matched_user_name or 'Unknown user',
+            'matched_user_profile_picture': row.matched_user_profile_picture or DEFAULT_PROFILE_PICTURE,
+            'submitted_by': row.submitted_by,
+            'submitted_by_name': row.submitted_by_name or 'Unknown user',
+            'submitted_by_profile_picture': row.submitted_by_profile_picture or DEFAULT_PROFILE_PICTURE,
+            'timestamp': row.timestamp
+        })
+
+    # The body stays a list; the cursor of the next page travels in a header
+    response = jsonify(result)
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = str(rows[limit - 1].id)
+    return response
+
+@bp.route('/matches')
+@login_required
+def matches_page():
+    # Get student_id from query parameter or current user
+    student_id = request.args.get('student_id', None, type=int)
+    
+    # If no student_id provided, use the current user's ID
+    if not student_id and current_user.is_authenticated:
+        student_id = current_user.id
+        
+    current_student = None
+    
+    if student_id:
+        current_student = Student.query.get(student_id)
+    
+    # The dropdown asks /api/students/search as the user types
+    return render_template('match.html', 
+                          current_student=current_student)
+
+@bp.route('/get_messages')
+def get_messages_legacy():
+    # Get user_id and other_id from query parameters
+    user_id = request.args.get('user_id', None, type=int)
+    other_id = request.args.get('other_id', None, type=int)
+    
+    if not user_id:
+        return jsonify({'error': 'Missing user_id parameter'}), 400
+    
+    # Get a page of messages between the two users
+    if other_id:
+        # Mark messages as read first so the page reflects it
+        mark_messages_read(user_id, other_id)
+        query = Message.query.filter(
+            ((Message.sender_id == user_id) & (Message.receiver_id == other_id)) |
+            ((Message.sender_id == other_id) & (Message.receiver_id == user_id))
+        )
+    else:
+        # Get all messages for the user
+        query = Message.query.filter(
+            (Message.sender_id == user_id) | (Message.receiver_id == user_id)
+        )
+    messages = get_message_page(query, request.args)
+    if messages is None:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    # Convert messages to JSON
+    return jsonify([serialize_message(message) for message in messages])
+
+@bp.route('/api/unread_messages')
+@conditional(lambda: unread_versions(request.args.get('user_id', type=int)))
+def unread_messages():
+    # Get user_id from query parameters
+    user_id = request.args.get('user_id', None, type=int)
+    
+    if not user_id:
+        return jsonify({'error': 'Missing user_id parameter'}), 400
+    
+    # Read the maintained per-sender counters joined to the sender name
+    return jsonify(unread_by_sender(user_id))
+
+@bp.route('/api/messages', methods=['GET'])
+def get_messages():
+    # Get the user IDs from the query parameters
+    user_id = request.args.get('user_id', type=int)
+    other_id = request.args.get('other_id', type=int)
+    
+    if not user_id or not other_id:
+        return jsonify({'error': 'Missing user IDs'}), 400
+    
+    # Mark messages as read if current user is the receiver
+    mark_messages_read(user_id, other_id)
+    
+    # Get a page of messages between the two users
+    messages = get_message_page(Message.query.filter(
+        ((Message.sender_id == user_id) & (Message.receiver_id == other_id)) |
+        ((Message.sender_id == other_id) & (Message.receiver_id == user_id))
+    ), request.args)
+    if messages is None:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    # Format the messages
+    return jsonify([serialize_message(message) for message in messages])
+
+@bp.route('/api/messages', methods=['POST'])
+def send_message():
+    data = request.json
+    sender_id = data.get('sender_id')
+    receiver_id = data.get('receiver_id')
+    content = data.get('content')
+    
+    # Validate input
+    if not sender_id or not receiver_id or not content:
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    # Check if the sender exists
+    sender = Student.query.get(sender_id)
+    if not sender:
+        return jsonify({'error': 'Sender not found'}), 404
+    
+    # Check if the receiver exists
+    receiver = Student.query.get(receiver_id)
+    if not receiver:
+        return jsonify({'error': 'Receiver not found'}), 404
+    
+    # Create the message
+    message = Message(
+        sender_id=sender_id,
+        receiver_id=receiver_id,
+        content=content
+    )
+    
+    db.session.add(message)
+    db.session.flush()
+    
+    message_data = serialize_message(message)
+    
+    # Count it as unread and push it to the receiver's open streams, committed with the message itself
+    increment_unread(receiver_id, sender_id)
+    notification = broker.notify(receiver_id, 'message', message_data)
+    db.session.commit()
+    broker.publish_pending(notification)
+    
+    return jsonify(message_data), 201
+
+@bp.route('/api/events')
+@login_required
+def events():
+    user_id = request.args.get('user_id', current_user.id, type=int)
+    
+    # The events carry message contents, so only the signed-in student may stream their own
+    if user_id != current_user.id:
+        return jsonify({'error': 'Not allowed to stream events for another user'}), 403
+    
+    # Server-Sent Events stream; the browser reconnects when it closes and sends the last id it saw
+    after_id = request.headers.get('Last-Event-ID', None, type=int)
+    if after_id is None:
+        after_id = request.args.get('after', None, type=int)
+    response = Response(broker.stream(user_id, after_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/messages')
+@login_required
+def messages_page():
+    # Get student_id from query parameter or current user
+    student_id = request.args.get('student_id', None, type=int)
+    other_id = request.args.get('other_id', None, type=int)
+    
+    # If no student_id provided, use the current user's ID
+    if not student_id and current_user.is_authenticated:
+        student_id = current_user.id
+        
+    current_student = None
+    other_student = None
+    
+    if student_id:
+        current_student = Student.query.get(student_id)
+    
+    if other_id:
+        other_student = Student.query.get(other_id)
+    
+    # Get all students for the dropdown
+    students = Student.query.all()
+    
+    return render_template('messages.html', 
+                          current_student=current_student,
+                          other_student=other_student,
+                          students=students)
+
+@bp.route('/recreate-db')
+def recreate_db():
+    with current_app.app_context():
+        # Drop all tables
+        db.drop_all()
+        
+        # Create all tables with the updated schema
+        db.create_all()
+        # Data versions restart from 1, so ETags and other workers' indexes need a new epoch to tell them apart
+        start_epoch()
+        facet_index.invalidate()
+        taxonomy_cache.invalidate()
+        builtin_prompts.invalidate()
+        
+        # Initialize with sample data
+        if not Language.query.first():
+            languages = ['English', 'Mandarin', 'Spanish', 'French', 'German', 'Japanese', 'Korean', 'Arabic', 'Russian', 'Hindi']
+            for lang in languages:
+                db.session.add(Language(name=lang))
+        
+        if not Interest.query.first():
+            interests = ['Reading', 'Sports', 'Music', 'Art', 'Gaming', 'Cooking', 'Travel', 'Photography', 'Coding', 'Dancing']
+            for interest in interests:
+                db.session.add(Interest(name=interest))
+        
+        if not Club.query.first():
+            clubs = ['Chess Club', 'Debate Society', 'Drama Club', 'Music Society', 'Sports Club', 'Coding Club', 'Photography Club', 'Art Club', 'Dance Club', 'Book Club']
+            for club in clubs:
+                db.session.add(Club(name=club))
+        
+        # Add sample prompts
+        prompts = [
+            "Who's the most helpful person this week?",
+            "Who made you smile today?",
+            "Most creative person this week?",
+            "Who would you like to collaborate with?",
+            "Who gave the best presentation recently?",
+            "Who helped you learn something new?",
+            "Who has the most interesting hobby?",
+            "Who would you recommend as a study partner?",
+            "Who has the most positive energy?",
+            "Who would you like to know better?"
+        ]
+        
+        # Add sample prompts if there are students
+        students = Student.query.all()
+        if students and not Prompt.query.first():
+            for i, prompt_text in enumerate(prompts):
+                # Use the first student as the creator for sample prompts
+                creator_id = students[0].id if students else 1
+                prompt = Prompt(text=prompt_text, created_by=creator_id)
+                db.session.add(prompt)
+                
+        db.session.commit()
+        version_cache.invalidate()
+        builtin_prompts.load()
+        
+    return "Database recreated with updated schema and sample data!"
+
+# Routes for privacy policy and terms of service
+@bp.route('/privacy')
+def privacy():
+    return render_template('privacy.html')
+
+@bp.route('/terms')
+def terms():
+    return render_template('terms.html')